@@ -5,6 +5,13 @@ from fastapi.middleware.cors import CORSMiddleware
 # Imports from this project
 from database import create_db_and_tables, SessionLocal
 from auth import hash_password
+from utils.glpi_async_client import glpi_async
+from utils.glpi_client import glpi_http
+from utils.glpi_session import glpi_session
+from utils.ticket_mirror import mirror_worker, GLPI_MIRROR_ENABLED
+from utils.retrieval import retrieval_stack, RETRIEVAL_WARMUP
+from utils.llm_providers import llm_providers
+from utils.llm_router import llm_router
 import models
 from routers import (
     auth,
@@ -52,6 +59,23 @@ def create_app():
     def on_startup():
         create_db_and_tables()
         create_default_admin()
+        if GLPI_MIRROR_ENABLED:
+            mirror_worker.start()
+        # Modèle d'embedding et Chroma : chargés hors du chemin de démarrage (voir /health/ready)
+        if RETRIEVAL_WARMUP == "blocking":
+            retrieval_stack.warm_up()
+        elif RETRIEVAL_WARMUP == "background":
+            retrieval_stack.start_warm_up()
+
+    # Événements d'arrêt
+    @app.on_event("shutdown")
+    async def on_shutdown():
+        mirror_worker.stop()
+        await glpi_async.close()
+        glpi_session.close()
+        glpi_http.close()
+        llm_router.close()
+        await llm_providers.aclose()
 
     # Configuration CORS
     app.add_middleware(
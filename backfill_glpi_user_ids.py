@@ -0,0 +1,58 @@
+"""
+Renseigne `glpi_user_id` pour tous les utilisateurs MongoDB qui n'en ont pas encore.
+
+Les utilisateurs GLPI sont lus en un seul parcours paginé (search/User) puis associés
+par email ou login, au lieu d'une recherche GLPI par utilisateur.
+Usage : python backfill_glpi_user_ids.py [--create-missing]
+"""
+
+import argparse
+
+from database import get_mongo_db
+from routers.glpi import iter_glpi_users, get_or_create_glpi_user
+from utils.glpi_session import glpi_session
+from utils.glpi_user_cache import normalize_email
+
+
+def backfill(create_missing=False, page_size=500):
+    users_collection = get_mongo_db()["users"]
+    pending = list(users_collection.find({"$or": [{"glpi_user_id": None}, {"glpi_user_id": {"$exists": False}}]}))
+    print(f"{len(pending)} utilisateur(s) MongoDB sans ID GLPI.")
+    if not pending:
+        return
+
+    # 1. Index email/login -> ID GLPI construit en un seul parcours
+    glpi_ids = {}
+    for glpi_id, login, email in iter_glpi_users(page_size=page_size):
+        for key in (normalize_email(email), normalize_email(login)):
+            if key and glpi_id:
+                glpi_ids.setdefault(key, glpi_id)
+    print(f"{len(glpi_ids)} email(s)/login(s) GLPI indexé(s).")
+
+    # 2. Association
+    matched, created, missing = 0, 0, 0
+    for user in pending:
+        glpi_id = glpi_ids.get(normalize_email(user.get("email")))
+        if not glpi_id and create_missing:
+            glpi_id = get_or_create_glpi_user(email=user["email"], name=user.get("name"), role=user.get("role"))
+            created += bool(glpi_id)
+        elif glpi_id:
+            matched += 1
+        if glpi_id:
+            users_collection.update_one({"_id": user["_id"]}, {"$set": {"glpi_user_id": glpi_id}})
+        else:
+            missing += 1
+            print(f"  - Aucun utilisateur GLPI pour {user.get('email')}")
+
+    print(f"Terminé : {matched} associé(s), {created} créé(s), {missing} sans correspondance.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--create-missing", action="store_true", help="Créer dans GLPI les utilisateurs introuvables")
+    parser.add_argument("--page-size", type=int, default=500, help="Nombre d'utilisateurs GLPI lus par page")
+    args = parser.parse_args()
+    try:
+        backfill(create_missing=args.create_missing, page_size=args.page_size)
+    finally:
+        glpi_session.close()
@@ -0,0 +1,190 @@
+"""
+Outils pour le backend d'embedding ONNX (EMBEDDING_BACKEND=onnx).
+
+  python bench_embeddings.py export              # exporte all-MiniLM-L6-v2 en ONNX puis le quantifie en int8
+  python bench_embeddings.py parity [--threshold 0.98] [--from-mongo 200]
+                                                 # similarité cosinus torch vs onnx ; code retour 1 sous le seuil
+  python bench_embeddings.py bench [--backend all|torch|onnx] [--runs 200]
+                                                 # latence (p50/p95) requête unique, débit par lots, RSS
+
+`export` et `parity` nécessitent les deux backends installés (sentence-transformers + torch,
+onnxruntime + tokenizers). `bench` mesure chaque backend dans un processus séparé pour que
+la mémoire (RSS) de l'un ne fausse pas celle de l'autre.
+"""
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+from utils.embedding_service import EMBEDDING_MODEL_NAME, load_embedding_model
+from utils.onnx_embedder import EMBEDDING_ONNX_DIR, EMBEDDING_ONNX_FILE
+
+SAMPLE_TEXTS = [
+    "mot de passe",
+    "J'ai oublié mon mot de passe, comment le réinitialiser ?",
+    "écran noir",
+    "Mon écran reste noir au démarrage du poste.",
+    "Quel est le statut du ticket 1234 ?",
+    "L'imprimante du deuxième étage n'imprime plus.",
+    "Impossible de me connecter au VPN depuis chez moi.",
+    "Comment demander l'installation d'un logiciel ?",
+    "Outlook ne synchronise plus mes mails.",
+    "Bonjour",
+    "Le réseau wifi est très lent dans la salle de réunion.",
+    "Procédure de création d'un compte pour un nouvel arrivant",
+]
+
+
+def export(out_dir: str = EMBEDDING_ONNX_DIR):
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(out_dir, exist_ok=True)
+    st_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+    tokenizer.save_pretrained(out_dir)  # écrit tokenizer.json (tokenizer "fast")
+
+    fp32_path = os.path.join(out_dir, "model_fp32.onnx")
+    dummy = tokenizer(["exemple de phrase"], return_tensors="pt")
+    axes = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            (dummy["input_ids"], dummy["attention_mask"], dummy["token_type_ids"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state", "pooler_output"],
+            dynamic_axes={"input_ids": axes, "attention_mask": axes, "token_type_ids": axes,
+                          "last_hidden_state": axes, "pooler_output": {0: "batch"}},
+            opset_version=14,
+        )
+    int8_path = os.path.join(out_dir, EMBEDDING_ONNX_FILE)
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    for path in (fp32_path, int8_path):
+        print(f"{path}: {os.path.getsize(path) / 1e6:.1f} Mo")
+    print(f"Export terminé. Activez le backend avec EMBEDDING_BACKEND=onnx (EMBEDDING_ONNX_DIR={out_dir}).")
+
+
+def _texts(from_mongo: int) -> list:
+    texts = list(SAMPLE_TEXTS)
+    if from_mongo:
+        from pymongo import MongoClient
+        collection = MongoClient("mongodb://localhost:27017/")["mcp_backend"]["documents"]
+        for doc in collection.find({}, {"title": 1, "content": 1}).limit(from_mongo):
+            texts.append(f"{doc.get('title', '')}\n{doc.get('content', '')}")
+    return texts
+
+
+def parity(threshold: float, from_mongo: int) -> int:
+    import numpy as np
+
+    texts = _texts(from_mongo)
+    reference = np.asarray(load_embedding_model("torch").encode(texts))
+    candidate = np.asarray(load_embedding_model("onnx").encode(texts))
+    if reference.shape != candidate.shape:
+        print(f"ÉCHEC : dimensions différentes {reference.shape} / {candidate.shape}")
+        return 1
+    cosines = (reference * candidate).sum(axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1))
+
+    # Accord sur le classement : même plus proche voisin parmi les textes pour chaque requête
+    ref_nn = np.argsort(-(reference @ reference.T), axis=1)[:, 1]
+    cand_nn = np.argsort(-(candidate @ candidate.T), axis=1)[:, 1]
+    nn_agreement = float((ref_nn == cand_nn).mean())
+
+    worst = int(cosines.argmin())
+    print(f"{len(texts)} texte(s), dimension {reference.shape[1]}")
+    print(f"Cosinus torch/onnx : min {cosines.min():.4f}, moyenne {cosines.mean():.4f} (seuil {threshold})")
+    print(f"Accord du plus proche voisin : {nn_agreement:.1%}")
+    print(f"Texte le moins fidèle : {texts[worst][:80]!r}")
+    if cosines.min() < threshold:
+        print("ÉCHEC : le backend onnx s'écarte trop du backend torch.")
+        return 1
+    print("OK : vecteurs compatibles avec l'index existant.")
+    return 0
+
+
+def _rss_mb() -> float:
+    # ru_maxrss est en Ko sous Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bench_backend(backend: str, runs: int, batch_size: int) -> dict:
+    rss_before = _rss_mb()
+    started = time.perf_counter()
+    model = load_embedding_model(backend)
+    load_seconds = time.perf_counter() - started
+    model.encode(SAMPLE_TEXTS[0])  # préchauffage
+
+    latencies = []
+    for i in range(runs):
+        text = SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)]
+        started = time.perf_counter()
+        model.encode(text)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+
+    batch = (SAMPLE_TEXTS * (batch_size // len(SAMPLE_TEXTS) + 1))[:batch_size]
+    started = time.perf_counter()
+    model.encode(batch, batch_size=batch_size)
+    batch_seconds = time.perf_counter() - started
+
+    return {
+        "backend": backend,
+        "load_seconds": round(load_seconds, 2),
+        "single_p50_ms": round(statistics.median(latencies), 2),
+        "single_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+        "batch_texts_per_second": round(batch_size / batch_seconds, 1),
+        "rss_mb": round(_rss_mb(), 1),
+        "rss_model_mb": round(_rss_mb() - rss_before, 1),
+    }
+
+
+def bench(backend: str, runs: int, batch_size: int):
+    if backend != "all":
+        print(json.dumps(bench_backend(backend, runs, batch_size)))
+        return
+    results = []
+    for name in ("torch", "onnx"):
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "bench", "--backend", name,
+             "--runs", str(runs), "--batch-size", str(batch_size)],
+            capture_output=True, text=True
+        )
+        if completed.returncode != 0:
+            print(f"Backend {name} indisponible : {completed.stderr.strip().splitlines()[-1:]}")
+            continue
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    columns = ["backend", "load_seconds", "single_p50_ms", "single_p95_ms", "batch_texts_per_second", "rss_mb"]
+    print(" | ".join(columns))
+    for result in results:
+        print(" | ".join(str(result[c]) for c in columns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export")
+    export_parser.add_argument("--out-dir", default=EMBEDDING_ONNX_DIR)
+    parity_parser = commands.add_parser("parity")
+    parity_parser.add_argument("--threshold", type=float, default=0.98)
+    parity_parser.add_argument("--from-mongo", type=int, default=0, help="Ajoute N documents de la base aux textes testés")
+    bench_parser = commands.add_parser("bench")
+    bench_parser.add_argument("--backend", default="all", choices=["all", "torch", "onnx"])
+    bench_parser.add_argument("--runs", type=int, default=200)
+    bench_parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export(args.out_dir)
+    elif args.command == "parity":
+        sys.exit(parity(args.threshold, args.from_mongo))
+    else:
+        bench(args.backend, args.runs, args.batch_size)
@@ -0,0 +1,109 @@
+"""
+Débit de l'indexation (utils/indexing.py) sur un corpus synthétique, en documents par seconde.
+
+Le corpus est généré en mémoire (vocabulaire support informatique, longueurs variables, graine fixe)
+et indexé dans une collection Chroma et un index lexical temporaires : ni MongoDB ni chroma_data
+ne sont touchés.
+Chaque configuration part d'un index vide (indexation complète).
+
+  python bench_indexing.py --docs 10000
+  python bench_indexing.py --docs 100000 --workers 0,2,4 --encode-batch-size 256 --upsert-batch-size 2000
+  python bench_indexing.py --docs 10000 --baseline   # ajoute la configuration d'origine (lots de 32, sans pool)
+"""
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+
+from utils.indexing import INDEX_CURSOR_BATCH_SIZE, INDEX_ENCODE_BATCH_SIZE, INDEX_UPSERT_BATCH_SIZE, reindex
+from utils.lexical_index import LEXICAL_INDEX_FILE, LexicalIndex
+
+VOCABULARY = (
+    "mot de passe compte utilisateur réinitialiser connexion session VPN réseau wifi imprimante "
+    "écran poste ordinateur portable logiciel installation licence messagerie Outlook synchronisation "
+    "ticket incident demande procédure serveur partage dossier droits accès sauvegarde restauration "
+    "téléphone badge bureau salle réunion visioconférence navigateur certificat mise à jour redémarrer "
+    "erreur message lenteur blocage configuration paramètre administrateur support technicien délai"
+).split()
+CATEGORIES = ["Compte", "Réseau", "Matériel", "Logiciel", "Messagerie", "Sécurité"]
+
+
+class SyntheticCorpus:
+    """Collection en mémoire exposant le sous-ensemble de l'API pymongo utilisé par `reindex`."""
+
+    def __init__(self, size: int, min_words: int = 40, max_words: int = 800, seed: int = 42):
+        self.size = size
+        self.min_words = min_words
+        self.max_words = max_words
+        self.seed = seed
+
+    def find(self, filter=None, projection=None, batch_size=None):
+        rng = random.Random(self.seed)
+        for i in range(self.size):
+            words = rng.choices(VOCABULARY, k=rng.randint(self.min_words, self.max_words))
+            yield {
+                "_id": f"synthetic-{i}",
+                "title": " ".join(rng.choices(VOCABULARY, k=5)).capitalize(),
+                "category": rng.choice(CATEGORIES),
+                "tags": rng.sample(VOCABULARY, 3),
+                "content": " ".join(words),
+            }
+
+
+def run(corpus: SyntheticCorpus, workers: int, encode_batch_size: int, upsert_batch_size: int,
+        cursor_batch_size: int) -> dict:
+    import chromadb
+
+    persist_dir = tempfile.mkdtemp(prefix="bench_indexing_")
+    try:
+        client = chromadb.PersistentClient(path=persist_dir)
+        collection = client.get_or_create_collection(name="bench_docs")
+        lexical = LexicalIndex(os.path.join(persist_dir, LEXICAL_INDEX_FILE))
+        summary = reindex(corpus, collection, persist_dir, full=True, workers=workers, lexical=lexical,
+                          cursor_batch_size=cursor_batch_size, encode_batch_size=encode_batch_size,
+                          upsert_batch_size=upsert_batch_size, log=lambda message: None)
+    finally:
+        shutil.rmtree(persist_dir, ignore_errors=True)
+    seconds = max(summary["seconds"], 1e-9)
+    return {
+        "workers": workers,
+        "encode_batch": encode_batch_size,
+        "upsert_batch": upsert_batch_size,
+        "docs": summary["added"],
+        "chunks": summary["chunks_written"],
+        "seconds": summary["seconds"],
+        "docs_per_second": round(summary["added"] / seconds, 1),
+        "chunks_per_second": round(summary["chunks_written"] / seconds, 1),
+    }
+
+
+def main(args):
+    corpus = SyntheticCorpus(args.docs, seed=args.seed)
+    configurations = []
+    if args.baseline:
+        # Configuration d'origine : lots de la taille du micro-batching, un upsert par lot, sans pool
+        configurations.append((0, 32, 32))
+    for workers in (int(w) for w in args.workers.split(",")):
+        configurations.append((workers, args.encode_batch_size, args.upsert_batch_size))
+
+    columns = ["workers", "encode_batch", "upsert_batch", "docs", "chunks", "seconds",
+               "docs_per_second", "chunks_per_second"]
+    print(f"Corpus synthétique : {args.docs} document(s)")
+    print(" | ".join(columns))
+    for workers, encode_batch_size, upsert_batch_size in configurations:
+        result = run(corpus, workers, encode_batch_size, upsert_batch_size, args.cursor_batch_size)
+        print(" | ".join(str(result[c]) for c in columns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=10000, help="Taille du corpus synthétique (10k à 100k)")
+    parser.add_argument("--workers", default="0,2", help="Nombres de processus d'encodage à comparer, séparés par des virgules")
+    parser.add_argument("--encode-batch-size", type=int, default=INDEX_ENCODE_BATCH_SIZE)
+    parser.add_argument("--upsert-batch-size", type=int, default=INDEX_UPSERT_BATCH_SIZE)
+    parser.add_argument("--cursor-batch-size", type=int, default=INDEX_CURSOR_BATCH_SIZE)
+    parser.add_argument("--baseline", action="store_true", help="Mesure aussi la configuration d'origine")
+    parser.add_argument("--seed", type=int, default=42)
+    main(parser.parse_args())
@@ -0,0 +1,75 @@
+"""
+Mesure du coût de démarrage de l'application et de la première requête de recherche.
+
+Chaque mesure est faite dans un processus Python neuf (import à froid) :
+  - import_app        : import de app_factory (et donc de tous les routeurs, dont routers/ai.py)
+  - create_app        : construction de l'application FastAPI
+  - first_search_cold : première recherche vectorielle sans préchauffage (modèle + Chroma chargés à ce moment)
+  - warm_up           : préchauffage explicite (retrieval_stack.warm_up)
+  - first_search_warm : première recherche après préchauffage
+
+Usage : python bench_startup.py [--runs 3] [--question "mot de passe"]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+CHILD = r"""
+import json, sys, time
+timings = {}
+started = time.perf_counter()
+import app_factory
+timings["import_app"] = time.perf_counter() - started
+
+started = time.perf_counter()
+app_factory.create_app()
+timings["create_app"] = time.perf_counter() - started
+
+from utils.retrieval import retrieval_stack
+question = sys.argv[2]
+if sys.argv[1] == "cold":
+    started = time.perf_counter()
+    retrieval_stack.search(question, 3)
+    timings["first_search_cold"] = time.perf_counter() - started
+else:
+    started = time.perf_counter()
+    retrieval_stack.warm_up()
+    timings["warm_up"] = time.perf_counter() - started
+    started = time.perf_counter()
+    retrieval_stack.search(question, 3)
+    timings["first_search_warm"] = time.perf_counter() - started
+print(json.dumps(timings))
+"""
+
+
+def run_child(mode: str, question: str) -> dict:
+    completed = subprocess.run([sys.executable, "-c", CHILD, mode, question], capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr else "échec du processus")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main(runs: int, question: str):
+    samples = {}
+    for i in range(runs):
+        for mode in ("cold", "warm"):
+            for name, seconds in run_child(mode, question).items():
+                samples.setdefault(name, []).append(seconds)
+        print(f"Passage {i + 1}/{runs} terminé.")
+
+    print(f"\n{'étape':<20} {'médiane (s)':>12} {'min (s)':>10} {'max (s)':>10}")
+    for name in ("import_app", "create_app", "first_search_cold", "warm_up", "first_search_warm"):
+        values = samples.get(name)
+        if values:
+            print(f"{name:<20} {statistics.median(values):>12.3f} {min(values):>10.3f} {max(values):>10.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Temps d'import, de démarrage et de première requête.")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--question", default="mot de passe")
+    args = parser.parse_args()
+    main(args.runs, args.question)
@@ -0,0 +1,98 @@
+"""
+Évaluation hors ligne de la recherche documentaire : rappel@k, MRR et latence par mode
+(vector, lexical, hybrid — voir utils/retrieval.py), sur l'index de production (chroma_data).
+
+Jeu d'évaluation : fichier JSONL, une question par ligne avec les IDs MongoDB des documents pertinents :
+  {"question": "Erreur 0x80070005 au lancement d'Outlook", "relevant": ["64f1c2..."]}
+Sans fichier, `--from-titles N` construit un jeu approximatif à partir de N documents de la base
+(question = titre du document, document pertinent = lui-même).
+
+  python eval_retrieval.py --eval-set eval_set.jsonl [--k 1,3,5] [--modes vector,lexical,hybrid]
+  python eval_retrieval.py --from-titles 200
+
+Les caches d'embeddings et de top-k sont vidés avant chaque mode pour que les latences soient
+comparables (sinon le mode hybrid profiterait des embeddings calculés par le mode vector).
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+
+from utils.embedding_cache import query_embedding_cache, topk_cache
+from utils.retrieval import RETRIEVAL_MODES, retrieval_stack
+
+
+def load_eval_set(path: str) -> list:
+    cases = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                case = json.loads(line)
+                cases.append({"question": case["question"], "relevant": {str(i) for i in case["relevant"]}})
+    return cases
+
+
+def eval_set_from_titles(limit: int) -> list:
+    cases = []
+    for doc in retrieval_stack.doc_collection.find({"title": {"$nin": [None, ""]}}, {"title": 1}).limit(limit):
+        cases.append({"question": doc["title"], "relevant": {str(doc["_id"])}})
+    return cases
+
+
+def evaluate(cases: list, mode: str, ks: list) -> dict:
+    query_embedding_cache.clear()
+    topk_cache.clear()
+    hits = {k: 0 for k in ks}
+    reciprocal_ranks, latencies = [], []
+    for case in cases:
+        started = time.perf_counter()
+        docs = retrieval_stack.search(case["question"], max(ks), mode)
+        latencies.append((time.perf_counter() - started) * 1000)
+        ranked = [str(doc["_id"]) for doc in docs]
+        for k in ks:
+            if case["relevant"] & set(ranked[:k]):
+                hits[k] += 1
+        first = next((rank for rank, doc_id in enumerate(ranked, start=1) if doc_id in case["relevant"]), None)
+        reciprocal_ranks.append(1 / first if first else 0.0)
+    latencies.sort()
+    result = {"mode": mode}
+    result.update({f"recall@{k}": round(hits[k] / len(cases), 3) for k in ks})
+    result.update({
+        "mrr": round(statistics.mean(reciprocal_ranks), 3),
+        "p50_ms": round(statistics.median(latencies), 1),
+        "p95_ms": round(latencies[max(int(len(latencies) * 0.95) - 1, 0)], 1),
+    })
+    return result
+
+
+def main(args) -> int:
+    cases = load_eval_set(args.eval_set) if args.eval_set else eval_set_from_titles(args.from_titles)
+    if not cases:
+        print("Jeu d'évaluation vide : indiquez --eval-set ou --from-titles N.")
+        return 1
+    ks = sorted(int(k) for k in args.k.split(","))
+    modes = [m.strip() for m in args.modes.split(",")]
+    unknown = [m for m in modes if m not in RETRIEVAL_MODES]
+    if unknown:
+        print(f"Mode(s) inconnu(s) : {', '.join(unknown)} (valeurs possibles : {', '.join(RETRIEVAL_MODES)})")
+        return 1
+
+    retrieval_stack.warm_up()
+    print(f"{len(cases)} question(s), {retrieval_stack.lexical_index.count()} passage(s) dans l'index lexical")
+    results = [evaluate(cases, mode, ks) for mode in modes]
+    columns = list(results[0])
+    print(" | ".join(columns))
+    for result in results:
+        print(" | ".join(str(result[c]) for c in columns))
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--eval-set", help="Fichier JSONL {question, relevant}")
+    parser.add_argument("--from-titles", type=int, default=0, help="Jeu construit à partir des titres de N documents")
+    parser.add_argument("--k", default="1,3,5")
+    parser.add_argument("--modes", default=",".join(RETRIEVAL_MODES))
+    sys.exit(main(parser.parse_args()))
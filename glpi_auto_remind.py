@@ -1,8 +1,11 @@
-import requests
 import time
 from datetime import datetime, timedelta
 import json
 
+from database import SessionLocal
+from utils import ticket_mirror
+from utils.glpi_client import glpi_http
+
 CONFIG_FILE = "config.json"
 
 def load_glpi_config():
@@ -24,7 +27,7 @@ def get_session_token():
         "App-Token": GLPI_APP_TOKEN,
         "Authorization": f"user_token {GLPI_USER_TOKEN}"
     }
-    response = requests.post(url, headers=headers)
+    response = glpi_http.post(url, headers=headers)
     data = response.json()
     print("Réponse initSession GLPI:", data)  # Ajoute cette ligne pour debug
     if isinstance(data, dict):
@@ -32,13 +35,30 @@ def get_session_token():
     else:
         return None
 
-def get_open_tickets(session_token):
+def kill_session(session_token):
+    """Ferme la session GLPI ouverte par le script pour ne pas la laisser orpheline."""
+    url = f"{GLPI_API_URL}/killSession"
+    headers = {
+        "App-Token": GLPI_APP_TOKEN,
+        "Session-Token": session_token
+    }
+    glpi_http.get(url, headers=headers)
+
+def get_open_tickets(session_token, threshold=None):
+    # Si le miroir local est à jour, on ne lit que les tickets ouverts sans activité récente
+    db = SessionLocal()
+    try:
+        if threshold and ticket_mirror.is_fresh(db):
+            return ticket_mirror.open_tickets_not_updated_since(db, threshold)
+    finally:
+        db.close()
+
     url = f"{GLPI_API_URL}/Ticket"
     headers = {
         "App-Token": GLPI_APP_TOKEN,
         "Session-Token": session_token
     }
-    response = requests.get(url, headers=headers)
+    response = glpi_http.get(url, headers=headers)
     return response.json()
 
 def get_last_update(ticket):
@@ -60,7 +80,7 @@ def add_reminder(session_token, ticket_id):
             "is_private": 0
         }
     }
-    response = requests.post(url, headers=headers, json=payload)
+    response = glpi_http.post(url, headers=headers, json=payload)
     return response.json()
 
 def main():
@@ -68,9 +88,9 @@ def main():
     if not session_token:
         print("Erreur d'authentification GLPI.")
         return
-    tickets = get_open_tickets(session_token)
     now = datetime.now()
     threshold = now - timedelta(hours=2)
+    tickets = get_open_tickets(session_token, threshold)
     for ticket in tickets:
         # Filtrer les tickets ouverts/nouveaux/en attente
         status = ticket.get('status')
@@ -89,6 +109,7 @@ def main():
         if last_update < threshold:
             print(f"Relance automatique du ticket {ticket['id']} (dernier update: {last_update})")
             add_reminder(session_token, ticket['id'])
+    kill_session(session_token)
 
 if __name__ == "__main__":
     main()
@@ -1,7 +1,7 @@
-import requests
-
 import json
 
+from utils.glpi_client import glpi_http
+
 CONFIG_FILE = "config.json"
 
 def load_glpi_config():
@@ -41,5 +41,5 @@ def remind_ticket(session_token, ticket_id, message=None):
             "is_private": 0
         }
     }
-    response = requests.post(url, headers=headers, json=payload)
+    response = glpi_http.post(url, headers=headers, json=payload)
     return response.json()
@@ -1,52 +1,49 @@
 """
-Script d'indexation des documents MongoDB dans ChromaDB avec génération d'embeddings via OpenAI.
+Script d'indexation des documents MongoDB dans ChromaDB (embeddings locaux Sentence Transformers).
 A lancer après avoir inséré les documents dans la collection 'documents' de la base 'mcp_backend'.
+Chaque document est découpé en passages (CHUNK_SIZE / CHUNK_OVERLAP, voir utils/chunking.py),
+indexés séparément avec l'ID du document parent.
+
+La ré-indexation est incrémentale (voir utils/indexing.py) : seuls les documents nouveaux ou
+modifiés sont ré-encodés, les documents supprimés de MongoDB sont retirés de l'index.
+Les passages sont aussi indexés en plein texte (utils/lexical_index.py) pour la recherche hybride.
+Usage : python index_docs_chroma.py [--full] [--workers N]
 """
 
+import argparse
 import os
+
 import chromadb
-from chromadb.config import Settings
 from pymongo import MongoClient
-from sentence_transformers import SentenceTransformer
-import os
 
-# Initialisation du modèle local Sentence Transformers (MiniLM)
-model = SentenceTransformer('all-MiniLM-L6-v2')
-
-# Connexion à MongoDB
-client = MongoClient("mongodb://localhost:27017/")
-db = client["mcp_backend"]
-collection = db["documents"]
-
-# Connexion à ChromaDB (stockage local par défaut)
-persist_dir = os.path.abspath("chroma_data")
-print("Chemin absolu de chroma_data (indexation):", persist_dir)
-chroma_client = chromadb.PersistentClient(path=persist_dir)
-collection_chroma = chroma_client.get_or_create_collection(name="cms_docs")
-
-def get_embedding(text):
-    """Génère un embedding local (Sentence Transformers) pour un texte donné."""
-    return model.encode(text).tolist()
-
-# Indexation des documents
-for doc in collection.find():
-    doc_id = str(doc["_id"])
-    title = doc.get("title", doc.get("filename", "")) # Utilise le titre, ou le nom de fichier, ou une chaîne vide
-    content = doc.get("content", "") # Utilise le contenu ou une chaîne vide
-    text = title + "\n" + content
-    embedding = get_embedding(text)
-    # Ajout dans ChromaDB
-    collection_chroma.add(
-    embeddings=[embedding],
-    documents=[text],
-    ids=[doc_id],
-    metadatas=[{
-        "category": doc.get("category", ""),
-        "tags": ", ".join(doc.get("tags", []))
-    }]
-)
-    print(f"Document {doc_id} indexé dans ChromaDB.")
-
-print("Indexation terminée. Les documents sont prêts pour la recherche vectorielle !")
-print("Nombre de docs dans ChromaDB (après indexation):", collection_chroma.count())
-print("Tous les IDs dans ChromaDB (après indexation):", collection_chroma.get()['ids'])
+from utils.chunking import CHUNK_OVERLAP, CHUNK_SIZE
+from utils.indexing import INDEX_WORKERS, reindex
+from utils.lexical_index import LexicalIndex, lexical_index_path
+
+
+def main(full: bool = False, workers: int = INDEX_WORKERS):
+    # Connexion à MongoDB
+    client = MongoClient("mongodb://localhost:27017/")
+    collection = client["mcp_backend"]["documents"]
+
+    # Connexion à ChromaDB (stockage local par défaut)
+    persist_dir = os.path.abspath("chroma_data")
+    print("Chemin absolu de chroma_data (indexation):", persist_dir)
+    chroma_client = chromadb.PersistentClient(path=persist_dir)
+    collection_chroma = chroma_client.get_or_create_collection(name="cms_docs")
+
+    print(f"Découpage en passages de {CHUNK_SIZE} mots (chevauchement {CHUNK_OVERLAP}).")
+    lexical = LexicalIndex(lexical_index_path(persist_dir))
+    summary = reindex(collection, collection_chroma, persist_dir, full=full, workers=workers, lexical=lexical)
+    print("Indexation terminée. Les documents sont prêts pour la recherche vectorielle !")
+    print("Nombre de passages dans ChromaDB (après indexation):", collection_chroma.count())
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Indexation incrémentale des documents dans ChromaDB.")
+    parser.add_argument("--full", action="store_true", help="Ré-encode tous les documents, même inchangés")
+    parser.add_argument("--workers", type=int, default=INDEX_WORKERS,
+                        help="Processus d'encodage (0 : encodage dans le processus courant)")
+    args = parser.parse_args()
+    main(full=args.full, workers=args.workers)
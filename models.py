@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Enum as SQLAlchemyEnum, DateTime, Text, JSON, func
+from sqlalchemy import Column, Integer, String, Boolean, Enum as SQLAlchemyEnum, DateTime, Text, JSON, func
 from database import Base
 import enum
 
@@ -39,3 +39,53 @@ class Document(Base):
     category = Column(String, index=True)
     date_creation = Column(DateTime(timezone=True), server_default=func.now())
     roles_allowed = Column(JSON, nullable=False) # Stocke une liste de rôles, ex: ["admin", "voter"]
+
+
+# --- Miroir local des tickets GLPI (synchronisé par utils/ticket_mirror.py) ---
+
+class GlpiTicket(Base):
+    __tablename__ = "glpi_tickets"
+
+    id = Column(Integer, primary_key=True, index=True)  # ID du ticket dans GLPI
+    name = Column(String)
+    status = Column(Integer, index=True)
+    requester_email = Column(String, index=True)  # Extrait de l'en-tête "Email du demandeur:"
+    date_creation = Column(DateTime, index=True)
+    date_mod = Column(DateTime, index=True)
+    is_deleted = Column(Boolean, default=False, index=True)
+    data = Column(JSON, nullable=False)  # Ticket complet tel que renvoyé par GLPI (expand_dropdowns)
+    synced_at = Column(DateTime)
+
+
+class GlpiTicketRequester(Base):
+    __tablename__ = "glpi_ticket_requesters"
+
+    ticket_id = Column(Integer, primary_key=True)
+    users_id = Column(Integer, primary_key=True, index=True)  # ID GLPI du demandeur (Ticket_User type 1)
+
+
+class GlpiFollowup(Base):
+    __tablename__ = "glpi_followups"
+
+    id = Column(Integer, primary_key=True, index=True)  # ID de l'ITILFollowup dans GLPI
+    ticket_id = Column(Integer, index=True, nullable=False)
+    date_creation = Column(DateTime, index=True)
+    date_mod = Column(DateTime, index=True)
+    data = Column(JSON, nullable=False)
+
+
+class GlpiSyncState(Base):
+    __tablename__ = "glpi_sync_state"
+
+    id = Column(String, primary_key=True)  # Nom du flux synchronisé, ex: "tickets"
+    last_date_mod = Column(DateTime, nullable=True)  # Plus grand date_mod déjà importé
+    last_success_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+
+
+class GlpiSyncLease(Base):
+    __tablename__ = "glpi_sync_lease"
+
+    id = Column(String, primary_key=True)  # Nom du flux synchronisé, ex: "tickets"
+    owner = Column(String, nullable=False)  # Processus qui synchronise ("hôte:pid")
+    expires_at = Column(DateTime, nullable=False)  # Sans renouvellement avant cette date, un autre processus prend le relais
@@ -1,15 +1,24 @@
 import re
 import logging
-from fastapi import APIRouter, Depends, Body
+import time
+from fastapi import APIRouter, Depends, Body, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from routers.auth import get_current_user
-from routers.glpi import _create_ticket_internal, _create_ticket_followup_internal, glpi_get_ticket
+from routers.glpi import _create_ticket_internal, _create_ticket_followup_internal, internal_glpi_get_ticket, _async_get_conversation
 from pydantic import BaseModel
-from typing import Optional
-from search_vector_llm import search_vector, build_prompt, call_llm
+from typing import Literal, Optional
+from search_vector_llm import search_vector, build_prompt, call_llm, stream_llm
 from datetime import datetime
 from pymongo import MongoClient
 from bson import ObjectId
 from schemas import User
+from utils.llm_router import LLMError, llm_router
+from utils.answer_cache import answer_cache
+from utils.embedding_cache import query_embedding_cache, read_index_version
+from utils.embedding_service import embedding_service
+from utils.intent_classifier import INTENT_FAQ_MIN_SIMILARITY, intent_fast_path
+from utils.llm_stream import IncrementalResponseParser, encode_event
+from utils.retrieval import CONTEXT_CONTENT_CHARS, RETRIEVAL_MODE, retrieval_stack
 
 # --- Configuration ---
 mongo_client = MongoClient("mongodb://localhost:27017/")
@@ -69,23 +78,26 @@ def is_valid_for_ticket_creation(fields: dict) -> bool:
 class ChatbotRequest(BaseModel):
     question: str
     ticket_id: Optional[int] = None
+    # Mode de recherche documentaire pour cette requête (RETRIEVAL_MODE par défaut)
+    retrieval_mode: Optional[Literal["vector", "lexical", "hybrid"]] = None
 
 class SummarizeRequest(BaseModel):
     ticket_id: int
 
-@router.post("/chatbot/ask")
-def ask_chatbot(request: ChatbotRequest, current_user=Depends(get_current_user)):
-    question = request.question
-
+def _log_request(request: ChatbotRequest, user_id: str):
     logs_collection.insert_one({
         "type": "request_received",
-        "user_id": str(getattr(current_user, "id", None) or getattr(current_user, "_id", None) or getattr(current_user, "email", "unknown_user")),
-        "question": question,
+        "user_id": user_id,
+        "question": request.question,
         "has_ticket_id": bool(request.ticket_id),
         "ticket_id": request.ticket_id,
         "timestamp": datetime.utcnow()
     }) # permet de looger toutes requete dans mongodb qui va servir de boite noire 
 
+def _quick_reply(request: ChatbotRequest, current_user, ticket_draft_key: str):
+    """Réponses sans LLM (suivi de ticket, annulation, statut). Retourne None si la question va au LLM."""
+    question = request.question
+
     # --- 0. GESTION PRIORITAIRE : AJOUT D'UN SUIVI À UN TICKET EXISTANT ---
     if request.ticket_id:
         logs_collection.insert_one({"type": "log", "message": f"Début de l'ajout d'un suivi au ticket {request.ticket_id}", "timestamp": datetime.utcnow()})
@@ -101,9 +113,6 @@ def ask_chatbot(request: ChatbotRequest, current_user=Depends(get_current_user))
             logs_collection.insert_one({"type": "error", "message": f"Échec de l'ajout du suivi au ticket {request.ticket_id}", "error": followup_result.get('error'), "timestamp": datetime.utcnow()})
             return {"type": "error", "message": f"L'ajout de votre suivi a échoué: {followup_result.get('error')}"}
 
-    user_id = str(getattr(current_user, "id", None) or getattr(current_user, "_id", None) or getattr(current_user, "email", "unknown_user"))
-    ticket_draft_key = f"draft_{user_id}"
-
     # --- 1. GESTION DES INTENTIONS SIMPLES (Réponse rapide sans LLM) ---
     # Annulation explicite
     if question.strip().lower() in ["annuler", "stop", "laisse tomber"]:
@@ -115,26 +124,97 @@ def ask_chatbot(request: ChatbotRequest, current_user=Depends(get_current_user))
         ticket_match = re.search(r"(\d+)", question)
         if ticket_match:
             ticket_id = int(ticket_match.group(1))
-            from routers.glpi import internal_glpi_get_ticket
-            # Note: internal_glpi_get_ticket doit être adaptée pour ne pas dépendre de Depends
             status_result = internal_glpi_get_ticket(ticket_id=ticket_id, current_user=current_user)
             return {"type": "ticket_status", "ticket_id": ticket_id, "status_result": mongo_to_json(status_result)}
 
-    # --- 2. LOGIQUE DE CONVERSATION INTELLIGENTE (Pilotée par LLM) ---
-    ticket_draft = drafts_collection.find_one({"_id": ticket_draft_key}) or {}
+    return None
+
+def _fast_path_reply(question: str, ticket_draft: dict, user_id: str, retrieval_mode: str = None):
+    """
+    Réponse sans LLM quand le classifieur d'intention local (utils/intent_classifier.py) est sûr de lui :
+    salutation, ou FAQ dont le meilleur passage est très proche de la question.
+    Retourne (réponse ou None, prédiction, documents) ; la prédiction est journalisée avec le tour dans les deux cas.
+    `documents` : résultat de la recherche faite pour une FAQ lorsque `retrieval_mode` (mode de la requête) est
+    aussi vector, à réutiliser comme contexte du LLM plutôt que de relancer la recherche ; None sinon.
+    """
+    if ticket_draft.get("in_progress"):
+        # Une création de ticket est en cours : le LLM doit voir l'historique
+        intent_fast_path.record(declined="ticket_in_progress")
+        return None, None, None
+    try:
+        prediction = intent_fast_path.predict(question)
+    except Exception as e:
+        logging.warning(f"Classifieur d'intention en échec, passage au LLM: {e}")
+        return None, None, None
+    if prediction is None or not prediction["eligible"]:
+        intent_fast_path.record(declined="low_confidence" if prediction else None)
+        return None, prediction, None
+
+    reply, docs = None, None
+    if prediction["intent"] == "SALUTATION":
+        reply = {"type": "faq", "message": "Bonjour ! En quoi puis-je vous aider aujourd'hui ?"}
+    elif prediction["intent"] == "FAQ":
+        # Recherche vectorielle : seule sa distance mesure la proximité du passage. En mode hybrid, la
+        # recherche du contexte retrouve ensuite ce résultat Chroma dans le cache top-k.
+        docs = search_vector(question, mode="vector")
+        if docs and docs[0].get("distance") is not None:
+            prediction["doc_similarity"] = round(retrieval_stack.similarity(docs[0]["distance"]), 3)
+            if prediction["doc_similarity"] >= INTENT_FAQ_MIN_SIMILARITY:
+                doc = docs[0]
+                excerpt = doc["passages"][0] if doc.get("passages") else (doc.get("content") or "")[:CONTEXT_CONTENT_CHARS]
+                reply = {"type": "faq", "message": f"Voici ce que j'ai trouvé dans la base de connaissances :\n\n**{doc.get('title', '')}**\n{excerpt.strip()}",
+                         "source": {"_id": str(doc["_id"]), "title": doc.get("title", "")}}
+    if reply is None:
+        intent_fast_path.record(declined=f"{prediction['intent'].lower()}_no_match")
+        reusable = docs is not None and (retrieval_mode or RETRIEVAL_MODE).lower() == "vector"
+        return None, prediction, docs if reusable else None
+
+    intent_fast_path.record(intent=prediction["intent"])
+    logs_collection.insert_one({
+        "user_id": user_id, "question": question, "fast_path": True,
+        "intent_prediction": prediction, "response": reply["message"],
+        "timestamp": datetime.utcnow()
+    })
+    return reply, prediction, None
+
+def _cached_answer(question: str, context: list, ticket_draft: dict, user_id: str, current_user):
+    """
+    Réponse FAQ en cache sémantique (utils/answer_cache.py) pour une question proche, même rôle et mêmes documents.
+    Retourne (réponse ou None, référence à passer à _finish_turn pour mettre la réponse du LLM en cache).
+    """
+    if ticket_draft.get("in_progress") or not context:
+        return None, None
+    started = time.perf_counter()
+    key = answer_cache.key(getattr(current_user, "role", None), [doc["_id"] for doc in context])
+    embedding = query_embedding_cache.encode(embedding_service.encode, question)
+    version = read_index_version(retrieval_stack.persist_dir, retrieval_stack.collection_name)
+    cached = answer_cache.get(key, embedding, version)
+    if cached is None:
+        return None, (key, embedding, version)
+    cached["lookup_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    logs_collection.insert_one({
+        "user_id": user_id, "question": question, "answer_cache": cached,
+        "response": cached["answer"], "timestamp": datetime.utcnow()
+    })
+    return {"type": "faq", "message": cached["answer"], "cached": True}, None
+
+def _finish_turn(question: str, prompt: str, llm_response_text: str, ticket_draft: dict, user_id: str,
+                 ticket_draft_key: str, current_user, timings: dict = None, intent_prediction: dict = None,
+                 answer_ref: tuple = None):
+    """
+    Analyse la réponse du LLM, journalise le tour et fait avancer le brouillon de ticket.
+    `answer_ref` (voir _cached_answer) : une réponse FAQ est mise en cache sémantique.
+    """
     history = ticket_draft.get("history", [])
     fields = ticket_draft.get("fields", {})
-
-    # Appel au LLM avec l'historique complet pour comprendre le contexte
-    context = search_vector(question)
-    prompt = build_prompt(question, context, history)
-    llm_response_text = call_llm(prompt) #qui permet d'envoyer le prompt a Together.aia
     parsed_response = parse_llm_response(llm_response_text)
 
     # Log de la transaction pour la traçabilité
     logs_collection.insert_one({
         "user_id": user_id, "question": question, "llm_prompt": prompt,
         "llm_raw_response": llm_response_text, "llm_parsed_response": parsed_response,
+        "intent_prediction": intent_prediction,  # comparée hors ligne à l'intention du LLM
+        **(timings or {}),
         "timestamp": datetime.utcnow()
     })
 
@@ -145,6 +225,9 @@ def ask_chatbot(request: ChatbotRequest, current_user=Depends(get_current_user))
             final_response = "Bonjour ! En quoi puis-je vous aider aujourd'hui ?"
         else:
             final_response = parsed_response.get("REPONSE", "Je continue de collecter les informations. Pouvez-vous m'en dire plus ?")
+            if answer_ref and parsed_response.get("INTENTION") == "FAQ" and parsed_response.get("REPONSE"):
+                key, embedding, version = answer_ref
+                answer_cache.put(key, question, embedding, final_response, version, (timings or {}).get("llm_total_ms"))
         return {"type": "faq", "message": final_response}
 
     # --- 3. CUMUL DES INFORMATIONS ET GESTION DE LA CRÉATION DE TICKET ---
@@ -193,31 +276,147 @@ def ask_chatbot(request: ChatbotRequest, current_user=Depends(get_current_user))
 
     return {"type": "conversation", "message": user_message}
 
+@router.post("/chatbot/ask")
+def ask_chatbot(request: ChatbotRequest, current_user=Depends(get_current_user)):
+    question = request.question
+    user_id = str(getattr(current_user, "id", None) or getattr(current_user, "_id", None) or getattr(current_user, "email", "unknown_user"))
+    ticket_draft_key = f"draft_{user_id}"
+    _log_request(request, user_id)
+
+    quick_reply = _quick_reply(request, current_user, ticket_draft_key)
+    if quick_reply is not None:
+        return quick_reply
+
+    # --- 2. LOGIQUE DE CONVERSATION INTELLIGENTE (Pilotée par LLM) ---
+    ticket_draft = drafts_collection.find_one({"_id": ticket_draft_key}) or {}
+    fast_reply, intent_prediction, docs = _fast_path_reply(question, ticket_draft, user_id, request.retrieval_mode)
+    if fast_reply is not None:
+        return fast_reply
+
+    # Appel au LLM avec l'historique complet pour comprendre le contexte
+    # Documents déjà retrouvés par le raccourci (mode vector) : pas de seconde recherche
+    context = docs if docs is not None else search_vector(question, mode=request.retrieval_mode)
+    cached_reply, answer_ref = _cached_answer(question, context, ticket_draft, user_id, current_user)
+    if cached_reply is not None:
+        return cached_reply
+    prompt = build_prompt(question, context, ticket_draft.get("history", []))
+    started = time.perf_counter()
+    try:
+        llm_response_text = call_llm(prompt) #qui permet d'envoyer le prompt au LLM (routeur multi-fournisseurs)
+    except LLMError as e:
+        _log_llm_error(user_id, question, e)
+        raise HTTPException(status_code=503, detail="Le service IA n'est pas disponible. Veuillez réessayer dans quelques instants.")
+    timings = {"llm_total_ms": round((time.perf_counter() - started) * 1000, 1)}
+    return _finish_turn(question, prompt, llm_response_text, ticket_draft, user_id, ticket_draft_key, current_user,
+                        timings, intent_prediction, answer_ref)
+
+@router.post("/chatbot/ask/stream")
+def ask_chatbot_stream(
+    request: ChatbotRequest,
+    format: str = Query("ndjson", regex="^(ndjson|sse)$", description="ndjson (une ligne JSON par événement) ou sse (Server-Sent Events)"),
+    current_user=Depends(get_current_user)
+):
+    """
+    Variante en flux de /chatbot/ask. Événements, dans l'ordre :
+    - `field` ({name, value}) : un champ d'en-tête de la réponse du LLM (INTENTION, TITRE, ...) dès qu'il est complet ;
+    - `token` ({text}) : un morceau du texte de REPONSE, dès sa génération ;
+    - `done` ({result}) : le résultat final, identique à celui de /chatbot/ask (brouillon et création de ticket compris) ;
+    - `error` ({message}) : aucun fournisseur LLM n'a répondu, ou le flux a été interrompu (pas d'événement `done`).
+    Les réponses sans LLM (suivi, annulation, statut, raccourci du classifieur d'intention, cache de réponses) ne produisent que l'événement `done`.
+    """
+    question = request.question
+    user_id = str(getattr(current_user, "id", None) or getattr(current_user, "_id", None) or getattr(current_user, "email", "unknown_user"))
+    ticket_draft_key = f"draft_{user_id}"
+    _log_request(request, user_id)
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}  # pas de mise en tampon par un proxy
+
+    quick_reply = _quick_reply(request, current_user, ticket_draft_key)
+    if quick_reply is not None:
+        return StreamingResponse(iter([encode_event({"event": "done", "result": quick_reply}, format)]),
+                                 media_type=media_type, headers=headers)
+
+    ticket_draft = drafts_collection.find_one({"_id": ticket_draft_key}) or {}
+    fast_reply, intent_prediction, docs = _fast_path_reply(question, ticket_draft, user_id, request.retrieval_mode)
+    if fast_reply is not None:
+        return StreamingResponse(iter([encode_event({"event": "done", "result": fast_reply}, format)]),
+                                 media_type=media_type, headers=headers)
+
+    # Documents déjà retrouvés par le raccourci (mode vector) : pas de seconde recherche
+    context = docs if docs is not None else search_vector(question, mode=request.retrieval_mode)
+    cached_reply, answer_ref = _cached_answer(question, context, ticket_draft, user_id, current_user)
+    if cached_reply is not None:
+        return StreamingResponse(iter([encode_event({"event": "done", "result": cached_reply}, format)]),
+                                 media_type=media_type, headers=headers)
+    prompt = build_prompt(question, context, ticket_draft.get("history", []))
+
+    def stream():
+        started = time.perf_counter()
+        first_token_ms = None
+        parser = IncrementalResponseParser()
+        chunks = []
+        try:
+            for chunk in stream_llm(prompt):
+                chunks.append(chunk)
+                for event in parser.feed(chunk):
+                    if event[0] == "token" and first_token_ms is None:
+                        first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+                    yield encode_event(_stream_event(event), format)
+        except LLMError as e:
+            # Réponse absente ou incomplète : ni analyse, ni brouillon, ni mise en cache
+            _log_llm_error(user_id, question, e)
+            yield encode_event({"event": "error", "message": "Le service IA n'est pas disponible. Veuillez réessayer dans quelques instants."}, format)
+            return
+        for event in parser.close():
+            yield encode_event(_stream_event(event), format)
+        timings = {"ttft_ms": first_token_ms, "llm_total_ms": round((time.perf_counter() - started) * 1000, 1)}
+        # Le texte complet passe par la même logique que /chatbot/ask (brouillon, création de ticket)
+        result = _finish_turn(question, prompt, "".join(chunks), ticket_draft, user_id, ticket_draft_key,
+                              current_user, timings, intent_prediction, answer_ref)
+        yield encode_event({"event": "done", "result": result}, format)
+
+    return StreamingResponse(stream(), media_type=media_type, headers=headers)
+
+def _log_llm_error(user_id: str, question: str, error: LLMError):
+    logging.error(f"Service LLM indisponible pour la question de {user_id}: {error}")
+    logs_collection.insert_one({"type": "error", "user_id": user_id, "question": question,
+                                "message": "Échec de l'appel LLM", **error.to_dict(), "timestamp": datetime.utcnow()})
+
+def _stream_event(event: tuple) -> dict:
+    if event[0] == "token":
+        return {"event": "token", "text": event[1]}
+    return {"event": "field", "name": event[1], "value": event[2]}
+
 @router.post("/summarize_ticket")
-def summarize_ticket(request: SummarizeRequest, current_user: User = Depends(get_current_user)):
+async def summarize_ticket(request: SummarizeRequest, current_user: User = Depends(get_current_user)):
     """Génère un résumé d'une conversation de ticket en utilisant un LLM."""
     if current_user.role.value not in ["admin", "agent_support", "agent_interne"]:
         raise HTTPException(status_code=403, detail="Accès non autorisé")
 
     try:
-        # 1. Récupérer les détails complets du ticket en utilisant la fonction existante
-        ticket_data = glpi_get_ticket(ticket_id=request.ticket_id, current_user=current_user)
+        # 1. Récupérer le ticket et ses suivis en un seul appel (lectures GLPI en parallèle)
+        ticket_data = await _async_get_conversation(request.ticket_id, current_user)
 
         # 2. Formater la conversation pour le LLM
         conversation_text = f"Titre du Ticket: {ticket_data['name']}\nDescription initiale: {ticket_data['content']}\n\nHistorique de la conversation:\n"
         
-        sorted_followups = sorted(ticket_data.get('followups', []), key=lambda f: f['date_creation'])
+        sorted_followups = sorted(ticket_data.get('followups', []), key=lambda f: f.get('date_creation') or f.get('date') or '')
 
         for followup in sorted_followups:
-            sender = "Agent" if 'AGENT_MSG::' in followup['content'] else "Client"
-            message = followup['content'].replace('AGENT_MSG::', '').replace('CLIENT_MSG::', '').strip()
+            content = followup.get('content') or ''
+            sender = "Agent" if 'AGENT_MSG::' in content else "Client"
+            message = content.replace('AGENT_MSG::', '').replace('CLIENT_MSG::', '').strip()
             conversation_text += f"- {sender}: {message}\n"
 
         # 3. Créer le prompt pour le LLM
         summary_prompt = f"Voici une conversation de ticket de support. Agis comme un expert du support technique et fournis un résumé très concis (3-4 phrases maximum) qui capture l'essentiel du problème, les actions déjà prises, et l'état actuel. Le résumé doit être en français.\n\n---\n{conversation_text}---\n"
 
-        # 4. Appeler le service LLM pour obtenir le résumé
-        summary = get_llm_answer(summary_prompt, []) # Pas d'historique de chat ici
+        # 4. Appeler le service LLM pour obtenir le résumé (clients asynchrones partagés, couverture et repli)
+        try:
+            summary = await llm_router.acomplete(summary_prompt) # Pas d'historique de chat ici
+        except LLMError as e:
+            logging.error(f"Service LLM indisponible pour le résumé du ticket {request.ticket_id}: {e}")
+            raise HTTPException(status_code=503, detail="Le service IA n'est pas disponible.")
 
         return {"summary": summary}
 
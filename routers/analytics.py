@@ -5,12 +5,16 @@ from fastapi import APIRouter, Depends, HTTPException
 from dependencies import get_current_agent_or_admin_user
 from routers.glpi import get_session_token
 from routers.configuration import load_config as load_glpi_config
+from utils.glpi_client import glpi_breaker
+from utils.glpi_session import glpi_session, GlpiUnavailableError
+from utils import ticket_mirror
+from utils.llm_providers import llm_providers
+from database import get_db
+from sqlalchemy.orm import Session
 import requests
-from urllib.parse import urljoin
 from datetime import datetime, timedelta
 import re
 from collections import Counter
-import together
 import os
 
 router = APIRouter(
@@ -30,13 +34,17 @@ STOP_WORDS = set([
     "probleme", "ticket", "demande", "aide", "support", "bonjour", "merci", "svp", "stp", "urgent"
 ])
 
-def _get_glpi_count(session: requests.Session, glpi_url: str, params: dict = None) -> int:
+def _use_mirror(db: Session) -> bool:
+    """Miroir frais, ou miroir de n'importe quel âge lorsque le disjoncteur GLPI est ouvert."""
+    return ticket_mirror.is_fresh(db) or (glpi_breaker.is_open and ticket_mirror.is_fresh(db, max_staleness=None))
+
+def _get_glpi_count(params: dict = None) -> int:
     """Effectue un appel à l'API GLPI pour obtenir un nombre d'éléments."""
     if params is None:
         params = {}
     params['count'] = 'true'
     try:
-        response = session.get(urljoin(glpi_url, 'Ticket'), params=params, timeout=20)
+        response = glpi_session.request("GET", 'Ticket', params=params, timeout=20)
         response.raise_for_status()
         data = response.json()
         # Si la recherche ne trouve rien, GLPI peut renvoyer une liste vide au lieu de {'count': 0}
@@ -47,24 +55,19 @@ def _get_glpi_count(session: requests.Session, glpi_url: str, params: dict = Non
         raise HTTPException(status_code=503, detail=f"Erreur de comptage GLPI: {e}")
 
 @router.get("/stats", dependencies=[Depends(get_current_agent_or_admin_user)])
-def get_main_stats():
+def get_main_stats(db: Session = Depends(get_db)):
     """Fournit les statistiques clés en utilisant des requêtes de comptage efficaces."""
-    config = load_glpi_config()
-    glpi_url = config.get("GLPI_API_URL")
-    app_token = config.get("GLPI_APP_TOKEN")
-    session_token = get_session_token()
-    if not session_token:
-        raise HTTPException(status_code=503, detail="Connexion à GLPI impossible.")
+    if _use_mirror(db):
+        # Comptages sur les colonnes indexées du miroir local
+        total_tickets = ticket_mirror.count_tickets(db)
+        resolved_count = ticket_mirror.count_tickets(db, statuses=RESOLVED_STATUSES)
+    else:
+        session_token = get_session_token()
+        if not session_token:
+            raise HTTPException(status_code=503, detail="Connexion à GLPI impossible.")
+
+        total_tickets = _get_glpi_count(params={'is_deleted': '0'})
 
-    with requests.Session() as session:
-        session.headers.update({
-            "Session-Token": session_token,
-            "App-Token": app_token,
-            "Content-Type": "application/json"
-        })
-        
-        total_tickets = _get_glpi_count(session, glpi_url, params={'is_deleted': '0'})
-        
         resolved_params = {
             'criteria[0][field]': 'status',
             'criteria[0][searchtype]': 'equals',
@@ -72,7 +75,7 @@ def get_main_stats():
         for i, status in enumerate(RESOLVED_STATUSES):
             resolved_params[f'criteria[0][value][{i}]'] = status
 
-        resolved_count = _get_glpi_count(session, glpi_url, params=resolved_params)
+        resolved_count = _get_glpi_count(params=resolved_params)
 
     if total_tickets == 0:
         return {"total_tickets": 0, "avg_response_time_hours": 0, "resolution_rate_percent": 0}
@@ -88,32 +91,26 @@ def get_main_stats():
     }
 
 @router.get("/recurring-issues", dependencies=[Depends(get_current_agent_or_admin_user)])
-def get_recurring_issues(days: int = 30):
+def get_recurring_issues(days: int = 30, db: Session = Depends(get_db)):
     """Analyse les titres des tickets récents pour identifier les problèmes fréquents."""
-    config = load_glpi_config()
-    glpi_url = config.get("GLPI_API_URL")
-    app_token = config.get("GLPI_APP_TOKEN")
-    session_token = get_session_token()
-    if not session_token:
-        raise HTTPException(status_code=503, detail="Connexion à GLPI impossible.")
-
-    cutoff_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
-    
-    params = {
-        'criteria[0][field]': 'date_creation',
-        'criteria[0][searchtype]': 'greater',
-        'criteria[0][value]': cutoff_date,
-        'is_deleted': '0'
-    }
+    cutoff = datetime.now() - timedelta(days=days)
+
+    if _use_mirror(db):
+        recent_tickets = ticket_mirror.tickets_created_since(db, cutoff)
+    else:
+        session_token = get_session_token()
+        if not session_token:
+            raise HTTPException(status_code=503, detail="Connexion à GLPI impossible.")
+
+        params = {
+            'criteria[0][field]': 'date_creation',
+            'criteria[0][searchtype]': 'greater',
+            'criteria[0][value]': cutoff.strftime('%Y-%m-%d %H:%M:%S'),
+            'is_deleted': '0'
+        }
 
-    with requests.Session() as session:
-        session.headers.update({
-            "Session-Token": session_token,
-            "App-Token": app_token,
-            "Content-Type": "application/json"
-        })
         try:
-            response = session.get(urljoin(glpi_url, 'Ticket'), params=params, timeout=30)
+            response = glpi_session.request("GET", 'Ticket', params=params, timeout=30)
             response.raise_for_status()
             recent_tickets = response.json()
         except requests.exceptions.RequestException as e:
@@ -128,30 +125,24 @@ def get_recurring_issues(days: int = 30):
     word_counts = Counter(filtered_words)
     return word_counts.most_common(10)
 
-def _get_ticket_details_for_summary(session: requests.Session, glpi_url: str, ticket_id: int):
+def _get_ticket_details_for_summary(ticket_id: int):
     """Récupère les détails d'un ticket spécifique pour le résumé."""
-    config = load_glpi_config()
-    headers = {
-        "Session-Token": get_session_token(),
-        "App-Token": config.get("GLPI_APP_TOKEN"),
-        "Content-Type": "application/json"
-    }
     try:
-        ticket_url = urljoin(glpi_url, f"Ticket/{ticket_id}")
-        response = session.get(ticket_url, headers=headers, timeout=20)
+        response = glpi_session.request("GET", f"Ticket/{ticket_id}", timeout=20)
         response.raise_for_status()
         return response.json()
+    except GlpiUnavailableError:
+        raise HTTPException(status_code=503, detail="Connexion à GLPI impossible.")
     except requests.exceptions.RequestException as e:
         print(f"Erreur de communication avec GLPI pour le ticket {ticket_id}: {e}")
         return None
 
 def _call_together_ai_for_summary(prompt: str, api_key: str) -> str:
-    """Appelle l'API Together.ai pour générer un résumé."""
+    """Appelle l'API Together.ai pour générer un résumé (client partagé du registre LLM)."""
     try:
-        together.api_key = api_key
-        response = together.Complete.create(
+        summary = llm_providers.get("together", api_key=api_key).complete(
+            f"Résume le ticket de support suivant en une seule phrase concise en français: {prompt}",
             model="mistralai/Mixtral-8x7B-Instruct-v0.1",
-            prompt=f"[INST] Résume le ticket de support suivant en une seule phrase concise en français: {prompt} [/INST]",
             max_tokens=100,
             temperature=0.7,
             top_k=50,
@@ -159,14 +150,9 @@ def _call_together_ai_for_summary(prompt: str, api_key: str) -> str:
             repetition_penalty=1,
             stop=["\n", "[/INST]"]
         )
-        print(f"DEBUG: Full response from Together.ai: {response}")
-
-        if 'choices' in response and len(response['choices']) > 0:
-            summary = response['choices'][0]['text']
-            return summary.strip()
-        else:
-            error_message = response.get('error', {}).get('message', str(response))
-            raise ValueError(f"Réponse inattendue ou vide de l'API Together.ai: {error_message}")
+        if not summary or not summary.strip():
+            raise ValueError("Réponse vide de l'API Together.ai")
+        return summary.strip()
     except Exception as e:
         print(f"Erreur lors de l'appel à Together.ai: {e}")
         raise HTTPException(status_code=503, detail=f"Le service IA n'est pas disponible: {e}")
@@ -175,19 +161,17 @@ def _call_together_ai_for_summary(prompt: str, api_key: str) -> str:
 @router.get("/ticket-summary/{ticket_id}", dependencies=[Depends(get_current_agent_or_admin_user)])
 def get_ticket_summary(ticket_id: int):
     config = load_glpi_config()
-    glpi_url = config.get("GLPI_API_URL")
     together_api_key = config.get("TOGETHER_API_KEY") or os.environ.get("TOGETHER_API_KEY")
 
     if not together_api_key:
         raise HTTPException(status_code=500, detail="La clé API pour le service IA n'est pas configurée.")
 
-    with requests.Session() as session:
-        ticket = _get_ticket_details_for_summary(session, glpi_url, ticket_id)
-        if not ticket:
-            raise HTTPException(status_code=404, detail="Ticket non trouvé ou erreur de communication GLPI.")
+    ticket = _get_ticket_details_for_summary(ticket_id)
+    if not ticket:
+        raise HTTPException(status_code=404, detail="Ticket non trouvé ou erreur de communication GLPI.")
+
+    prompt = f"Titre: {ticket.get('name', '')}\nDescription: {ticket.get('content', '')}"
+
+    summary = _call_together_ai_for_summary(prompt, api_key=together_api_key)
 
-        prompt = f"Titre: {ticket.get('name', '')}\nDescription: {ticket.get('content', '')}"
-        
-        summary = _call_together_ai_for_summary(prompt, api_key=together_api_key)
-        
-        return {"summary": summary}
+    return {"summary": summary}
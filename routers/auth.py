@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, status
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
 
@@ -10,12 +10,19 @@ from dependencies import (
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
 from database import get_mongo_db
-from routers.glpi import get_session_token, get_or_create_glpi_user
+from routers.glpi import get_or_create_glpi_user
+from utils.glpi_user_cache import glpi_user_cache
 
 router = APIRouter()
 
+def resolve_glpi_user_id(user_id, email, name, role):
+    """Tâche d'arrière-plan : résout (ou crée) l'utilisateur GLPI et enregistre son ID dans MongoDB."""
+    glpi_user_id = get_or_create_glpi_user(email=email, name=name, role=role)
+    if glpi_user_id:
+        get_mongo_db()["users"].update_one({"_id": user_id}, {"$set": {"glpi_user_id": glpi_user_id}})
+
 @router.post("/login", response_model=schemas.TokenWithUser)
-def login(form_data: OAuth2PasswordRequestForm = Depends()):
+def login(background_tasks: BackgroundTasks, form_data: OAuth2PasswordRequestForm = Depends()):
     """
     Connecte l'utilisateur via MongoDB et retourne un token JWT.
     """
@@ -38,23 +45,22 @@ def login(form_data: OAuth2PasswordRequestForm = Depends()):
             detail=f"Votre compte est inactif (statut: {user_data.get('status')}). Veuillez contacter un administrateur."
         )
 
-    # Récupérer et stocker l'ID utilisateur GLPI s'il n'existe pas
+    # Récupérer et stocker l'ID utilisateur GLPI s'il n'existe pas.
+    # Seul le cache est consulté ici : l'appel à GLPI se fait après la réponse, en tâche de fond.
     glpi_user_id = user_data.get("glpi_user_id")
     if not glpi_user_id:
-        session_token = get_session_token()
-        if session_token:
-            glpi_user_id = get_or_create_glpi_user(
-                session_token=session_token,
-                email=user_data["email"],
-                name=user_data.get("name"),
-                role=user_data.get("role")
+        found, glpi_user_id = glpi_user_cache.lookup(user_data["email"])
+        if glpi_user_id:
+            users_collection.update_one(
+                {"_id": user_data["_id"]},
+                {"$set": {"glpi_user_id": glpi_user_id}}
+            )
+            user_data["glpi_user_id"] = glpi_user_id  # Mettre à jour la variable locale
+        elif not found:
+            background_tasks.add_task(
+                resolve_glpi_user_id,
+                user_data["_id"], user_data["email"], user_data.get("name"), user_data.get("role")
             )
-            if glpi_user_id:
-                users_collection.update_one(
-                    {"_id": user_data["_id"]},
-                    {"$set": {"glpi_user_id": glpi_user_id}}
-                )
-                user_data["glpi_user_id"] = glpi_user_id  # Mettre à jour la variable locale
 
     # L'objet utilisateur doit correspondre au schéma `schemas.User`
     user_for_response = schemas.User(
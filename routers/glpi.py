@@ -1,59 +1,100 @@
 from collections import Counter
-from fastapi import APIRouter, Body, Depends, HTTPException
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Optional
 from models import User
 from dependencies import get_current_user
-from routers.configuration import load_config as load_glpi_config
+import asyncio
+import json
+import httpx
 import requests
 import logging
+from utils.glpi_session import glpi_session, GlpiUnavailableError
+from utils.glpi_user_cache import glpi_user_cache, normalize_email
+from utils.glpi_async_client import (
+    glpi_async, run_until_disconnect, SEARCH_OPTION_REQUESTER, TICKET_SEARCH_FIELDS, ticket_date_mod_params,
+    date_mod_from_search
+)
+from utils.ticket_cache import ticket_cache
+from utils import ticket_mirror
+from utils.ticket_mirror import EMAIL_HEADER_PREFIX, parse_requester_email, requester_ids_from_links
+from database import SessionLocal
+from starlette.concurrency import run_in_threadpool
 
 router = APIRouter()
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def url_joiner(base_url, path):
-    """Joins a base URL and a path, handling trailing slashes."""
-    return f"{base_url.rstrip('/')}/{path.lstrip('/')}"
-
 # --- Fonctions Utilitaires GLPI ---
 
 def get_session_token():
-    """Obtient un session_token GLPI."""
-    try:
-        config = load_glpi_config()
-        url = url_joiner(config['GLPI_API_URL'], 'initSession')
-        headers = {
-            "App-Token": config['GLPI_APP_TOKEN'],
-            "Authorization": f"user_token {config['GLPI_USER_TOKEN']}"
-        }
-        response = requests.post(url, headers=headers)
+    """Obtient le session_token GLPI partagé (réutilisé tant qu'il est valide)."""
+    return glpi_session.get_token()
+
+# Options de recherche GLPI (search/User)
+USER_SEARCH_ID, USER_SEARCH_NAME, USER_SEARCH_EMAIL = 2, 1, 5
+
+def _user_search_params(criteria: list, start: int = 0, end: int = 0) -> dict:
+    params = {'range': f'{start}-{end}'}
+    for i, criterion in enumerate(criteria):
+        for key, value in criterion.items():
+            params[f'criteria[{i}][{key}]'] = value
+    for i, field_id in enumerate((USER_SEARCH_ID, USER_SEARCH_NAME, USER_SEARCH_EMAIL)):
+        params[f'forcedisplay[{i}]'] = field_id
+    return params
+
+def find_glpi_user_id(email):
+    """Recherche côté GLPI (search/User) d'un utilisateur dont l'email ou le login est exactement `email`."""
+    email_clean = normalize_email(email)
+    exact = f'^{email_clean}$'
+    params = _user_search_params([
+        {'field': USER_SEARCH_EMAIL, 'searchtype': 'contains', 'value': exact},
+        {'link': 'OR', 'field': USER_SEARCH_NAME, 'searchtype': 'contains', 'value': exact},
+    ])
+    response = glpi_session.request("GET", 'search/User', params=params)
+    response.raise_for_status()
+    rows = response.json().get('data') or []
+    return rows[0].get(str(USER_SEARCH_ID)) if rows else None
+
+def iter_glpi_users(page_size: int = 500):
+    """Parcours paginé de tous les utilisateurs GLPI : génère (id, login, email)."""
+    start = 0
+    while True:
+        params = _user_search_params([], start, start + page_size - 1)
+        response = glpi_session.request("GET", 'search/User', params=params)
+        if response.status_code == 400 and 'ERROR_RANGE_EXCEED_TOTAL' in response.text:
+            return
         response.raise_for_status()
-        data = response.json()
-        return data.get("session_token")
-    except (requests.exceptions.RequestException, KeyError) as e:
-        logging.error(f"Erreur get_session_token: {e}")
-        return None
-
-def get_or_create_glpi_user(session_token, email, name, password=None, role=None):
+        body = response.json()
+        rows = body.get('data') or []
+        for row in rows:
+            emails = row.get(str(USER_SEARCH_EMAIL))
+            # Un utilisateur peut avoir plusieurs emails : GLPI les renvoie alors sous forme de liste
+            for user_email in emails if isinstance(emails, list) else [emails]:
+                yield row.get(str(USER_SEARCH_ID)), row.get(str(USER_SEARCH_NAME)), user_email
+        start += page_size
+        if not rows or start >= (body.get('totalcount') or 0):
+            return
+
+def get_or_create_glpi_user(email, name, password=None, role=None):
     """
     Cherche un utilisateur GLPI par email. Si non trouvé, le crée avec le mot de passe et le profil correspondant au rôle. Retourne l'id GLPI.
+    Les résolutions (y compris les échecs) sont mises en cache par email normalisé.
     """
-    config = load_glpi_config()
-    headers = {"Session-Token": session_token, "App-Token": config['GLPI_APP_TOKEN']}
+    found, cached_id = glpi_user_cache.lookup(email)
+    if found:
+        return cached_id
 
     # 1. Chercher l'utilisateur par email
-    url = url_joiner(config['GLPI_API_URL'], f'User?searchText={email}')
     try:
-        response = requests.get(url, headers=headers)
-        users = response.json()
-        email_clean = (email or '').strip().lower()
-        if isinstance(users, list) and users:
-            for user in users:
-                user_email = (user.get("email", "") or '').strip().lower()
-                user_name = (user.get("name", "") or '').strip().lower()
-                if user_email == email_clean or user_name == email_clean:
-                    return user["id"]
-    except Exception as e:
+        glpi_user_id = find_glpi_user_id(email)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        # On ne crée pas l'utilisateur à l'aveugle : il existe peut-être déjà
         logging.error(f"[DEBUG USER] Erreur recherche utilisateur : {e}")
+        return None
+    if glpi_user_id:
+        glpi_user_cache.set(email, glpi_user_id)
+        return glpi_user_id
 
     # 2. Si non trouvé, créer l'utilisateur
     role_to_profile = {
@@ -75,39 +116,75 @@ def get_or_create_glpi_user(session_token, email, name, password=None, role=None
         }
     }
     try:
-        resp = requests.post(url_joiner(config['GLPI_API_URL'], 'User'), headers=headers, json=payload)
+        resp = glpi_session.request("POST", 'User', json=payload)
         user = resp.json()
         if isinstance(user, dict) and "id" in user:
+            glpi_user_cache.set(email, user.get("id"))
             return user.get("id")
         else:
             logging.error(f"Erreur inattendue lors de la création de l'utilisateur GLPI: {user}")
+            glpi_user_cache.set(email, None)
             return None
     except Exception as e:
         logging.error(f"Exception lors de la création de l'utilisateur GLPI: {e}")
+        glpi_user_cache.set(email, None)
         return None
 
+def _extract_requester_email(ticket: dict):
+    """Renseigne ticket['requester_email'] à partir de la première ligne du contenu."""
+    ticket['requester_email'] = parse_requester_email(ticket.get('content'))
+    return ticket
+
+def _is_agent(user: User) -> bool:
+    return user.role.value in ["admin", "agent_support"]
+
+def _check_ticket_access(ticket: dict, current_user: User):
+    """
+    Lève une 403 si un client tente d'accéder au ticket d'un autre demandeur.
+    Le contrôle porte sur les demandeurs GLPI du ticket (Ticket_User) ; l'email du contenu
+    n'est utilisé que pour les comptes qui n'ont pas encore d'ID GLPI.
+    """
+    if _is_agent(current_user):
+        return
+    if current_user.glpi_user_id:
+        allowed = current_user.glpi_user_id in (ticket.get('requester_ids') or [])
+    else:
+        allowed = ticket.get('requester_email') == current_user.email
+    if not allowed:
+        raise HTTPException(status_code=403, detail="Accès non autorisé à ce ticket.")
+
+def _ticket_input(title: str, content: str, user: User) -> dict:
+    """Construit le champ `input` d'un ticket. Ajoute l'email du demandeur au contenu."""
+    content_with_email = f"{EMAIL_HEADER_PREFIX}{user.email}\n\n" + content
+    return {"name": title, "content": content_with_email, "_users_id_requester": user.glpi_user_id}
+
+def _followup_input(ticket_id: int, content: str, user: User) -> dict:
+    """Construit le champ `input` d'un ITILFollowup avec préfixe de rôle."""
+    prefix = "AGENT_MSG::" if _is_agent(user) else "CLIENT_MSG::"
+    return {
+        "itemtype": "Ticket",
+        "items_id": ticket_id,
+        "content": f"{prefix} {content}",
+        "is_private": 0
+    }
+
 def _create_ticket_internal(title: str, content: str, user: User):
     """Logique interne pour créer un ticket GLPI. Ajoute l'email du demandeur au contenu."""
     session_token = get_session_token()
     if not session_token:
         return {"success": False, "error": "Connexion à GLPI impossible."}
 
-    glpi_user_id = user.glpi_user_id
-    if not glpi_user_id:
+    if not user.glpi_user_id:
         return {"success": False, "error": "L'utilisateur n'a pas d'ID GLPI."}
 
-    config = load_glpi_config()
-    email_header = f"Email du demandeur: {user.email}\n\n"
-    content_with_email = email_header + content
-
-    url = url_joiner(config['GLPI_API_URL'], 'Ticket')
-    headers = {"Session-Token": session_token, "App-Token": config['GLPI_APP_TOKEN']}
-    ticket_data = {"input": {"name": title, "content": content_with_email, "_users_id_requester": glpi_user_id}}
+    ticket_data = {"input": _ticket_input(title, content, user)}
 
     try:
-        response = requests.post(url, headers=headers, json=ticket_data)
+        response = glpi_session.request("POST", 'Ticket', json=ticket_data)
         response.raise_for_status()
         ticket_info = response.json()
+        # Le miroir local reçoit aussitôt le nouveau ticket (sinon il n'apparaîtrait qu'à la prochaine synchronisation)
+        ticket_mirror.refresh_ticket(ticket_info.get("id") if isinstance(ticket_info, dict) else None)
         return {"success": True, "ticket": ticket_info}
     except requests.exceptions.RequestException as e:
         return {"success": False, "error": f"Erreur création ticket GLPI: {e}"}
@@ -118,149 +195,381 @@ def _create_ticket_followup_internal(ticket_id: int, content: str, user: User):
     if not session_token:
         return {"success": False, "error": "Connexion à GLPI impossible."}
 
-    config = load_glpi_config()
-    url = url_joiner(config['GLPI_API_URL'], 'ITILFollowup')
-    headers = {"Session-Token": session_token, "App-Token": config['GLPI_APP_TOKEN']}
-
-    is_agent = user.role.value in ["admin", "agent_support"]
-    prefix = "AGENT_MSG::" if is_agent else "CLIENT_MSG::"
-    content_with_prefix = f"{prefix} {content}"
-
-    followup_data = {
-        "input": {
-            "itemtype": "Ticket",
-            "items_id": ticket_id,
-            "content": content_with_prefix,
-            "is_private": 0
-        }
-    }
+    followup_data = {"input": _followup_input(ticket_id, content, user)}
 
     try:
-        response = requests.post(url, headers=headers, json=followup_data)
+        response = glpi_session.request("POST", 'ITILFollowup', json=followup_data)
         response.raise_for_status()
         followup_info = response.json()
+        ticket_cache.invalidate(ticket_id)
+        ticket_mirror.refresh_ticket(ticket_id)
         return {"success": True, "followup": followup_info}
     except requests.exceptions.RequestException as e:
         return {"success": False, "error": str(e)}
 
-@router.post("/tickets")
-def glpi_create_ticket(title: str = Body(..., embed=True), content: str = Body(..., embed=True), current_user: User = Depends(get_current_user)):
-    """Crée un nouveau ticket dans GLPI via la route API."""
-    result = _create_ticket_internal(title=title, content=content, user=current_user)
-    if not result["success"]:
-        raise HTTPException(status_code=500, detail=result["error"])
-    return result["ticket"]
-
-@router.get("/tickets")
-def glpi_list_tickets(current_user: User = Depends(get_current_user)):
-    """Liste les tickets. Les admins/agents voient tout, les clients ne voient que les leurs."""
+def _fetch_ticket_sync(ticket_id: int):
+    """Ticket GLPI avec ses demandeurs, servi par le cache tant que son date_mod n'a pas changé."""
+    ticket, must_revalidate = ticket_cache.get_ticket(ticket_id)
+    if ticket is not None:
+        if not must_revalidate:
+            return ticket
+        probe = glpi_session.request("GET", 'search/Ticket', params=ticket_date_mod_params(ticket_id))
+        probe.raise_for_status()
+        if ticket_cache.revalidate(ticket_id, date_mod_from_search(probe.json())):
+            return ticket
+
+    response = glpi_session.request("GET", f'Ticket/{ticket_id}?expand_dropdowns=true')
+    response.raise_for_status()
+    ticket = _extract_requester_email(response.json())
+    links = glpi_session.request("GET", f'Ticket/{ticket_id}/Ticket_User')
+    links.raise_for_status()
+    ticket['requester_ids'] = requester_ids_from_links(links.json())
+    ticket_cache.put_ticket(ticket_id, ticket)
+    return ticket
+
+def internal_glpi_get_ticket(ticket_id: int, current_user: User):
+    """Version synchrone (sans Depends) de la lecture d'un ticket, pour les appels internes (chatbot, résumé)."""
     session_token = get_session_token()
     if not session_token:
+        return _serve_stale(ticket_id, current_user)
+
+    try:
+        ticket = _fetch_ticket_sync(ticket_id)
+        _check_ticket_access(ticket, current_user)
+        return ticket
+    except GlpiUnavailableError:
+        return _serve_stale(ticket_id, current_user)
+    except requests.exceptions.HTTPError as e:
+        if e.response.status_code == 404:
+            raise HTTPException(status_code=404, detail="Ticket introuvable.")
+        raise HTTPException(status_code=500, detail=f"Erreur GLPI: {e}")
+    except requests.exceptions.RequestException as e:
+        raise HTTPException(status_code=500, detail=f"Erreur GLPI: {e}")
+
+def _read_mirror(reader, *args, max_staleness=ticket_mirror.GLPI_MIRROR_MAX_STALENESS, **kwargs):
+    """
+    Lit le miroir local s'il est assez frais ; retourne None sinon (lecture directe dans GLPI).
+    `max_staleness=None` accepte un miroir de n'importe quel âge (GLPI indisponible).
+    """
+    db = SessionLocal()
+    try:
+        if not ticket_mirror.is_fresh(db, max_staleness=max_staleness):
+            return None
+        return reader(db, *args, **kwargs)
+    finally:
+        db.close()
+
+def _read_stale_ticket(ticket_id: int, with_conversation: bool = False):
+    """
+    Repli lorsque GLPI est indisponible : dernière version connue du ticket (miroir quel que soit
+    son âge, sinon cache), marquée `stale`. Retourne None si le ticket n'est connu nulle part.
+    """
+    reader = ticket_mirror.get_ticket_with_followups if with_conversation else ticket_mirror.get_ticket
+    ticket = _read_mirror(reader, ticket_id, max_staleness=None)
+    if ticket is None:
+        ticket = ticket_cache.get_stale(ticket_id)
+        if ticket is not None and with_conversation:
+            ticket['followups'] = ticket_cache.get_related(ticket_id, ticket.get('date_mod'), 'followups') or []
+    if ticket is None:
+        return None
+    if with_conversation:
+        ticket['items'] = ticket_cache.get_related(ticket_id, ticket.get('date_mod'), 'items') or []
+    ticket['stale'] = True
+    return ticket
+
+def _serve_stale(ticket_id: int, current_user: User, with_conversation: bool = False):
+    """Sert la dernière version connue du ticket (avec contrôle d'accès) ou lève 503."""
+    ticket = _read_stale_ticket(ticket_id, with_conversation)
+    if ticket is None:
         raise HTTPException(status_code=503, detail="Connexion à GLPI impossible.")
+    _check_ticket_access(ticket, current_user)
+    return ticket
+
+# --- Routes (asynchrones : aucun thread du threadpool n'est bloqué pendant les appels GLPI) ---
+
+async def _async_fetch_ticket(ticket_id: int):
+    """Équivalent asynchrone de `_fetch_ticket_sync` (cache revalidé par date_mod)."""
+    ticket, must_revalidate = ticket_cache.get_ticket(ticket_id)
+    if ticket is not None:
+        if not must_revalidate:
+            return ticket
+        if ticket_cache.revalidate(ticket_id, await glpi_async.get_ticket_date_mod(ticket_id)):
+            return ticket
+
+    # Ticket et demandeurs lus en parallèle (les demandeurs servent au contrôle d'accès)
+    ticket, links = await asyncio.gather(glpi_async.get_ticket(ticket_id), glpi_async.get_ticket_requesters(ticket_id))
+    ticket['requester_ids'] = requester_ids_from_links(links)
+    _extract_requester_email(ticket)
+    ticket_cache.put_ticket(ticket_id, ticket)
+    return ticket
+
+def _glpi_read_error(e: Exception) -> HTTPException:
+    """Traduit une erreur de lecture GLPI (client asynchrone) en HTTPException."""
+    if isinstance(e, GlpiUnavailableError):
+        return HTTPException(status_code=503, detail="Connexion à GLPI impossible.")
+    if isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 404:
+        return HTTPException(status_code=404, detail="Ticket introuvable.")
+    return HTTPException(status_code=500, detail=f"Erreur GLPI: {e}")
+
+async def _async_get_ticket(ticket_id: int, current_user: User):
+    """Lecture asynchrone d'un ticket avec contrôle d'accès (miroir local si frais, sinon cache / GLPI)."""
+    ticket = await run_in_threadpool(_read_mirror, ticket_mirror.get_ticket, ticket_id)
+    if ticket is not None:
+        _check_ticket_access(ticket, current_user)
+        return ticket
+    try:
+        ticket = await _async_fetch_ticket(ticket_id)
+    except GlpiUnavailableError:
+        return await run_in_threadpool(_serve_stale, ticket_id, current_user)
+    except httpx.HTTPError as e:
+        raise _glpi_read_error(e)
+    _check_ticket_access(ticket, current_user)
+    return ticket
+
+async def _async_fetch_items(ticket_id: int, date_mod):
+    """Éléments liés (Item_Ticket) du ticket ; une erreur GLPI sur ces éléments secondaires donne une liste vide."""
+    cached = ticket_cache.get_related(ticket_id, date_mod, 'items')
+    if cached is not None:
+        return cached
+    try:
+        items = await glpi_async.get_ticket_items(ticket_id)
+    except httpx.HTTPStatusError as e:
+        logging.warning(f"Éléments liés du ticket {ticket_id} indisponibles: {e.response.status_code}")
+        return []
+    items = items if isinstance(items, list) else []
+    ticket_cache.put_related(ticket_id, date_mod, 'items', items)
+    return items
+
+async def _async_fetch_conversation(ticket_id: int):
+    """
+    Ticket, demandeurs, suivis et éléments liés, lus en parallèle avec le session_token partagé :
+    la latence est celle de l'appel GLPI le plus lent, et non leur somme.
+    """
+    ticket, must_revalidate = ticket_cache.get_ticket(ticket_id)
+    if ticket is not None and must_revalidate:
+        if not ticket_cache.revalidate(ticket_id, await glpi_async.get_ticket_date_mod(ticket_id)):
+            ticket = None
+    if ticket is not None:
+        followups = ticket_cache.get_related(ticket_id, ticket.get('date_mod'), 'followups')
+        if followups is not None:
+            ticket['followups'] = followups
+            ticket['items'] = await _async_fetch_items(ticket_id, ticket.get('date_mod'))
+            return ticket
+
+    ticket, links, followups, items = await asyncio.gather(
+        glpi_async.get_ticket(ticket_id),
+        glpi_async.get_ticket_requesters(ticket_id),
+        glpi_async.get_followups(ticket_id),
+        _async_fetch_items(ticket_id, None),
+    )
+    ticket['requester_ids'] = requester_ids_from_links(links)
+    _extract_requester_email(ticket)
+    followups = followups if isinstance(followups, list) else []
+    ticket_cache.put_ticket(ticket_id, ticket)
+    ticket_cache.put_related(ticket_id, ticket.get('date_mod'), 'followups', followups)
+    ticket_cache.put_related(ticket_id, ticket.get('date_mod'), 'items', items)
+    return {**ticket, 'followups': followups, 'items': items}
+
+async def _async_get_conversation(ticket_id: int, current_user: User):
+    """
+    Ticket avec ses suivis (`followups`, ordre chronologique) et ses éléments liés (`items`),
+    en un seul objet, avec contrôle d'accès. Miroir local si frais, sinon cache / GLPI.
+    """
+    try:
+        conversation = await run_in_threadpool(_read_mirror, ticket_mirror.get_ticket_with_followups, ticket_id)
+        if conversation is not None:
+            _check_ticket_access(conversation, current_user)
+            conversation['items'] = await _async_fetch_items(ticket_id, conversation.get('date_mod'))
+            return conversation
+        conversation = await _async_fetch_conversation(ticket_id)
+    except GlpiUnavailableError:
+        return await run_in_threadpool(_serve_stale, ticket_id, current_user, True)
+    except httpx.HTTPError as e:
+        raise _glpi_read_error(e)
+    _check_ticket_access(conversation, current_user)
+    return conversation
 
-    config = load_glpi_config()
-    headers = {"Session-Token": session_token, "App-Token": config['GLPI_APP_TOKEN']}
-    url = url_joiner(config['GLPI_API_URL'], 'Ticket')
+@router.post("/tickets")
+async def glpi_create_ticket(request: Request, title: str = Body(..., embed=True), content: str = Body(..., embed=True), current_user: User = Depends(get_current_user)):
+    """Crée un nouveau ticket dans GLPI via la route API."""
+    if not current_user.glpi_user_id:
+        raise HTTPException(status_code=500, detail="L'utilisateur n'a pas d'ID GLPI.")
     try:
+        ticket = await run_until_disconnect(request, glpi_async.create_ticket(_ticket_input(title, content, current_user)))
+    except GlpiUnavailableError:
+        raise HTTPException(status_code=503, detail="Connexion à GLPI impossible.")
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=500, detail=f"Erreur création ticket GLPI: {e}")
+    await run_in_threadpool(ticket_mirror.refresh_ticket, ticket.get("id") if isinstance(ticket, dict) else None)
+    return ticket
+
+# Plage demandée à GLPI quand aucun paramètre range n'est fourni (comportement historique)
+LIST_DEFAULT_RANGE_END = 1000
+# Nombre de tickets lus par appel amont en mode streaming NDJSON
+STREAM_PAGE_SIZE = 100
+
+def _parse_range(range_param: Optional[str]):
+    """Convertit un paramètre range "start-end" (bornes incluses, sémantique GLPI) en tuple."""
+    if not range_param:
+        return 0, None
+    start, end = (int(bound) for bound in range_param.split('-'))
+    if end < start:
+        raise HTTPException(status_code=400, detail="Paramètre range invalide.")
+    return start, end
+
+# Champs d'un ticket de la liste d'un client (recherche GLPI ou miroir) : les mêmes quelle que soit la source
+CLIENT_TICKET_KEYS = [*TICKET_SEARCH_FIELDS.values(), 'requester_email', 'requester_ids']
+
+def _client_page(page, glpi_user_id: Optional[int]):
+    """Page (tickets, total) d'un client identifié dans GLPI, réduite aux champs de la recherche GLPI."""
+    if page is None or not glpi_user_id:
+        return page
+    tickets, total = page
+    return [{key: ticket.get(key) for key in CLIENT_TICKET_KEYS} for ticket in tickets], total
+
+def _project(ticket: dict, fields: Optional[list]):
+    """Ne garde que les champs demandés (l'id est toujours conservé)."""
+    if not fields:
+        return ticket
+    return {key: ticket.get(key) for key in ['id', *fields]}
+
+async def _fetch_ticket_page(current_user: User, start: int, end: Optional[int]):
+    """
+    Retourne (tickets, total) pour la plage demandée, depuis le miroir local s'il est frais, sinon GLPI.
+    Pour un client, le filtre sur le demandeur est appliqué par la source (index du miroir ou
+    critère de recherche GLPI), afin que seuls ses tickets soient lus. Les tickets sont triés par ID,
+    et ceux d'un client ont les mêmes champs (CLIENT_TICKET_KEYS) que le miroir soit frais ou non.
+    """
+    is_agent = _is_agent(current_user)
+    glpi_user_id = None if is_agent else current_user.glpi_user_id
+    requester_email = None if is_agent or glpi_user_id else current_user.email
+    mirrored = await run_in_threadpool(
+        _read_mirror, ticket_mirror.page_tickets, start, end,
+        requester_id=glpi_user_id, requester_email=requester_email
+    )
+    if mirrored is not None:
+        return _client_page(mirrored, glpi_user_id)
+
+    if glpi_user_id:
+        criteria = [{'field': SEARCH_OPTION_REQUESTER, 'searchtype': 'equals', 'value': glpi_user_id}]
+        tickets, total = await glpi_async.search_tickets(criteria, start, end if end is not None else LIST_DEFAULT_RANGE_END)
+        for ticket in tickets:
+            _extract_requester_email(ticket)
+            ticket['requester_ids'] = [glpi_user_id]
+        return _client_page((tickets, total), glpi_user_id)
+
+    if is_agent:
         params = {
             'is_deleted': 'false',
-            'range': '0-1000',
+            'range': f'{start}-{end if end is not None else LIST_DEFAULT_RANGE_END}',
             'expand_dropdowns': 'true',
+            'sort': 'id',
+            'order': 'ASC',
         }
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        all_tickets = response.json()
+        tickets, total = await glpi_async.list_tickets_page(params)
+        return [_extract_requester_email(t) for t in tickets], total
+
+    params = {
+        'is_deleted': 'false',
+        'range': f'0-{LIST_DEFAULT_RANGE_END}',
+        'expand_dropdowns': 'true',
+        'sort': 'id',
+        'order': 'ASC',
+    }
+    # Compte sans ID GLPI : repli sur le filtrage par email du contenu
+    all_tickets = await glpi_async.list_tickets(params)
+    user_tickets = [t for t in all_tickets if _extract_requester_email(t).get('requester_email') == current_user.email]
+    page = user_tickets[start:end + 1 if end is not None else None]
+    return page, len(user_tickets)
 
-        email_header_prefix = "Email du demandeur: "
-        for ticket in all_tickets:
-            content = ticket.get('content', '')
-            if content.startswith(email_header_prefix):
+async def _fetch_ticket_page_or_raise(current_user: User, start: int, end: Optional[int]):
+    try:
+        return await _fetch_ticket_page(current_user, start, end)
+    except GlpiUnavailableError:
+        # GLPI indisponible : le miroir est servi quel que soit son âge, à défaut 503
+        is_agent = _is_agent(current_user)
+        glpi_user_id = None if is_agent else current_user.glpi_user_id
+        stale = await run_in_threadpool(
+            _read_mirror, ticket_mirror.page_tickets, start, end, max_staleness=None,
+            requester_id=glpi_user_id, requester_email=None if is_agent or glpi_user_id else current_user.email
+        )
+        if stale is None:
+            raise HTTPException(status_code=503, detail="Connexion à GLPI impossible.")
+        return _client_page(stale, glpi_user_id)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=500, detail=f"Erreur GLPI: {e}")
+
+@router.get("/tickets")
+async def glpi_list_tickets(
+    request: Request,
+    response: Response,
+    ticket_range: Optional[str] = Query(None, alias="range", regex=r"^\d+-\d+$", description="Plage de tickets, ex: 0-49 (bornes incluses, comme GLPI)"),
+    fields: Optional[str] = Query(None, description="Champs à renvoyer, séparés par des virgules, ex: id,name,status"),
+    format: str = Query("json", regex="^(json|ndjson)$", description="json (tableau) ou ndjson (flux, un ticket par ligne)"),
+    current_user: User = Depends(get_current_user)
+):
+    """Liste les tickets. Les admins/agents voient tout, les clients ne voient que les leurs."""
+    start, end = _parse_range(ticket_range)
+    field_list = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+
+    if format == "ndjson":
+        # La première page est lue avant d'ouvrir le flux pour pouvoir renvoyer un vrai code d'erreur
+        first_end = start + STREAM_PAGE_SIZE - 1 if end is None else min(end, start + STREAM_PAGE_SIZE - 1)
+        first_page, _ = await _fetch_ticket_page_or_raise(current_user, start, first_end)
+
+        async def stream():
+            page, page_start, page_end = first_page, start, first_end
+            while True:
+                for ticket in page:
+                    yield json.dumps(_project(ticket, field_list), ensure_ascii=False) + "\n"
+                if len(page) < page_end - page_start + 1 or (end is not None and page_end >= end):
+                    return
+                page_start = page_end + 1
+                page_end = page_start + STREAM_PAGE_SIZE - 1 if end is None else min(end, page_start + STREAM_PAGE_SIZE - 1)
                 try:
-                    first_line = content.splitlines()[0]
-                    extracted_email = first_line[len(email_header_prefix):].strip()
-                    ticket['requester_email'] = extracted_email
-                except (IndexError, ValueError):
-                    ticket['requester_email'] = None
-            else:
-                ticket['requester_email'] = None
-
-        if current_user.role.value not in ["admin", "agent_support"]:
-            user_tickets = [t for t in all_tickets if t.get('requester_email') == current_user.email]
-            return user_tickets
-        else:
-            return all_tickets
+                    page, _ = await _fetch_ticket_page(current_user, page_start, page_end)
+                except (GlpiUnavailableError, httpx.HTTPError) as e:
+                    logging.error(f"Flux de tickets interrompu: {e}")
+                    return
 
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"Erreur GLPI: {e}")
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    tickets, total = await run_until_disconnect(request, _fetch_ticket_page_or_raise(current_user, start, end))
+    if ticket_range is not None:
+        last = start + len(tickets) - 1 if tickets else start
+        response.headers["Content-Range"] = f"{start}-{last}/{total if total is not None else '*'}"
+    return [_project(t, field_list) for t in tickets]
 
 @router.get("/tickets/{ticket_id}")
-def glpi_get_ticket(ticket_id: int, current_user: User = Depends(get_current_user)):
+async def glpi_get_ticket(ticket_id: int, request: Request, current_user: User = Depends(get_current_user)):
     """Récupère les détails d'un ticket spécifique."""
-    session_token = get_session_token()
-    if not session_token:
-        raise HTTPException(status_code=503, detail="Connexion à GLPI impossible.")
+    return await run_until_disconnect(request, _async_get_ticket(ticket_id, current_user))
 
-    config = load_glpi_config()
-    url = url_joiner(config['GLPI_API_URL'], f'Ticket/{ticket_id}?expand_dropdowns=true')
-    headers = {"Session-Token": session_token, "App-Token": config['GLPI_APP_TOKEN']}
-    try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        ticket = response.json()
-
-        email_header_prefix = "Email du demandeur: "
-        content = ticket.get('content', '')
-        if content.startswith(email_header_prefix):
-            try:
-                first_line = content.splitlines()[0]
-                extracted_email = first_line[len(email_header_prefix):].strip()
-                ticket['requester_email'] = extracted_email
-            except (IndexError, ValueError):
-                ticket['requester_email'] = None
-        else:
-            ticket['requester_email'] = None
-
-        if current_user.role.value not in ["admin", "agent_support"]:
-            if ticket.get('requester_email') != current_user.email:
-                raise HTTPException(status_code=403, detail="Accès non autorisé à ce ticket.")
-        
-        return ticket
-    except requests.exceptions.HTTPError as e:
-        if e.response.status_code == 404:
-            raise HTTPException(status_code=404, detail="Ticket introuvable.")
-        raise HTTPException(status_code=500, detail=f"Erreur GLPI: {e}")
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"Erreur GLPI: {e}")
+@router.get("/tickets/{ticket_id}/conversation")
+async def glpi_get_ticket_conversation(ticket_id: int, request: Request, current_user: User = Depends(get_current_user)):
+    """Ticket avec ses suivis et éléments liés, lus en parallèle. Accessible aux admins, agents, et au client demandeur."""
+    return await run_until_disconnect(request, _async_get_conversation(ticket_id, current_user))
 
 @router.get("/tickets/{ticket_id}/followups")
-def glpi_get_ticket_followups(ticket_id: int, current_user: User = Depends(get_current_user)):
+async def glpi_get_ticket_followups(ticket_id: int, request: Request, current_user: User = Depends(get_current_user)):
     """Récupère les suivis pour un ticket. Accessible aux admins, agents, et au client demandeur."""
-    glpi_get_ticket(ticket_id, current_user)
-
-    session_token = get_session_token()
-    if not session_token:
-        raise HTTPException(status_code=503, detail="Connexion à GLPI impossible.")
-
-    config = load_glpi_config()
-    url = url_joiner(config['GLPI_API_URL'], f'ITILFollowup?tickets_id={ticket_id}&expand_dropdowns=true&sort=date_mod&order=ASC')
-    headers = {"Session-Token": session_token, "App-Token": config['GLPI_APP_TOKEN']}
-
-    try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.HTTPError as e:
-        logging.error(f"Erreur HTTP lors de la récupération des suivis: {e.response.status_code} - {e.response.text}")
-        raise HTTPException(status_code=e.response.status_code, detail=f"Erreur GLPI: {e.response.text}")
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"Erreur de connexion GLPI: {e}")
+    conversation = await run_until_disconnect(request, _async_get_conversation(ticket_id, current_user))
+    return conversation['followups']
 
 @router.post("/tickets/{ticket_id}/followups")
-def glpi_add_followup(ticket_id: int, content: str = Body(..., embed=True), current_user: User = Depends(get_current_user)):
+async def glpi_add_followup(ticket_id: int, request: Request, content: str = Body(..., embed=True), current_user: User = Depends(get_current_user)):
     """Ajoute un suivi à un ticket. Le préfixe est géré par cette fonction."""
-    glpi_get_ticket(ticket_id, current_user)
+    async def add():
+        await _async_get_ticket(ticket_id, current_user)
+        followup = await glpi_async.add_followup(_followup_input(ticket_id, content, current_user))
+        ticket_cache.invalidate(ticket_id)
+        # Le miroir sert les lectures : le suivi doit y figurer dès la réponse
+        await run_in_threadpool(ticket_mirror.refresh_ticket, ticket_id)
+        return followup
 
-    result = _create_ticket_followup_internal(ticket_id=ticket_id, content=content, user=current_user)
-    if not result["success"]:
-        raise HTTPException(status_code=500, detail=result["error"])
-    return result["followup"]
\ No newline at end of file
+    try:
+        return await run_until_disconnect(request, add())
+    except GlpiUnavailableError:
+        raise HTTPException(status_code=503, detail="Connexion à GLPI impossible.")
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,7 +1,71 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
+from utils.answer_cache import answer_cache
+from utils.embedding_cache import query_embedding_cache, topk_cache
+from utils.embedding_service import embedding_service
+from utils.glpi_async_client import glpi_async
+from utils.glpi_client import glpi_breaker, glpi_http
+from utils.glpi_session import glpi_session
+from utils.glpi_user_cache import glpi_user_cache
+from utils.intent_classifier import intent_fast_path
+from utils.llm_providers import llm_providers
+from utils.llm_router import llm_router
+from utils.retrieval import retrieval_stack
+from utils.ticket_cache import ticket_cache
 
 router = APIRouter()
 
 @router.get("/health")
-def health_check():
+async def health_check():
+    """Sonde de vie : le processus répond, sans dépendre du modèle ni des bases."""
     return {"status": "ok"}
+
+@router.get("/ready")
+async def readiness_check(response: Response):
+    """Sonde de disponibilité : 503 tant que la recherche vectorielle n'est pas préchauffée."""
+    # Un préchauffage échoué (dépendance indisponible au démarrage) est retenté, sinon l'instance
+    # resterait indisponible : retirée du trafic, elle ne recevrait plus de recherche pour la rétablir
+    retrieval_stack.retry_warm_up()
+    retrieval = retrieval_stack.status()
+    if not retrieval_stack.is_ready():
+        response.status_code = 503
+    return {"status": "ready" if retrieval_stack.is_ready() else "not_ready", "retrieval": retrieval}
+
+@router.get("/glpi")
+async def glpi_health():
+    """Statistiques de la session GLPI partagée, du pool de connexions HTTP et du disjoncteur."""
+    return {
+        "circuit_breaker": glpi_breaker.stats(),
+        "session": glpi_session.stats(),
+        "http_pool": glpi_http.stats(),
+        "async_client": glpi_async.stats(),
+        "user_cache": glpi_user_cache.stats(),
+        "ticket_cache": ticket_cache.stats(),
+    }
+
+@router.get("/retrieval")
+async def retrieval_health():
+    """Compteurs de la recherche vectorielle : caches (embeddings des questions, top-k) et service d'embedding."""
+    return {
+        "stack": retrieval_stack.status(),
+        "embedding_service": embedding_service.stats(),
+        "embedding_cache": query_embedding_cache.stats(),
+        "topk_cache": topk_cache.stats(),
+    }
+
+@router.get("/llm")
+async def llm_health():
+    """
+    Métriques des fournisseurs LLM (appels, erreurs par type, latence et délai du premier morceau) et du
+    routeur (ordre, p50/p95 glissants, requêtes de couverture, replis, échecs).
+    """
+    return {**llm_providers.stats(), "router": llm_router.stats()}
+
+@router.get("/intent")
+async def intent_health():
+    """Raccourci du classifieur d'intention : modèle chargé, tours servis sans LLM par intention, part d'appels LLM évités."""
+    return intent_fast_path.stats()
+
+@router.get("/answers")
+async def answers_health():
+    """Cache sémantique des réponses FAQ : taux de succès et temps LLM économisé (ms)."""
+    return answer_cache.stats()
@@ -3,13 +3,12 @@ from sqlalchemy.orm import Session
 from typing import List
 import os
 import shutil
-import subprocess
-import sys
 
 import models
 import schemas
 from dependencies import get_current_admin_user
 from utils.kb_management import parse_and_insert_document
+from utils.reindex_jobs import reindex_jobs
 from database import get_db
 
 router = APIRouter()
@@ -69,23 +68,36 @@ async def delete_document(doc_id: int, db: Session = Depends(get_db)):
 
     return
 
-@router.post("/reindex", dependencies=[Depends(get_current_admin_user)])
-async def reindex_documents():
-    """Déclenche le ré-indexage des documents en exécutant le script d'indexation."""
-    try:
-        python_executable = sys.executable
-        script_path = os.path.join(os.path.dirname(__file__), "..", "index_docs_chroma.py")
-
-        result = subprocess.run(
-            [python_executable, script_path],
-            capture_output=True, text=True, check=True
-        )
-        
-        print(result.stdout)
-        return {"message": "Ré-indexage terminé avec succès.", "output": result.stdout}
-
-    except subprocess.CalledProcessError as e:
-        print(f"Erreur lors du ré-indexage: {e.stderr}")
-        raise HTTPException(status_code=500, detail=f"Erreur lors du script de ré-indexage: {e.stderr}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Une erreur inattendue est survenue: {e}")
+@router.post("/reindex", status_code=202, dependencies=[Depends(get_current_admin_user)])
+async def reindex_documents(full: bool = False):
+    """
+    Lance le ré-indexage des documents en arrière-plan et retourne immédiatement la tâche.
+    Si un ré-indexage est déjà en cours, c'est cette tâche qui est retournée (`deduplicated`).
+    `full=true` ré-encode tous les documents, même inchangés.
+    """
+    job, created = reindex_jobs.start(full=full)
+    return {"message": "Ré-indexage lancé." if created else "Un ré-indexage est déjà en cours.",
+            "deduplicated": not created, "job": job.to_dict()}
+
+@router.get("/reindex/jobs", dependencies=[Depends(get_current_admin_user)])
+async def list_reindex_jobs():
+    """Liste les dernières tâches de ré-indexage, de la plus récente à la plus ancienne."""
+    return reindex_jobs.list_jobs()
+
+@router.get("/reindex/jobs/{job_id}", dependencies=[Depends(get_current_admin_user)])
+async def get_reindex_job(job_id: str):
+    """État, avancement et temps restant estimé d'une tâche de ré-indexage."""
+    job = reindex_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Tâche de ré-indexage non trouvée.")
+    return job.to_dict()
+
+@router.post("/reindex/jobs/{job_id}/cancel", status_code=202, dependencies=[Depends(get_current_admin_user)])
+async def cancel_reindex_job(job_id: str):
+    """Demande l'annulation d'une tâche de ré-indexage ; les documents déjà indexés le restent."""
+    cancelled = reindex_jobs.cancel(job_id)
+    if cancelled is None:
+        raise HTTPException(status_code=404, detail="Tâche de ré-indexage non trouvée.")
+    if not cancelled:
+        raise HTTPException(status_code=409, detail="La tâche de ré-indexage est déjà terminée.")
+    return reindex_jobs.get(job_id).to_dict()
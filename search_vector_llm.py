@@ -4,59 +4,25 @@ Recherche vectorielle + génération de réponse naturelle via LLM local (Ollama
 - Le modèle doit être téléchargé (ex : llama3, mistral, phi3...)
 """
 
-import os
-import requests
-from groq import Groq
-import together
-from sentence_transformers import SentenceTransformer
-import chromadb
-from pymongo import MongoClient
-from bson import ObjectId
+from utils.llm_router import LLMError, llm_router
+from utils.retrieval import context_excerpt, retrieval_stack
 
 # --- PARAMÈTRES ---
-OLLAMA_URL = "http://localhost:11434/api/generate"  # API locale Ollama
-# Par défaut, utilise le modèle local 'llama3:8b' (modifiez la variable d'environnement OLLAMA_MODEL pour changer)
-OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "llama3:8b")
+# Fournisseurs (LLM_PROVIDER, LLM_ROUTER_PROVIDERS), modèles et délais : voir utils/llm_providers.py et utils/llm_router.py
 TOP_K = 3
 
-# Chemin absolu et robuste pour la base ChromaDB
-script_dir = os.path.dirname(os.path.abspath(__file__))
-CHROMA_PATH = os.path.join(script_dir, "chroma_data")
-print("Chemin absolu de chroma_data (recherche+LLM):", CHROMA_PATH)
-
-model = SentenceTransformer('all-MiniLM-L6-v2')
-persist_dir = CHROMA_PATH
-chroma_client = chromadb.PersistentClient(path=persist_dir)
-collection_chroma = chroma_client.get_or_create_collection(name="cms_docs")  # Collection ChromaDB utilisée pour la recherche vectorielle
+# Modèle d'embedding, ChromaDB (CHROMA_PATH de utils/retrieval.py) et MongoDB sont initialisés au premier usage
+# (ou par le préchauffage au démarrage de l'application), pas à l'import de ce module.
 
 # Signature CMS pour le prompt
 CMS = """
 Vous êtes un assistant virtuel pour le support technique d'une plateforme interne.
 """
 
-from pymongo import MongoClient
-
-client = MongoClient("mongodb://localhost:27017/")
-db = client["mcp_backend"]
-doc_collection = db["documents"]  # Collection MongoDB contenant les documents à indexer/rechercher
-
-def search_vector(question, top_k=TOP_K):
-    query_embedding = model.encode(question).tolist()
-    results = collection_chroma.query(
-        query_embeddings=[query_embedding],
-        n_results=top_k
-    )
-    ids = results["ids"][0]
-    docs = []
-    for doc_id in ids:
-        try:
-            mongo_id = ObjectId(doc_id)
-        except Exception:
-            mongo_id = doc_id  # fallback for non-ObjectId ids
-        doc = doc_collection.find_one({"_id": mongo_id})
-        if doc:
-            docs.append(doc)
-    return docs
+def search_vector(question, top_k=TOP_K, mode=None):
+    # Meilleurs passages regroupés par document (embedding et top-k en cache jusqu'à la ré-indexation)
+    # mode : vector, lexical ou hybrid (RETRIEVAL_MODE par défaut, voir utils/retrieval.py)
+    return retrieval_stack.search(question, top_k, mode)
 
 
 def build_prompt(question, context=None, history=None):
@@ -66,7 +32,7 @@ def build_prompt(question, context=None, history=None):
         context_txt = "\n\n".join([
             (f"Titre : {doc.get('title','')}\n"
              f"Catégorie : {doc.get('category','')}\n"
-             f"Contenu : {doc.get('content','')[:600]}...") for doc in context
+             f"Contenu : {context_excerpt(doc)}...") for doc in context
         ])
 
     history_txt = ""
@@ -130,49 +96,19 @@ Assistant: {CMS}
 """
     return prompt
 
-LLM_PROVIDER = os.environ.get("LLM_PROVIDER", "ollama").lower()
-GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
-TOGETHER_API_KEY = os.environ.get("TOGETHER_API_KEY")
-
 def call_llm(prompt):
-    """Aiguilleur qui choisit le fournisseur LLM (Groq, Together ou Ollama) en fonction des variables d'environnement."""
-    if LLM_PROVIDER == "groq" and GROQ_API_KEY:
-        print("Utilisation du fournisseur LLM externe : Groq")
-        try:
-            client = Groq(api_key=GROQ_API_KEY)
-            chat_completion = client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model="llama3-8b-8192",
-            )
-            return chat_completion.choices[0].message.content
-        except Exception as e:
-            return f"[Erreur lors de l'appel à Groq : {e}]"
-
-    elif LLM_PROVIDER == "together" and TOGETHER_API_KEY:
-        print("Utilisation du fournisseur LLM externe : Together AI")
-        try:
-            client = together.Together(api_key=TOGETHER_API_KEY)
-            response = client.chat.completions.create(
-                model="meta-llama/Llama-3-8b-chat-hf",
-                messages=[{"role": "user", "content": prompt}],
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            return f"[Erreur lors de l'appel à Together AI : {e}]"
-
-    else:
-        print(f"Utilisation du fournisseur LLM local : Ollama ({OLLAMA_MODEL})")
-        payload = {
-            "model": OLLAMA_MODEL,
-            "prompt": prompt,
-            "stream": False
-        }
-        try:
-            response = requests.post(OLLAMA_URL, json=payload, timeout=180)
-            response.raise_for_status()
-            return response.json().get("response", "Réponse invalide d'Ollama")
-        except Exception as e:
-            return f"[Erreur lors de l'appel à Ollama : {e}]"
+    """
+    Appelle les fournisseurs LLM via le routeur (utils/llm_router.py) : requête de couverture si le
+    principal est lent, repli en cas d'erreur. Lève LLMError si aucun fournisseur n'a répondu.
+    """
+    return llm_router.complete(prompt)
+
+def stream_llm(prompt):
+    """
+    Variante en flux de call_llm : générateur des morceaux de texte au fur et à mesure de la génération.
+    Lève LLMError si aucun fournisseur n'a répondu ou si le flux est interrompu.
+    """
+    yield from llm_router.stream(prompt)
 
 if __name__ == "__main__":
     question = input("Pose ta question : ")
@@ -185,6 +121,10 @@ if __name__ == "__main__":
             print(f"[{i}] {doc['title']} (Catégorie : {doc.get('category', '')})")
         prompt = build_prompt(question, docs)
         print("\n--- Génération de la réponse via LLM local... ---")
-        reponse = call_llm(prompt)
-        print("\n--- Réponse générée ---\n")
-        print(reponse)
+        try:
+            reponse = call_llm(prompt)
+        except LLMError as e:
+            print(f"\nÉchec de la génération : {e}")
+        else:
+            print("\n--- Réponse générée ---\n")
+            print(reponse)
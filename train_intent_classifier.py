@@ -0,0 +1,115 @@
+"""
+Entraînement et suivi du classifieur d'intention local (utils/intent_classifier.py).
+
+  python train_intent_classifier.py train [--limit 20000] [--holdout 0.2]
+  python train_intent_classifier.py report [--days 7]
+
+`train` : jeu d'entraînement = tours journalisés dans `chatbot_logs` (question et intention du LLM)
++ exemples du prompt ; précision et rappel par intention sur une part mise de côté, puis
+entraînement sur tout le jeu et écriture du modèle (INTENT_MODEL_PATH), chargé au redémarrage de l'API.
+
+`report` : sur la période, part des tours servis sans LLM (`fast_path`) et exactitude des
+prédictions journalisées (`intent_prediction`) par rapport à l'intention renvoyée par le LLM,
+globalement et pour les seules prédictions qui auraient ouvert le raccourci.
+"""
+
+import argparse
+import random
+import sys
+from collections import Counter
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient
+
+from utils.embedding_service import embedding_service
+from utils.intent_classifier import (INTENT_LABELS, INTENT_MIN_CONFIDENCE, INTENT_MIN_SIMILARITY, INTENT_MODEL_PATH,
+                                     SEED_EXAMPLES, IntentClassifier, load_training_examples)
+
+
+def logs_collection():
+    return MongoClient("mongodb://localhost:27017/")["mcp_backend"]["chatbot_logs"]
+
+
+def print_scores(pairs: list):
+    """`pairs` : liste de (intention attendue, intention prédite)."""
+    correct = sum(expected == predicted for expected, predicted in pairs)
+    print(f"Exactitude : {correct / len(pairs):.3f} ({correct}/{len(pairs)})")
+    print("intention | support | précision | rappel")
+    for label in INTENT_LABELS:
+        support = sum(expected == label for expected, _ in pairs)
+        predicted = sum(p == label for _, p in pairs)
+        true_positives = sum(expected == p == label for expected, p in pairs)
+        precision = f"{true_positives / predicted:.3f}" if predicted else "-"
+        recall = f"{true_positives / support:.3f}" if support else "-"
+        print(f"{label} | {support} | {precision} | {recall}")
+
+
+def train(args) -> int:
+    examples = load_training_examples(logs_collection(), args.limit)
+    print(f"{len(examples)} question(s) distincte(s) issues des logs : {dict(Counter(label for _, label in examples))}")
+    if args.holdout > 0 and len(examples) >= 10:
+        rng = random.Random(args.seed)
+        shuffled = examples[:]
+        rng.shuffle(shuffled)
+        cut = int(len(shuffled) * args.holdout)
+        held_out, training = shuffled[:cut], shuffled[cut:]
+        classifier = IntentClassifier.train(training + SEED_EXAMPLES)
+        predictions = [classifier.predict_vector(vector)
+                       for vector in embedding_service.encode_many([question for question, _ in held_out])]
+        print(f"\nÉvaluation sur {len(held_out)} question(s) mises de côté :")
+        print_scores([(label, p["intent"]) for (_, label), p in zip(held_out, predictions)])
+        confident = [(label, p["intent"]) for (_, label), p in zip(held_out, predictions)
+                     if p["confidence"] >= INTENT_MIN_CONFIDENCE and p["similarity"] >= INTENT_MIN_SIMILARITY]
+        if confident:
+            print(f"\nPrédictions au-dessus des seuils ({len(confident)}/{len(held_out)}) :")
+            print_scores(confident)
+
+    classifier = IntentClassifier.train(examples + SEED_EXAMPLES)
+    classifier.save(args.output)
+    print(f"\nModèle enregistré : {args.output} ({len(classifier.labels)} exemple(s))")
+    return 0
+
+
+def report(args) -> int:
+    since = datetime.utcnow() - timedelta(days=args.days)
+    logs = logs_collection()
+    fast_path = Counter(log["intent_prediction"]["intent"] for log in logs.find(
+        {"fast_path": True, "timestamp": {"$gte": since}}, {"intent_prediction.intent": 1}))
+    llm_turns = list(logs.find(
+        {"llm_parsed_response": {"$exists": True}, "timestamp": {"$gte": since}},
+        {"llm_parsed_response.INTENTION": 1, "intent_prediction": 1}))
+    served = sum(fast_path.values())
+    turns = served + len(llm_turns)
+    print(f"Période : {args.days} jour(s), {turns} tour(s)")
+    if turns:
+        print(f"Servis sans LLM : {served} ({served / turns:.1%}) {dict(fast_path)}")
+
+    pairs = [(log["llm_parsed_response"].get("INTENTION"), log["intent_prediction"])
+             for log in llm_turns if log.get("intent_prediction")]
+    if not pairs:
+        print("Aucune prédiction journalisée à comparer à l'intention du LLM.")
+        return 0
+    print(f"\nPrédictions comparées à l'intention du LLM ({len(pairs)} tour(s)) :")
+    print_scores([(expected, prediction["intent"]) for expected, prediction in pairs])
+    eligible = [(expected, prediction["intent"]) for expected, prediction in pairs if prediction.get("eligible")]
+    if eligible:
+        # Prédictions qui auraient ouvert le raccourci mais ont été envoyées au LLM (pas de passage assez proche)
+        print(f"\nPrédictions éligibles au raccourci ({len(eligible)}) :")
+        print_scores(eligible)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    train_parser = commands.add_parser("train", help="Entraîne le classifieur à partir des logs")
+    train_parser.add_argument("--limit", type=int, default=20000, help="Nombre maximal de tours journalisés lus")
+    train_parser.add_argument("--holdout", type=float, default=0.2, help="Part mise de côté pour l'évaluation (0 : aucune)")
+    train_parser.add_argument("--seed", type=int, default=42)
+    train_parser.add_argument("--output", default=INTENT_MODEL_PATH)
+    train_parser.set_defaults(handler=train)
+    report_parser = commands.add_parser("report", help="Appels LLM évités et exactitude des prédictions")
+    report_parser.add_argument("--days", type=int, default=7)
+    report_parser.set_defaults(handler=report)
+    args = parser.parse_args()
+    sys.exit(args.handler(args))
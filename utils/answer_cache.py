@@ -0,0 +1,122 @@
+"""
+Cache sémantique des réponses FAQ du chatbot (routers/ai.py).
+
+Beaucoup de tours sans brouillon de ticket se terminent par une réponse FAQ à une question quasi
+identique à une précédente, chacune au prix d'une complétion LLM. Une réponse (INTENTION FAQ) est
+mise en cache sous la clé (rôle de l'utilisateur, IDs des documents retrouvés) avec l'embedding
+de la question. Une nouvelle question obtient la réponse en cache si :
+- l'utilisateur a le même rôle (les réponses ne passent pas d'un rôle à l'autre) ;
+- la recherche documentaire retrouve les mêmes documents, dans le même ordre ;
+- la similarité cosinus des questions atteint ANSWER_CACHE_MIN_SIMILARITY ;
+- l'entrée a moins de ANSWER_CACHE_TTL_SECONDS secondes ;
+- l'index n'a pas été reconstruit depuis (même version d'index que le cache top-k, voir embedding_cache.py).
+
+Compteurs (taux de succès, temps LLM économisé) exposés par /health/answers.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from utils.embedding_cache import normalize_query
+
+ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL_SECONDS = int(os.environ.get("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_MIN_SIMILARITY = float(os.environ.get("ANSWER_CACHE_MIN_SIMILARITY", "0.92"))
+
+
+def _unit(vector) -> tuple:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return tuple(x / norm for x in vector)
+
+
+class SemanticAnswerCache:
+    """Réponses par (rôle, documents retrouvés) ; dans un même groupe, recherche par similarité de la question."""
+
+    def __init__(self, max_size: int = ANSWER_CACHE_SIZE, ttl_seconds: int = ANSWER_CACHE_TTL_SECONDS,
+                 min_similarity: float = ANSWER_CACHE_MIN_SIMILARITY, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.min_similarity = min_similarity
+        self._clock = clock
+        # (rôle, IDs des documents, question normalisée) -> entrée, de la moins à la plus récemment utilisée
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "expired": 0, "evictions": 0,
+                          "invalidations": 0, "llm_ms_saved": 0.0}
+
+    @staticmethod
+    def key(role, doc_ids: list) -> tuple:
+        return (str(getattr(role, "value", role) or ""), tuple(str(doc_id) for doc_id in doc_ids))
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                self._counters["invalidations"] += 1
+            self._entries.clear()
+            self._version = version
+
+    def get(self, key: tuple, embedding, version):
+        """Réponse en cache pour une question proche (dict avec `answer`, `similarity`, `age_seconds`), sinon None."""
+        if self.max_size <= 0:
+            return None
+        query = _unit(embedding)
+        now = self._clock()
+        with self._lock:
+            self._check_version(version)
+            best, best_similarity = None, self.min_similarity
+            for entry_key, entry in list(self._entries.items()):
+                if entry_key[:2] != key:
+                    continue
+                if now - entry["created"] > self.ttl_seconds:
+                    del self._entries[entry_key]
+                    self._counters["expired"] += 1
+                    continue
+                similarity = sum(a * b for a, b in zip(query, entry["embedding"]))
+                if similarity >= best_similarity:
+                    best, best_similarity = entry_key, similarity
+            if best is None:
+                self._counters["misses"] += 1
+                return None
+            entry = self._entries[best]
+            self._entries.move_to_end(best)
+            self._counters["hits"] += 1
+            self._counters["llm_ms_saved"] += entry["llm_ms"] or 0.0
+            return {"answer": entry["answer"], "similarity": round(best_similarity, 3),
+                    "age_seconds": round(now - entry["created"], 1)}
+
+    def put(self, key: tuple, question: str, embedding, answer: str, version, llm_ms: float = None):
+        """Met en cache `answer` ; `llm_ms` (durée de l'appel LLM) sert à estimer le temps économisé."""
+        if self.max_size <= 0:
+            return
+        entry_key = key + (normalize_query(question),)
+        with self._lock:
+            self._check_version(version)
+            self._entries[entry_key] = {"embedding": _unit(embedding), "answer": answer,
+                                        "created": self._clock(), "llm_ms": llm_ms}
+            self._entries.move_to_end(entry_key)
+            self._counters["stores"] += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+        lookups = counters["hits"] + counters["misses"]
+        counters["llm_ms_saved"] = round(counters["llm_ms_saved"], 1)
+        return {**counters, "size": size, "max_size": self.max_size, "ttl_seconds": self.ttl_seconds,
+                "min_similarity": self.min_similarity,
+                "hit_rate": round(counters["hits"] / lookups, 3) if lookups else None}
+
+
+# Instance partagée par les routes du chatbot
+answer_cache = SemanticAnswerCache()
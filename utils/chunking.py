@@ -0,0 +1,68 @@
+"""
+Découpage des documents en passages pour l'indexation vectorielle.
+
+all-MiniLM-L6-v2 tronque son entrée à 256 tokens : un document long indexé en un seul vecteur
+n'est cherchable que par son début. Chaque document est donc découpé en fenêtres de CHUNK_SIZE
+mots qui se chevauchent de CHUNK_OVERLAP mots ; chaque passage est indexé séparément avec
+l'ID de son document parent (`parent_id`) dans ses métadonnées.
+"""
+
+import os
+
+# Taille des passages et chevauchement, en mots (~1,5 à 2 tokens par mot en français)
+CHUNK_SIZE = int(os.environ.get("CHUNK_SIZE", "120"))
+CHUNK_OVERLAP = int(os.environ.get("CHUNK_OVERLAP", "30"))
+CHUNK_ID_SEPARATOR = "#"
+
+
+def chunk_text(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> list:
+    """Fenêtres glissantes de `size` mots, chevauchantes de `overlap` mots. Un texte vide donne []."""
+    if size <= 0 or not 0 <= overlap < size:
+        raise ValueError("CHUNK_SIZE doit être positif et CHUNK_OVERLAP compris entre 0 et CHUNK_SIZE - 1.")
+    words = (text or "").split()
+    if not words:
+        return []
+    step = size - overlap
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + size]))
+        if start + size >= len(words):
+            break
+    return chunks
+
+
+def chunk_id(parent_id: str, index: int) -> str:
+    return f"{parent_id}{CHUNK_ID_SEPARATOR}{index}"
+
+
+def document_title(doc: dict) -> str:
+    return doc.get("title", doc.get("filename", "")) or ""
+
+
+def chunk_document(doc: dict, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP, doc_hash: str = None) -> list:
+    """
+    Passages d'un document MongoDB, sous forme de dicts :
+    `id`, `text` (passage stocké dans Chroma), `embed_text` (titre + passage, texte encodé) et `metadata`.
+    Un document sans contenu donne un passage unique réduit à son titre. `doc_hash` (empreinte du
+    document, voir utils/indexing.py) est recopiée dans les métadonnées de chaque passage.
+    """
+    parent_id = str(doc["_id"])
+    title = document_title(doc)
+    passages = chunk_text(doc.get("content", "") or "", size, overlap) or [""]
+    chunks = []
+    for index, passage in enumerate(passages):
+        chunks.append({
+            "id": chunk_id(parent_id, index),
+            "text": passage,
+            "embed_text": f"{title}\n{passage}",
+            "metadata": {
+                "parent_id": parent_id,
+                "chunk_index": index,
+                "chunk_count": len(passages),
+                "title": title,
+                "category": doc.get("category", "") or "",
+                "tags": ", ".join(doc.get("tags", [])),
+                "doc_hash": doc_hash or "",
+            },
+        })
+    return chunks
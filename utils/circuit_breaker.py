@@ -0,0 +1,106 @@
+"""
+Disjoncteur (circuit breaker) pour un service amont.
+
+- fermé : les appels passent ; après CIRCUIT_FAILURE_THRESHOLD échecs consécutifs, le circuit s'ouvre ;
+- ouvert : les appels sont refusés immédiatement pendant CIRCUIT_RECOVERY_TIMEOUT secondes ;
+- semi-ouvert : passé ce délai, au plus CIRCUIT_HALF_OPEN_PROBES appels de test sont autorisés.
+  Un succès referme le circuit, un échec le rouvre pour un nouveau délai.
+
+L'état est partagé entre threads (client synchrone) et coroutines (client asynchrone).
+"""
+
+import os
+import threading
+import time
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RECOVERY_TIMEOUT = float(os.environ.get("CIRCUIT_RECOVERY_TIMEOUT", "30"))
+CIRCUIT_HALF_OPEN_PROBES = int(os.environ.get("CIRCUIT_HALF_OPEN_PROBES", "1"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Compte les échecs consécutifs d'un service et coupe les appels quand il est indisponible."""
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 recovery_timeout: float = CIRCUIT_RECOVERY_TIMEOUT, half_open_probes: int = CIRCUIT_HALF_OPEN_PROBES):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_probes = half_open_probes
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._counters = {"rejected": 0, "opened": 0, "failures": 0, "successes": 0}
+
+    def _refresh_state(self, now: float):
+        if self._state == OPEN and now - self._opened_at >= self.recovery_timeout:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh_state(time.monotonic())
+            return self._state
+
+    @property
+    def is_open(self) -> bool:
+        """Vrai tant que le service est considéré indisponible (ouvert ou en phase de test)."""
+        return self.state != CLOSED
+
+    def allow_request(self) -> bool:
+        """Vrai si un appel peut partir ; en semi-ouvert, réserve l'une des sondes disponibles."""
+        with self._lock:
+            self._refresh_state(time.monotonic())
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                return True
+            self._counters["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._counters["successes"] += 1
+            self._failures = 0
+            self._probes_in_flight = 0
+            self._state = CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._counters["failures"] += 1
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self._counters["opened"] += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._probes_in_flight = 0
+
+    def release(self):
+        """Rend une sonde réservée sans verdict sur le service (appel annulé ou erreur locale)."""
+        with self._lock:
+            if self._probes_in_flight:
+                self._probes_in_flight -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            self._refresh_state(now)
+            retry_in = max(self.recovery_timeout - (now - self._opened_at), 0) if self._state == OPEN else None
+            return {
+                "name": self.name,
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "recovery_timeout": self.recovery_timeout,
+                "retry_in_seconds": round(retry_in, 1) if retry_in is not None else None,
+                **self._counters,
+            }
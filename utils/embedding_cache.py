@@ -0,0 +1,143 @@
+"""
+Caches de la recherche vectorielle, partagés par search_vector_llm et search_vector_docs.
+
+- `query_embedding_cache` : embeddings des questions, indexés par texte normalisé (casse et
+  espaces). Le modèle all-MiniLM-L6-v2 ne distingue pas la casse, la normalisation ne change
+  donc pas l'embedding obtenu.
+- `topk_cache` : résultats Chroma (IDs et métadonnées du top-k) par collection (répertoire Chroma
+  et nom de collection) et question normalisée. Chaque collection a sa version d'index : la
+  ré-indexation (utils/indexing.py) écrit une nouvelle version dans le fichier
+  INDEX_VERSION_FILE.<collection> du répertoire Chroma, ce qui vide le cache de cette collection
+  seulement.
+"""
+
+import os
+import threading
+import unicodedata
+import uuid
+from collections import OrderedDict
+
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", "1024"))
+TOPK_CACHE_SIZE = int(os.environ.get("TOPK_CACHE_SIZE", "1024"))
+INDEX_VERSION_FILE = "index_version"
+
+
+def normalize_query(text) -> str:
+    return " ".join(unicodedata.normalize("NFC", text or "").casefold().split())
+
+
+def _index_version_path(persist_dir: str, collection_name: str) -> str:
+    return os.path.join(persist_dir, f"{INDEX_VERSION_FILE}.{collection_name}")
+
+
+def read_index_version(persist_dir: str, collection_name: str):
+    """Version courante d'une collection Chroma (None si elle n'a jamais été indexée par utils/indexing.py)."""
+    try:
+        with open(_index_version_path(persist_dir, collection_name), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def bump_index_version(persist_dir: str, collection_name: str) -> str:
+    """Enregistre une nouvelle version de la collection : ses résultats top-k en cache deviennent invalides."""
+    version = uuid.uuid4().hex
+    path = _index_version_path(persist_dir, collection_name)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_path, path)
+    return version
+
+
+class _LruCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return self._entries[key]
+
+    def _put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+        lookups = counters["hits"] + counters["misses"]
+        return {**counters, "size": size, "max_size": self.max_size,
+                "hit_rate": round(counters["hits"] / lookups, 3) if lookups else None}
+
+
+class EmbeddingCache(_LruCache):
+    """Cache LRU des embeddings de questions."""
+
+    def __init__(self, max_size: int = EMBEDDING_CACHE_SIZE):
+        super().__init__(max_size)
+
+    def encode(self, encoder, text) -> list:
+        """Embedding de `text` (liste de floats), calculé par `encoder(text)` au premier appel seulement."""
+        key = normalize_query(text)
+        embedding = self._get(key)
+        if embedding is None:
+            embedding = tuple(encoder(text))
+            self._put(key, embedding)
+        return list(embedding)
+
+
+class TopKCache(_LruCache):
+    """
+    Cache LRU des résultats top-k par question, pour plusieurs collections (`scope`, ex. répertoire
+    Chroma et nom de collection) ; une nouvelle version d'une collection n'invalide que ses entrées.
+    """
+
+    def __init__(self, max_size: int = TOPK_CACHE_SIZE):
+        super().__init__(max_size)
+        self._versions = {}
+        self._counters["invalidations"] = 0
+
+    def _check_version(self, scope, version):
+        with self._lock:
+            if scope in self._versions and self._versions[scope] != version:
+                stale = [key for key in self._entries if key[0] == scope]
+                for key in stale:
+                    del self._entries[key]
+                if stale:
+                    self._counters["invalidations"] += 1
+            self._versions[scope] = version
+
+    def get(self, scope, key, version):
+        self._check_version(scope, version)
+        return self._get((scope, key))
+
+    def put(self, scope, key, version, value):
+        self._check_version(scope, version)
+        self._put((scope, key), value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+
+# Instances partagées par toutes les implémentations de search_vector du processus
+query_embedding_cache = EmbeddingCache()
+topk_cache = TopKCache()
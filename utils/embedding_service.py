@@ -0,0 +1,194 @@
+"""
+Service d'embedding en processus avec micro-batching.
+
+Les appels `encode` de tous les threads (threadpool de Starlette, indexation) sont placés dans
+une file. Un thread unique les regroupe en lots : un lot part dès qu'il atteint
+EMBEDDING_MAX_BATCH_SIZE textes, ou EMBEDDING_MAX_WAIT_MS millisecondes après l'arrivée de son
+premier texte. Un seul passage du modèle sert ainsi plusieurs requêtes concurrentes, au lieu
+de nombreux petits passages qui se disputent le GIL et les threads BLAS.
+
+Les histogrammes de taille de lot et d'attente en file sont exposés par `stats()`.
+
+Le backend est choisi par EMBEDDING_BACKEND : "torch" (SentenceTransformer, par défaut) ou
+"onnx" (ONNX Runtime int8, voir utils/onnx_embedder.py), qui produit des vecteurs compatibles
+avec l'index existant sans charger torch.
+"""
+
+import functools
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+EMBEDDING_MODEL_NAME = os.environ.get("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_MAX_BATCH_SIZE = int(os.environ.get("EMBEDDING_MAX_BATCH_SIZE", "32"))
+EMBEDDING_MAX_WAIT_MS = float(os.environ.get("EMBEDDING_MAX_WAIT_MS", "5"))
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+QUEUE_WAIT_MS_BUCKETS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+
+
+class Histogram:
+    """Histogramme cumulatif à bornes fixes (même convention que Prometheus : compte des valeurs <= borne)."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self._counts[i] += 1
+                break
+        else:
+            self._counts[-1] += 1
+        self._sum += value
+        self._count += 1
+
+    def snapshot(self) -> dict:
+        cumulative, running = {}, 0
+        for bound, count in zip((*self.buckets, "+Inf"), self._counts):
+            running += count
+            cumulative[str(bound)] = running
+        return {"count": self._count, "sum": round(self._sum, 3),
+                "mean": round(self._sum / self._count, 3) if self._count else None,
+                "buckets": cumulative}
+
+
+def load_torch_model():
+    """Charge le modèle SentenceTransformer (import différé : torch n'est chargé qu'ici)."""
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+
+def load_onnx_model():
+    from utils.onnx_embedder import OnnxSentenceEmbedder
+    return OnnxSentenceEmbedder()
+
+
+EMBEDDING_BACKENDS = {
+    "torch": load_torch_model,
+    "onnx": load_onnx_model,
+}
+
+
+def load_embedding_model(backend: str = None):
+    """Charge le modèle du backend `backend` (EMBEDDING_BACKEND par défaut)."""
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Backend d'embedding inconnu : {backend} (valeurs possibles : {', '.join(EMBEDDING_BACKENDS)})")
+    return EMBEDDING_BACKENDS[backend]()
+
+
+class EmbeddingService:
+    """File d'encodage servie par un thread qui forme des lots dynamiques."""
+
+    def __init__(self, backend: str = EMBEDDING_BACKEND, loader=None, max_batch_size: int = EMBEDDING_MAX_BATCH_SIZE,
+                 max_wait_ms: float = EMBEDDING_MAX_WAIT_MS):
+        self.backend = backend
+        self.loader = loader or functools.partial(load_embedding_model, backend)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._model = None
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self._queue_wait_ms = Histogram(QUEUE_WAIT_MS_BUCKETS)
+        self._counters = {"texts": 0, "batches": 0, "errors": 0}
+
+    @property
+    def model(self):
+        """Modèle d'embedding, chargé au premier accès."""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self.loader()
+        return self._model
+
+    def load(self):
+        """Charge le modèle immédiatement (au lieu du premier encodage)."""
+        return self.model
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        """Place `text` dans la file ; le Future reçoit l'embedding (liste de floats)."""
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((text, future, time.monotonic()))
+        return future
+
+    def encode(self, text: str, timeout: float = None) -> list:
+        return self.submit(text).result(timeout=timeout)
+
+    def encode_many(self, texts: list, timeout: float = None) -> list:
+        """Encode une liste de textes ; ils sont regroupés en lots de max_batch_size."""
+        futures = [self.submit(text) for text in texts]
+        return [future.result(timeout=timeout) for future in futures]
+
+    def _next_batch(self) -> list:
+        batch = [self._queue.get()]
+        deadline = batch[0][2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get_nowait() if remaining <= 0 else self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            started = time.monotonic()
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            with self._stats_lock:
+                self._batch_sizes.observe(len(batch))
+                for _, _, enqueued_at in batch:
+                    self._queue_wait_ms.observe((started - enqueued_at) * 1000)
+            try:
+                vectors = self.model.encode([text for text, _, _ in batch], batch_size=len(batch))
+                rows = vectors.tolist()
+            except Exception as e:
+                logging.error(f"Échec de l'encodage d'un lot de {len(batch)} texte(s): {e}")
+                with self._stats_lock:
+                    self._counters["errors"] += 1
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            with self._stats_lock:
+                self._counters["texts"] += len(batch)
+                self._counters["batches"] += 1
+            for (_, future, _), row in zip(batch, rows):
+                future.set_result(row)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                **self._counters,
+                "backend": self.backend,
+                "model_loaded": self._model is not None,
+                "queue_depth": self._queue.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "batch_size": self._batch_sizes.snapshot(),
+                "queue_wait_ms": self._queue_wait_ms.snapshot(),
+            }
+
+
+# Instance unique du processus, partagée par la recherche vectorielle et l'indexation
+embedding_service = EmbeddingService()
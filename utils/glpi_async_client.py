@@ -0,0 +1,259 @@
+"""
+Client GLPI asynchrone (asyncio / httpx) utilisé par les routes `async def` de routers/glpi.py.
+
+Contrairement au client synchrone (utils/glpi_client.py), il ne bloque aucun thread du
+threadpool de Starlette pendant les appels GLPI. Le nombre d'appels simultanés vers une
+même instance GLPI est borné par un sémaphore, et un appel en cours peut être annulé
+lorsque le client HTTP se déconnecte (voir `run_until_disconnect`). Les appels passent par
+le même disjoncteur que le client synchrone (`glpi_breaker`) et utilisent le même session_token
+(`glpi_session`), seul responsable de son ouverture et de sa fermeture (killSession).
+"""
+
+import asyncio
+import os
+
+import httpx
+from fastapi import HTTPException, Request
+
+from routers.configuration import load_config as load_glpi_config
+from utils.glpi_client import (
+    GLPI_CONNECT_TIMEOUT, GLPI_READ_TIMEOUT, GLPI_POOL_SIZE, GLPI_GET_RETRIES, GLPI_FAILURE_STATUSES,
+    GlpiCircuitOpenError, glpi_breaker,
+)
+from utils.glpi_session import GlpiUnavailableError, glpi_session, url_joiner
+
+# Nombre maximum d'appels simultanés vers une même instance GLPI
+GLPI_MAX_CONCURRENCY = int(os.environ.get("GLPI_MAX_CONCURRENCY", "10"))
+# Options de recherche GLPI (search/Ticket) renvoyées par `search_tickets`, et leur nom de champ
+TICKET_SEARCH_FIELDS = {
+    2: 'id',
+    1: 'name',
+    21: 'content',
+    12: 'status',
+    3: 'priority',
+    10: 'urgency',
+    7: 'itilcategories_id',
+    15: 'date',
+    19: 'date_mod',
+    17: 'solvedate',
+    16: 'closedate',
+}
+SEARCH_OPTION_REQUESTER = 4  # _users_id_requester
+SEARCH_OPTION_ID = 2
+SEARCH_OPTION_DATE_MOD = 19
+# Intervalle (en secondes) de vérification de la déconnexion du client HTTP
+DISCONNECT_POLL_INTERVAL = 0.25
+
+
+def ticket_date_mod_params(ticket_id: int) -> dict:
+    """Paramètres search/Ticket ne renvoyant que le date_mod d'un ticket (revalidation de cache)."""
+    return {
+        'criteria[0][field]': SEARCH_OPTION_ID,
+        'criteria[0][searchtype]': 'equals',
+        'criteria[0][value]': ticket_id,
+        'forcedisplay[0]': SEARCH_OPTION_DATE_MOD,
+        'range': '0-0',
+    }
+
+
+def date_mod_from_search(body) -> str:
+    rows = (body.get('data') or []) if isinstance(body, dict) else []
+    return rows[0].get(str(SEARCH_OPTION_DATE_MOD)) if rows else None
+
+
+class AsyncGlpiClient:
+    """Client GLPI asyncio-natif (session du processus partagée avec glpi_session) : Ticket, ITILFollowup et User."""
+
+    def __init__(self, max_concurrency: int = GLPI_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self._client = None
+        self._semaphores = {}
+        self._counters = {"session_opens": 0, "refreshed": 0, "cancelled": 0}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Créé à la première utilisation pour être rattaché à la boucle d'événements d'uvicorn
+        if self._client is None:
+            transport = httpx.AsyncHTTPTransport(
+                retries=GLPI_GET_RETRIES,  # Rejoue uniquement les échecs de connexion
+                limits=httpx.Limits(max_connections=GLPI_POOL_SIZE, max_keepalive_connections=GLPI_POOL_SIZE),
+            )
+            self._client = httpx.AsyncClient(
+                transport=transport,
+                timeout=httpx.Timeout(GLPI_READ_TIMEOUT, connect=GLPI_CONNECT_TIMEOUT),
+            )
+        return self._client
+
+    def _semaphore_for(self, base_url: str) -> asyncio.Semaphore:
+        if base_url not in self._semaphores:
+            self._semaphores[base_url] = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphores[base_url]
+
+    async def _send(self, method, url, base_url, **kwargs) -> httpx.Response:
+        """Appel HTTP borné par le sémaphore et soumis au disjoncteur GLPI."""
+        if not glpi_breaker.allow_request():
+            raise GlpiCircuitOpenError("GLPI indisponible (disjoncteur ouvert).")
+        try:
+            async with self._semaphore_for(base_url):
+                response = await self._get_client().request(method, url, **kwargs)
+        except httpx.TransportError:
+            glpi_breaker.record_failure()
+            raise
+        except BaseException:
+            # Annulation (client déconnecté) ou erreur locale : rien ne dit que GLPI est en cause
+            glpi_breaker.release()
+            raise
+        if response.status_code in GLPI_FAILURE_STATUSES:
+            glpi_breaker.record_failure()
+        else:
+            glpi_breaker.record_success()
+        return response
+
+    async def get_token(self):
+        """
+        Session_token partagé du processus (glpi_session). Un token valide est lu sans appel réseau ;
+        sinon la session est ouverte par glpi_session dans un thread, sans bloquer la boucle d'événements.
+        """
+        token = glpi_session.cached_token()
+        if token:
+            return token
+        self._counters["session_opens"] += 1
+        return await asyncio.get_running_loop().run_in_executor(None, glpi_session.get_token)
+
+    async def request(self, method, path, headers=None, **kwargs) -> httpx.Response:
+        """Appel authentifié vers GLPI ; renouvelle la session une fois si GLPI répond 401."""
+        config = load_glpi_config()
+        url = url_joiner(config['GLPI_API_URL'], path)
+        for attempt in range(2):
+            token = await self.get_token()
+            if not token:
+                raise GlpiUnavailableError("Connexion à GLPI impossible.")
+            call_headers = {"Session-Token": token, "App-Token": config['GLPI_APP_TOKEN']}
+            call_headers.update(headers or {})
+            response = await self._send(method, url, config['GLPI_API_URL'], headers=call_headers, **kwargs)
+            if response.status_code == 401 and attempt == 0:
+                glpi_session.invalidate(token)
+                self._counters["refreshed"] += 1
+                continue
+            return response
+        return response
+
+    async def _json(self, method, path, **kwargs):
+        response = await self.request(method, path, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    # --- Tickets ---
+
+    async def list_tickets(self, params: dict = None):
+        return await self._json("GET", 'Ticket', params=params)
+
+    async def list_tickets_page(self, params: dict):
+        """Page de tickets et nombre total, lu dans l'en-tête Content-Range ("0-49/1234") de GLPI."""
+        response = await self.request("GET", 'Ticket', params=params)
+        if response.status_code == 400 and 'ERROR_RANGE_EXCEED_TOTAL' in response.text:
+            return [], None
+        response.raise_for_status()
+        total = None
+        content_range = response.headers.get('Content-Range', '')
+        if '/' in content_range:
+            try:
+                total = int(content_range.rsplit('/', 1)[1])
+            except ValueError:
+                total = None
+        return response.json(), total
+
+    async def search_tickets(self, criteria: list, start: int = 0, end: int = 999):
+        """
+        Recherche côté GLPI (search/Ticket) : seules les lignes correspondant aux critères transitent.
+        Retourne (tickets, total), triés par ID comme le miroir, avec les seules clés de
+        TICKET_SEARCH_FIELDS, nommées comme pour GET Ticket.
+        """
+        params = {'range': f'{start}-{end}', 'sort': SEARCH_OPTION_ID, 'order': 'ASC'}
+        for i, criterion in enumerate(criteria):
+            for key, value in criterion.items():
+                params[f'criteria[{i}][{key}]'] = value
+        for i, field_id in enumerate(TICKET_SEARCH_FIELDS):
+            params[f'forcedisplay[{i}]'] = field_id
+        response = await self.request("GET", 'search/Ticket', params=params)
+        if response.status_code == 400 and 'ERROR_RANGE_EXCEED_TOTAL' in response.text:
+            return [], None
+        response.raise_for_status()
+        body = response.json()
+        rows = body.get('data') or []
+        tickets = [{name: row.get(str(field_id)) for field_id, name in TICKET_SEARCH_FIELDS.items()} for row in rows]
+        return tickets, body.get('totalcount')
+
+    async def get_ticket_date_mod(self, ticket_id: int):
+        return date_mod_from_search(await self._json("GET", 'search/Ticket', params=ticket_date_mod_params(ticket_id)))
+
+    async def get_ticket_requesters(self, ticket_id: int):
+        """Liens Ticket_User du ticket (demandeurs, techniciens, observateurs)."""
+        return await self._json("GET", f'Ticket/{ticket_id}/Ticket_User')
+
+    async def get_ticket_items(self, ticket_id: int):
+        """Éléments (matériels, logiciels...) liés au ticket (Item_Ticket)."""
+        return await self._json("GET", f'Ticket/{ticket_id}/Item_Ticket', params={'expand_dropdowns': 'true'})
+
+    async def get_ticket(self, ticket_id: int, expand_dropdowns: bool = True):
+        params = {'expand_dropdowns': 'true'} if expand_dropdowns else None
+        return await self._json("GET", f'Ticket/{ticket_id}', params=params)
+
+    async def create_ticket(self, ticket_input: dict):
+        return await self._json("POST", 'Ticket', json={"input": ticket_input})
+
+    async def update_ticket(self, ticket_id: int, ticket_input: dict):
+        return await self._json("PUT", f'Ticket/{ticket_id}', json={"input": ticket_input})
+
+    async def delete_ticket(self, ticket_id: int):
+        return await self._json("DELETE", f'Ticket/{ticket_id}')
+
+    # --- Suivis (ITILFollowup) ---
+
+    async def get_followups(self, ticket_id: int):
+        params = {'expand_dropdowns': 'true', 'sort': 'date_mod', 'order': 'ASC'}
+        return await self._json("GET", f'Ticket/{ticket_id}/ITILFollowup', params=params)
+
+    async def add_followup(self, followup_input: dict):
+        return await self._json("POST", 'ITILFollowup', json={"input": followup_input})
+
+    # --- Utilisateurs ---
+
+    async def search_users(self, search_text: str):
+        return await self._json("GET", 'User', params={'searchText': search_text})
+
+    async def create_user(self, user_input: dict):
+        return await self._json("POST", 'User', json={"input": user_input})
+
+    async def close(self):
+        """Ferme le pool de connexions ; la session GLPI est fermée par glpi_session.close()."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        in_flight = {url: self.max_concurrency - sem._value for url, sem in self._semaphores.items()}
+        return {**self._counters, "max_concurrency": self.max_concurrency, "in_flight": in_flight}
+
+
+async def run_until_disconnect(request: Request, coro):
+    """
+    Exécute `coro` et l'annule si le client HTTP se déconnecte avant la fin,
+    afin de ne pas garder un appel GLPI en vol pour une réponse que personne ne lira.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                glpi_async._counters["cancelled"] += 1
+                raise HTTPException(status_code=499, detail="Requête annulée par le client.")
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+# Instance unique partagée par les routes asynchrones
+glpi_async = AsyncGlpiClient()
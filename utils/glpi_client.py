@@ -0,0 +1,118 @@
+"""
+Client HTTP partagé pour tout le trafic GLPI.
+
+Une seule `requests.Session` montée sur un `HTTPAdapter` garde les connexions TCP/TLS
+ouvertes (keep-alive) entre les appels. Les délais de connexion et de lecture sont
+appliqués par défaut et les GET (idempotents) sont rejoués avec un backoff exponentiel
+sur les erreurs réseau et les réponses 502/503/504.
+
+Tous les appels passent par le disjoncteur `glpi_breaker` (partagé avec le client asynchrone) :
+lorsque GLPI est tombé, ils échouent immédiatement avec `GlpiCircuitOpenError` au lieu
+d'attendre l'expiration des délais.
+"""
+
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.circuit_breaker import CircuitBreaker
+
+# Paramètres réglables via variables d'environnement
+GLPI_POOL_SIZE = int(os.environ.get("GLPI_POOL_SIZE", "20"))
+GLPI_CONNECT_TIMEOUT = float(os.environ.get("GLPI_CONNECT_TIMEOUT", "5"))
+GLPI_READ_TIMEOUT = float(os.environ.get("GLPI_READ_TIMEOUT", "30"))
+GLPI_GET_RETRIES = int(os.environ.get("GLPI_GET_RETRIES", "3"))
+GLPI_RETRY_BACKOFF = float(os.environ.get("GLPI_RETRY_BACKOFF", "0.5"))
+# Réponses GLPI comptées comme des échecs par le disjoncteur (en plus des erreurs réseau)
+GLPI_FAILURE_STATUSES = (502, 503, 504)
+
+
+class GlpiUnavailableError(requests.exceptions.ConnectionError):
+    """Levée lorsqu'aucune session GLPI ne peut être ouverte."""
+
+
+class GlpiCircuitOpenError(GlpiUnavailableError):
+    """Levée sans appel réseau lorsque le disjoncteur GLPI est ouvert."""
+
+
+# Disjoncteur unique pour l'instance GLPI, partagé par les clients synchrone et asynchrone
+glpi_breaker = CircuitBreaker("glpi")
+
+
+class GlpiHttpClient:
+    """Session HTTP à connexions persistantes utilisée par tous les appels GLPI."""
+
+    def __init__(self, pool_size: int = GLPI_POOL_SIZE, connect_timeout: float = GLPI_CONNECT_TIMEOUT,
+                 read_timeout: float = GLPI_READ_TIMEOUT, get_retries: int = GLPI_GET_RETRIES,
+                 backoff_factor: float = GLPI_RETRY_BACKOFF, breaker: CircuitBreaker = glpi_breaker):
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker
+        self._lock = threading.Lock()
+        retry = Retry(
+            total=get_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(["GET", "HEAD", "OPTIONS"]),  # Jamais de rejeu sur POST/PUT
+            raise_on_status=False,
+        )
+        self._adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", self._adapter)
+        self.session.mount("https://", self._adapter)
+
+    def request(self, method, url, **kwargs) -> requests.Response:
+        if not self.breaker.allow_request():
+            raise GlpiCircuitOpenError("GLPI indisponible (disjoncteur ouvert).")
+        kwargs.setdefault("timeout", self.timeout)
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        if response.status_code in GLPI_FAILURE_STATUSES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def get(self, url, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def stats(self) -> dict:
+        """
+        Statistiques du pool : une requête servie par une connexion déjà ouverte est un "hit",
+        une requête qui a dû ouvrir une nouvelle connexion TCP/TLS est un "miss".
+        """
+        total_requests = 0
+        new_connections = 0
+        with self._lock:
+            pools = self._adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                total_requests += pool.num_requests
+                new_connections += pool.num_connections
+        return {
+            "pool_size": self._adapter._pool_maxsize,
+            "timeout": {"connect": self.timeout[0], "read": self.timeout[1]},
+            "requests": total_requests,
+            "pool_hits": max(total_requests - new_connections, 0),
+            "pool_misses": new_connections,
+        }
+
+    def close(self):
+        self.session.close()
+
+
+# Instance unique partagée par les routeurs et les scripts
+glpi_http = GlpiHttpClient()
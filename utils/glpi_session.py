@@ -0,0 +1,150 @@
+"""
+Gestionnaire de session GLPI partagé par tout le processus.
+
+Un seul session_token est ouvert via `initSession` puis réutilisé par tous les appels, synchrones
+comme asynchrones (utils/glpi_async_client.py), jusqu'à son expiration (inactivité) ou jusqu'à ce
+que GLPI réponde 401, auquel cas il est renouvelé une fois. La session est fermée proprement (`killSession`) à l'arrêt de l'application.
+"""
+
+import logging
+import os
+import threading
+import time
+
+import requests
+
+from routers.configuration import load_config as load_glpi_config
+from utils.glpi_client import GlpiCircuitOpenError, GlpiUnavailableError, glpi_http
+
+# Durée (en secondes) pendant laquelle un token inutilisé est considéré comme valide.
+# GLPI expire les sessions inactives (session.gc_maxlifetime = 1440 s par défaut).
+GLPI_SESSION_TTL = int(os.environ.get("GLPI_SESSION_TTL", "1200"))
+
+
+def url_joiner(base_url, path):
+    """Joins a base URL and a path, handling trailing slashes."""
+    return f"{base_url.rstrip('/')}/{path.lstrip('/')}"
+
+
+class GlpiSessionManager:
+    """Partage un session_token GLPI entre tous les appels du processus."""
+
+    def __init__(self, ttl: int = GLPI_SESSION_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._token = None
+        self._config_key = None
+        self._opened_at = 0.0
+        self._last_used = 0.0
+        self._counters = {"opened": 0, "reused": 0, "refreshed": 0, "killed": 0, "errors": 0}
+
+    @staticmethod
+    def _config_key_for(config):
+        return (config.get('GLPI_API_URL'), config.get('GLPI_APP_TOKEN'), config.get('GLPI_USER_TOKEN'))
+
+    def _init_session(self, config):
+        url = url_joiner(config['GLPI_API_URL'], 'initSession')
+        headers = {
+            "App-Token": config['GLPI_APP_TOKEN'],
+            "Authorization": f"user_token {config['GLPI_USER_TOKEN']}"
+        }
+        response = glpi_http.post(url, headers=headers)
+        response.raise_for_status()
+        return response.json().get("session_token")
+
+    def _reuse(self, config_key, now):
+        # Un changement de configuration (POST /config/glpi) impose une nouvelle session.
+        if self._token and self._config_key == config_key and now - self._last_used < self.ttl:
+            self._last_used = now
+            self._counters["reused"] += 1
+            return self._token
+        return None
+
+    def cached_token(self):
+        """Token courant s'il est encore réutilisable, sans appel réseau (None sinon)."""
+        config_key = self._config_key_for(load_glpi_config())
+        with self._lock:
+            return self._reuse(config_key, time.monotonic())
+
+    def get_token(self):
+        """Retourne le token courant, en ouvrant une nouvelle session si nécessaire."""
+        config = load_glpi_config()
+        config_key = self._config_key_for(config)
+        with self._lock:
+            now = time.monotonic()
+            token = self._reuse(config_key, now)
+            if token:
+                return token
+            try:
+                token = self._init_session(config)
+            except GlpiCircuitOpenError:
+                # Pas d'appel réseau : inutile de journaliser chaque refus du disjoncteur
+                return None
+            except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+                self._counters["errors"] += 1
+                logging.error(f"Erreur get_session_token: {e}")
+                return None
+            if not token:
+                self._counters["errors"] += 1
+                return None
+            self._token = token
+            self._config_key = config_key
+            self._opened_at = self._last_used = now
+            self._counters["opened"] += 1
+            return token
+
+    def invalidate(self, token):
+        """Oublie un token rejeté par GLPI pour forcer son renouvellement."""
+        with self._lock:
+            if token and self._token == token:
+                self._token = None
+                self._counters["refreshed"] += 1
+
+    def request(self, method, path, headers=None, **kwargs) -> requests.Response:
+        """
+        Exécute un appel authentifié vers l'API GLPI.
+        En cas de 401 (session expirée côté GLPI), le token est renouvelé et l'appel rejoué une fois.
+        """
+        config = load_glpi_config()
+        url = url_joiner(config['GLPI_API_URL'], path)
+        for attempt in range(2):
+            token = self.get_token()
+            if not token:
+                raise GlpiUnavailableError("Connexion à GLPI impossible.")
+            call_headers = {"Session-Token": token, "App-Token": config['GLPI_APP_TOKEN']}
+            call_headers.update(headers or {})
+            response = glpi_http.request(method, url, headers=call_headers, **kwargs)
+            if response.status_code == 401 and attempt == 0:
+                logging.info("Session GLPI expirée, renouvellement du session_token.")
+                self.invalidate(token)
+                continue
+            return response
+        return response
+
+    def close(self):
+        """Ferme la session GLPI ouverte (killSession). Appelé à l'arrêt de l'application."""
+        with self._lock:
+            token, self._token = self._token, None
+        if not token:
+            return
+        config = load_glpi_config()
+        try:
+            glpi_http.get(
+                url_joiner(config['GLPI_API_URL'], 'killSession'),
+                headers={"Session-Token": token, "App-Token": config['GLPI_APP_TOKEN']},
+                timeout=5
+            )
+            self._counters["killed"] += 1
+        except (requests.exceptions.RequestException, KeyError) as e:
+            logging.warning(f"Impossible de fermer la session GLPI: {e}")
+
+    def stats(self) -> dict:
+        """Compteurs de réutilisation / renouvellement de la session."""
+        with self._lock:
+            active = self._token is not None
+            age = round(time.monotonic() - self._opened_at, 1) if active else None
+            return {**self._counters, "active": active, "session_age_seconds": age}
+
+
+# Instance unique partagée par les routeurs et les scripts
+glpi_session = GlpiSessionManager()
@@ -0,0 +1,69 @@
+"""
+Cache de résolution email -> ID utilisateur GLPI.
+
+Les résultats positifs sont conservés GLPI_USER_CACHE_TTL secondes. Les échecs (utilisateur
+introuvable et création impossible) sont aussi mis en cache, plus brièvement
+(GLPI_USER_NEGATIVE_TTL), pour ne pas solliciter GLPI à chaque connexion d'un compte en erreur.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+GLPI_USER_CACHE_TTL = int(os.environ.get("GLPI_USER_CACHE_TTL", "86400"))
+GLPI_USER_NEGATIVE_TTL = int(os.environ.get("GLPI_USER_NEGATIVE_TTL", "300"))
+GLPI_USER_CACHE_SIZE = int(os.environ.get("GLPI_USER_CACHE_SIZE", "10000"))
+
+
+def normalize_email(email) -> str:
+    return (email or '').strip().lower()
+
+
+class GlpiUserIdCache:
+    """Cache LRU à expiration des IDs GLPI, indexé par email normalisé."""
+
+    def __init__(self, ttl: int = GLPI_USER_CACHE_TTL, negative_ttl: int = GLPI_USER_NEGATIVE_TTL,
+                 max_size: int = GLPI_USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # email -> (glpi_user_id ou None, expiration)
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "negative_hits": 0, "misses": 0}
+
+    def lookup(self, email):
+        """Retourne (trouvé, glpi_user_id). glpi_user_id vaut None pour une entrée négative."""
+        key = normalize_email(email)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                self._entries.pop(key, None)
+                self._counters["misses"] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self._counters["hits" if entry[0] is not None else "negative_hits"] += 1
+            return True, entry[0]
+
+    def set(self, email, glpi_user_id):
+        """Enregistre une résolution ; `None` enregistre un échec (cache négatif)."""
+        key = normalize_email(email)
+        if not key:
+            return
+        ttl = self.ttl if glpi_user_id is not None else self.negative_ttl
+        with self._lock:
+            self._entries[key] = (glpi_user_id, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, email):
+        with self._lock:
+            self._entries.pop(normalize_email(email), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._counters, "size": len(self._entries)}
+
+
+glpi_user_cache = GlpiUserIdCache()
@@ -0,0 +1,306 @@
+"""
+Indexation incrémentale des documents MongoDB dans ChromaDB.
+
+Chaque passage indexé porte en métadonnées l'empreinte (`doc_hash`) du document dont il est issu :
+SHA-256 du titre, de la catégorie, des tags, du contenu, des paramètres de découpage et du modèle
+d'embedding. Une ré-indexation ne ré-encode que les documents nouveaux ou dont l'empreinte a changé
+(écriture par `upsert`), supprime les passages devenus inutiles et ceux des documents disparus de
+MongoDB, et laisse les autres intacts. Une ré-indexation sans changement ne fait donc aucun encodage.
+
+L'indexation se fait en flux, par lots :
+  - les documents sont lus par un curseur MongoDB de INDEX_CURSOR_BATCH_SIZE documents ;
+  - les passages sont encodés par lots de INDEX_ENCODE_BATCH_SIZE textes, dans le processus courant
+    ou, avec INDEX_WORKERS > 0, par un pool de processus qui chargent chacun le modèle ;
+  - les vecteurs sont écrits dans Chroma par `upsert` de INDEX_UPSERT_BATCH_SIZE passages.
+Les passages écrits dans Chroma le sont aussi dans l'index lexical (utils/lexical_index.py) s'il
+est fourni ; un document à jour dans Chroma mais absent ou périmé de l'index lexical n'y est que
+réécrit, sans ré-encodage.
+Au plus INDEX_MAX_PENDING lots sont en cours d'encodage : la lecture de MongoDB attend l'écriture
+dans Chroma (contre-pression), la mémoire reste bornée quelle que soit la taille du corpus.
+
+`reindex` accepte un rappel `progress`, appelé régulièrement avec l'avancement ; une exception
+levée par ce rappel interrompt l'indexation (annulation, voir utils/reindex_jobs.py). Les documents
+déjà écrits le restent : la ré-indexation suivante reprend là où celle-ci s'est arrêtée.
+"""
+
+import collections
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from utils.chunking import CHUNK_OVERLAP, CHUNK_SIZE, chunk_document
+from utils.embedding_cache import bump_index_version
+from utils.embedding_service import EMBEDDING_MODEL_NAME, embedding_service, load_embedding_model
+
+# Champs MongoDB utiles à l'indexation
+DOCUMENT_PROJECTION = {"title": 1, "filename": 1, "category": 1, "tags": 1, "content": 1}
+
+INDEX_CURSOR_BATCH_SIZE = int(os.environ.get("INDEX_CURSOR_BATCH_SIZE", "1000"))
+INDEX_ENCODE_BATCH_SIZE = int(os.environ.get("INDEX_ENCODE_BATCH_SIZE", "256"))
+INDEX_UPSERT_BATCH_SIZE = int(os.environ.get("INDEX_UPSERT_BATCH_SIZE", "2000"))
+# Processus d'encodage (0 : encodage dans le processus courant)
+INDEX_WORKERS = int(os.environ.get("INDEX_WORKERS", "0"))
+# Lots en cours d'encodage au plus (0 : deux par processus, ou un seul sans pool)
+INDEX_MAX_PENDING = int(os.environ.get("INDEX_MAX_PENDING", "0"))
+
+
+def document_hash(doc: dict) -> str:
+    payload = {
+        "title": doc.get("title", doc.get("filename", "")) or "",
+        "category": doc.get("category", "") or "",
+        "tags": list(doc.get("tags", [])),
+        "content": doc.get("content", "") or "",
+        "chunking": [CHUNK_SIZE, CHUNK_OVERLAP],
+        "model": EMBEDDING_MODEL_NAME,
+    }
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def indexed_documents(chroma_collection):
+    """
+    État actuel de l'index : {parent_id: {"hash", "ids"}} pour les passages, et la liste des
+    entrées « document entier » d'un index antérieur au découpage (à remplacer).
+    """
+    existing, legacy_ids = {}, []
+    entries = chroma_collection.get(include=["metadatas"])
+    for entry_id, metadata in zip(entries["ids"], entries["metadatas"] or []):
+        parent_id = (metadata or {}).get("parent_id")
+        if not parent_id:
+            legacy_ids.append(entry_id)
+            continue
+        state = existing.setdefault(parent_id, {"hashes": set(), "ids": []})
+        state["ids"].append(entry_id)
+        state["hashes"].add(metadata.get("doc_hash"))
+    for state in existing.values():
+        hashes = state.pop("hashes")
+        # Un document dont les passages n'ont pas tous la même empreinte est ré-indexé
+        state["hash"] = hashes.pop() if len(hashes) == 1 else None
+    return existing, legacy_ids
+
+
+# Modèle d'un processus d'encodage du pool (chargé par _init_worker)
+_worker_model = None
+
+
+def _init_worker(backend: str, threads: int):
+    """Initialise un processus du pool : threads de calcul limités, puis chargement du modèle."""
+    global _worker_model
+    if threads:
+        # Avant le chargement du modèle : torch et ONNX Runtime lisent ces variables à l'import
+        for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "EMBEDDING_ONNX_THREADS"):
+            os.environ[name] = str(threads)
+    _worker_model = load_embedding_model(backend)
+
+
+def _encode_in_worker(texts: list, batch_size: int) -> list:
+    return _worker_model.encode(texts, batch_size=batch_size).tolist()
+
+
+class _Encoder:
+    """Encodage par lots, dans le processus courant ou dans un pool de `workers` processus."""
+
+    def __init__(self, workers: int, batch_size: int):
+        self.batch_size = batch_size
+        self._pool = None
+        if workers > 0:
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            # spawn : les processus ne copient ni le modèle ni les threads du processus courant
+            self._pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(embedding_service.backend, threads),
+            )
+
+    def submit(self, texts: list) -> Future:
+        if self._pool is not None:
+            return self._pool.submit(_encode_in_worker, texts, self.batch_size)
+        future = Future()
+        try:
+            # Appel direct au modèle : les lots du service (EMBEDDING_MAX_BATCH_SIZE) sont faits pour les requêtes
+            future.set_result(embedding_service.model.encode(texts, batch_size=self.batch_size).tolist())
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def close(self, cancel: bool = False):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=cancel)
+
+
+def _max_upsert_batch(chroma_collection, requested: int) -> int:
+    """`requested`, borné par la taille maximale de lot acceptée par le client Chroma s'il l'expose."""
+    client = getattr(chroma_collection, "_client", None)
+    try:
+        limit = client.get_max_batch_size()
+    except Exception:
+        return requested
+    return min(requested, limit) if limit else requested
+
+
+class _ChromaWriter:
+    """
+    Tampon d'écriture : `upsert` par lots de `batch_size` passages, puis suppression des passages
+    obsolètes. Chaque lot écrit dans Chroma l'est aussi dans l'index lexical `lexical`.
+    """
+
+    def __init__(self, chroma_collection, batch_size: int, summary: dict, lexical=None):
+        self.chroma_collection = chroma_collection
+        self.batch_size = batch_size
+        self.summary = summary
+        self.lexical = lexical
+        self._chunks, self._embeddings, self._stale_ids = [], [], []
+        self._lexical_chunks = []
+        # Documents dont les anciens passages ont déjà été retirés de l'index lexical
+        self._lexical_cleared = set()
+
+    def add(self, chunks: list, embeddings: list, stale_ids: list):
+        self._chunks.extend(chunks)
+        self._embeddings.extend(embeddings)
+        self._stale_ids.extend(stale_ids)
+        while len(self._chunks) >= self.batch_size:
+            self._write(self.batch_size)
+
+    def add_lexical(self, chunks: list):
+        """Passages à écrire dans l'index lexical seulement (vecteurs déjà à jour dans Chroma)."""
+        self._lexical_chunks.extend(chunks)
+        if len(self._lexical_chunks) >= self.batch_size:
+            self._write_lexical(self._lexical_chunks)
+            self._lexical_chunks = []
+
+    def flush(self):
+        while self._chunks:
+            self._write(self.batch_size)
+        if self._lexical_chunks:
+            self._write_lexical(self._lexical_chunks)
+            self._lexical_chunks = []
+        self._delete_stale()
+
+    def _write_lexical(self, chunks: list):
+        # Un document peut être réparti sur deux lots : ses anciens passages ne sont retirés qu'au premier
+        parent_ids = {chunk["metadata"]["parent_id"] for chunk in chunks} - self._lexical_cleared
+        self._lexical_cleared |= parent_ids
+        self.lexical.replace(parent_ids, chunks)
+
+    def _write(self, size: int):
+        chunks, self._chunks = self._chunks[:size], self._chunks[size:]
+        embeddings, self._embeddings = self._embeddings[:size], self._embeddings[size:]
+        self.chroma_collection.upsert(
+            ids=[chunk["id"] for chunk in chunks],
+            embeddings=embeddings,
+            documents=[chunk["text"] for chunk in chunks],
+            metadatas=[chunk["metadata"] for chunk in chunks],
+        )
+        self.summary["chunks_written"] += len(chunks)
+        if self.lexical is not None:
+            self._write_lexical(chunks)
+        if len(self._stale_ids) >= self.batch_size:
+            self._delete_stale()
+
+    def _delete_stale(self):
+        # Passages d'une version précédente plus longue des documents, supprimés après l'écriture des nouveaux
+        if self._stale_ids:
+            stale_ids, self._stale_ids = self._stale_ids, []
+            self.chroma_collection.delete(ids=stale_ids)
+            self.summary["chunks_deleted"] += len(stale_ids)
+
+
+def reindex(doc_collection, chroma_collection, persist_dir: str, full: bool = False,
+            workers: int = INDEX_WORKERS, cursor_batch_size: int = INDEX_CURSOR_BATCH_SIZE,
+            encode_batch_size: int = INDEX_ENCODE_BATCH_SIZE, upsert_batch_size: int = INDEX_UPSERT_BATCH_SIZE,
+            max_pending: int = INDEX_MAX_PENDING, lexical=None, progress=None, log=print) -> dict:
+    """
+    Met l'index Chroma (et l'index lexical `lexical`, s'il est fourni) en conformité avec la
+    collection MongoDB et retourne le bilan : documents ajoutés, mis à jour, supprimés et
+    inchangés. `full=True` ré-encode tout.
+    `progress(state)` reçoit `processed`, `total` (estimation MongoDB, ou None), `done` et le bilan partiel.
+    """
+    started = time.perf_counter()
+    summary = {"added": 0, "updated": 0, "deleted": 0, "skipped": 0, "chunks_written": 0, "chunks_deleted": 0}
+    existing, legacy_ids = indexed_documents(chroma_collection)
+    legacy = set(legacy_ids)
+    lexical_hashes = lexical.document_hashes() if lexical is not None else {}
+    seen = set()
+    count = getattr(doc_collection, "estimated_document_count", None)
+    total = count() if count else None
+
+    def report(done: bool = False):
+        if progress is not None:
+            progress({"processed": len(seen), "total": total, "done": done, **summary})
+
+    encoder = _Encoder(workers, encode_batch_size)
+    writer = _ChromaWriter(chroma_collection, _max_upsert_batch(chroma_collection, upsert_batch_size), summary,
+                           lexical)
+    max_pending = max_pending or (2 * workers if workers > 0 else 1)
+    in_flight = collections.deque()  # (passages, passages obsolètes, Future des vecteurs), dans l'ordre
+    chunks, stale_ids = [], []
+
+    def submit():
+        nonlocal chunks, stale_ids
+        in_flight.append((chunks, stale_ids, encoder.submit([chunk["embed_text"] for chunk in chunks])))
+        chunks, stale_ids = [], []
+        # Contre-pression : on n'avance dans le curseur que si un lot encodé a été écrit
+        while len(in_flight) > max_pending:
+            done_chunks, done_stale, future = in_flight.popleft()
+            writer.add(done_chunks, future.result(), done_stale)
+        report()
+
+    try:
+        report()
+        for doc in doc_collection.find({}, DOCUMENT_PROJECTION, batch_size=cursor_batch_size):
+            doc_id = str(doc["_id"])
+            seen.add(doc_id)
+            doc_hash = document_hash(doc)
+            if not full and existing.get(doc_id, {}).get("hash") == doc_hash:
+                summary["skipped"] += 1
+                if lexical is not None and lexical_hashes.get(doc_id) != doc_hash:
+                    writer.add_lexical(chunk_document(doc, doc_hash=doc_hash))
+                if summary["skipped"] % cursor_batch_size == 0:
+                    report()
+                continue
+            summary["updated" if doc_id in existing or doc_id in legacy else "added"] += 1
+            doc_chunks = chunk_document(doc, doc_hash=doc_hash)
+            new_ids = {chunk["id"] for chunk in doc_chunks}
+            chunks.extend(doc_chunks)
+            stale_ids.extend(i for i in existing.get(doc_id, {}).get("ids", []) if i not in new_ids)
+            if len(chunks) >= encode_batch_size:
+                submit()
+        if chunks:
+            submit()
+        while in_flight:
+            done_chunks, done_stale, future = in_flight.popleft()
+            writer.add(done_chunks, future.result(), done_stale)
+        writer.flush()
+    except BaseException:
+        encoder.close(cancel=True)
+        if summary["chunks_written"] or summary["chunks_deleted"]:
+            # Index modifié en partie : les résultats de recherche en cache ne sont plus valables
+            bump_index_version(persist_dir, chroma_collection.name)
+        raise
+    encoder.close()
+
+    # Documents supprimés de MongoDB, et entrées « document entier » de l'ancien format
+    removed = [doc_id for doc_id in existing if doc_id not in seen]
+    removed_ids = [entry_id for doc_id in removed for entry_id in existing[doc_id]["ids"]] + legacy_ids
+    if removed_ids:
+        chroma_collection.delete(ids=removed_ids)
+        summary["chunks_deleted"] += len(removed_ids)
+    summary["deleted"] = len(removed) + len([i for i in legacy_ids if i not in seen])
+    if lexical is not None:
+        lexical.delete_documents([doc_id for doc_id in lexical_hashes if doc_id not in seen])
+
+    if summary["added"] or summary["updated"] or removed_ids:
+        # Nouvelle version de l'index : les résultats de recherche en cache sont invalidés
+        bump_index_version(persist_dir, chroma_collection.name)
+    summary["seconds"] = round(time.perf_counter() - started, 2)
+    report(done=True)
+    log(
+        f"Ré-indexation : {summary['added']} ajouté(s), {summary['updated']} mis à jour, "
+        f"{summary['deleted']} supprimé(s), {summary['skipped']} inchangé(s) "
+        f"({summary['chunks_written']} passage(s) écrit(s), {summary['chunks_deleted']} retiré(s)) "
+        f"en {summary['seconds']} s."
+    )
+    return summary
@@ -0,0 +1,205 @@
+"""
+Classifieur d'intention local (plus proches voisins sur les embeddings des questions).
+
+Chaque message qui n'est ni une annulation ni une demande de statut passait par la recherche
+documentaire et le LLM, souvent pour obtenir `INTENTION: SALUTATION` ou `FAQ`. Ce classifieur,
+entraîné sur la collection `chatbot_logs` (question + `llm_parsed_response.INTENTION`), prédit
+l'intention avec les étiquettes de build_prompt (search_vector_llm.py) ; les exemples de
+build_prompt et de intent_llm_prompt.md (étiquettes ramenées à celles de build_prompt) complètent
+le jeu d'entraînement.
+
+Prédiction : les INTENT_NEIGHBORS exemples les plus proches (cosinus) votent, pondérés par leur
+similarité ; la confiance est la part des votes obtenue par l'intention gagnante. Une prédiction
+n'ouvre le raccourci (réponse sans LLM, voir routers/ai.py) que si l'intention fait partie de
+INTENT_FAST_PATH, avec une confiance d'au moins INTENT_MIN_CONFIDENCE et un plus proche exemple
+à au moins INTENT_MIN_SIMILARITY.
+
+Le modèle (INTENT_MODEL_PATH) est produit par `python train_intent_classifier.py train` ; sans
+modèle, le raccourci est simplement désactivé. Dépendance : numpy.
+"""
+
+import logging
+import os
+import threading
+from collections import Counter
+
+from utils.embedding_cache import normalize_query, query_embedding_cache
+from utils.embedding_service import EMBEDDING_MODEL_NAME, embedding_service
+
+script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INTENT_MODEL_PATH = os.environ.get("INTENT_MODEL_PATH", os.path.join(script_dir, "intent_model", "intent_classifier.npz"))
+INTENT_NEIGHBORS = int(os.environ.get("INTENT_NEIGHBORS", "7"))
+INTENT_MIN_CONFIDENCE = float(os.environ.get("INTENT_MIN_CONFIDENCE", "0.85"))
+INTENT_MIN_SIMILARITY = float(os.environ.get("INTENT_MIN_SIMILARITY", "0.6"))
+# Intentions pouvant être servies sans LLM (liste vide : raccourci désactivé)
+INTENT_FAST_PATH = {i.strip().upper() for i in os.environ.get("INTENT_FAST_PATH", "SALUTATION,FAQ").split(",") if i.strip()}
+# Une FAQ n'est servie sans LLM que si le meilleur passage est au moins aussi proche de la question
+INTENT_FAQ_MIN_SIMILARITY = float(os.environ.get("INTENT_FAQ_MIN_SIMILARITY", "0.75"))
+
+# Étiquettes du format de réponse de build_prompt
+INTENT_LABELS = ("SALUTATION", "CREATION_TICKET", "FAQ", "SUIVI_TICKET", "AUTRE")
+
+# Exemples de build_prompt et de intent_llm_prompt.md
+SEED_EXAMPLES = [
+    ("Bonjour", "SALUTATION"),
+    ("Salut", "SALUTATION"),
+    ("Merci", "SALUTATION"),
+    ("Merci beaucoup, bonne journée", "SALUTATION"),
+    ("Au revoir", "SALUTATION"),
+    ("J'ai une question sur mon mot de passe.", "FAQ"),
+    ("Comment réinitialiser mon mot de passe ?", "FAQ"),
+    ("Mon écran est tout noir.", "CREATION_TICKET"),
+    ("Je veux créer un ticket pour un problème de connexion", "CREATION_TICKET"),
+    ("Où en est le ticket 456 ?", "SUIVI_TICKET"),
+    ("Relance le ticket 789", "SUIVI_TICKET"),
+    ("Quels sont mes tickets ouverts ?", "SUIVI_TICKET"),
+    ("Recherche le ticket mot de passe", "SUIVI_TICKET"),
+    ("Modifie le ticket 123", "SUIVI_TICKET"),
+]
+
+
+def load_training_examples(logs_collection, limit: int = 20000) -> list:
+    """
+    (question, intention) des tours journalisés les plus récents dont l'intention est une étiquette connue.
+    Une question posée plusieurs fois prend l'intention majoritaire.
+    """
+    votes = {}
+    cursor = logs_collection.find(
+        {"question": {"$type": "string"}, "llm_parsed_response.INTENTION": {"$in": list(INTENT_LABELS)}},
+        {"question": 1, "llm_parsed_response.INTENTION": 1},
+    ).sort("timestamp", -1).limit(limit)
+    for log in cursor:
+        question = log["question"].strip()
+        if question:
+            votes.setdefault(normalize_query(question), (question, Counter()))[1][log["llm_parsed_response"]["INTENTION"]] += 1
+    return [(question, counter.most_common(1)[0][0]) for question, counter in votes.values()]
+
+
+class IntentClassifier:
+    """k plus proches voisins sur des embeddings normalisés (produit scalaire = cosinus)."""
+
+    def __init__(self, embeddings, labels: list, questions: list, model_name: str = EMBEDDING_MODEL_NAME,
+                 neighbors: int = INTENT_NEIGHBORS):
+        import numpy as np
+        self._np = np
+        self.embeddings = np.asarray(embeddings, dtype=np.float32)
+        self.labels = list(labels)
+        self.questions = list(questions)
+        self.model_name = model_name
+        self.neighbors = neighbors
+
+    @classmethod
+    def train(cls, examples: list, encode_many=None, **kwargs) -> "IntentClassifier":
+        """`examples` : liste de (question, intention) ; `encode_many` : embeddings d'une liste de textes."""
+        import numpy as np
+        encode_many = encode_many or embedding_service.encode_many
+        questions = [question for question, _ in examples]
+        vectors = np.asarray(encode_many(questions), dtype=np.float32)
+        vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return cls(vectors, [label for _, label in examples], questions, **kwargs)
+
+    def save(self, path: str = INTENT_MODEL_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np = self._np
+        with open(path, "wb") as f:
+            np.savez_compressed(f, embeddings=self.embeddings, labels=np.array(self.labels),
+                                questions=np.array(self.questions), model_name=np.array(self.model_name))
+
+    @classmethod
+    def load(cls, path: str = INTENT_MODEL_PATH) -> "IntentClassifier":
+        import numpy as np
+        data = np.load(path, allow_pickle=False)
+        model_name = str(data["model_name"])
+        if model_name != EMBEDDING_MODEL_NAME:
+            raise ValueError(f"Classifieur entraîné avec {model_name}, modèle d'embedding actuel {EMBEDDING_MODEL_NAME}.")
+        return cls(data["embeddings"], [str(l) for l in data["labels"]], [str(q) for q in data["questions"]], model_name)
+
+    def predict_vector(self, vector) -> dict:
+        np = self._np
+        vector = np.asarray(vector, dtype=np.float32)
+        vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
+        similarities = self.embeddings @ vector
+        k = min(self.neighbors, len(self.labels))
+        nearest = np.argpartition(-similarities, k - 1)[:k]
+        votes = Counter()
+        for i in nearest:
+            votes[self.labels[i]] += max(float(similarities[i]), 0.0)
+        intent, weight = votes.most_common(1)[0]
+        total = sum(votes.values())
+        return {
+            "intent": intent,
+            "confidence": round(weight / total, 3) if total else 0.0,
+            "similarity": round(float(similarities[nearest].max()), 3),
+        }
+
+
+class IntentFastPath:
+    """Prédictions du classifieur (chargé au premier usage) et compteurs du raccourci."""
+
+    def __init__(self, path: str = INTENT_MODEL_PATH, fast_path=INTENT_FAST_PATH):
+        self.path = path
+        self.fast_path = set(fast_path)
+        self._classifier = None
+        self._load_error = None
+        self._lock = threading.Lock()
+        self._counters = {"predictions": 0, "llm_calls": 0, "fast_path": Counter(), "declined": Counter()}
+
+    @property
+    def classifier(self):
+        if self._classifier is None and self._load_error is None:
+            with self._lock:
+                if self._classifier is None and self._load_error is None:
+                    try:
+                        self._classifier = IntentClassifier.load(self.path)
+                    except Exception as e:
+                        # Pas de modèle (ou modèle incompatible) : le raccourci est désactivé
+                        self._load_error = str(e)
+                        logging.warning(f"Classifieur d'intention indisponible, raccourci désactivé: {e}")
+        return self._classifier
+
+    def reload(self):
+        with self._lock:
+            self._classifier, self._load_error = None, None
+        return self.classifier
+
+    def predict(self, question: str):
+        """Prédiction pour `question` (None si aucun modèle) ; `eligible` indique si le raccourci est permis."""
+        classifier = self.classifier
+        if classifier is None or not self.fast_path:
+            return None
+        prediction = classifier.predict_vector(query_embedding_cache.encode(embedding_service.encode, question))
+        prediction["eligible"] = (prediction["intent"] in self.fast_path
+                                  and prediction["confidence"] >= INTENT_MIN_CONFIDENCE
+                                  and prediction["similarity"] >= INTENT_MIN_SIMILARITY)
+        with self._lock:
+            self._counters["predictions"] += 1
+        return prediction
+
+    def record(self, intent: str = None, declined: str = None):
+        """Compte un tour servi sans LLM (`intent`), ou envoyé au LLM (avec le motif `declined` éventuel)."""
+        with self._lock:
+            if intent:
+                self._counters["fast_path"][intent] += 1
+            else:
+                self._counters["llm_calls"] += 1
+                if declined:
+                    self._counters["declined"][declined] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            served = sum(self._counters["fast_path"].values())
+            turns = served + self._counters["llm_calls"]
+            return {
+                "model_loaded": self._classifier is not None,
+                "load_error": self._load_error,
+                "fast_path_intents": sorted(self.fast_path),
+                "predictions": self._counters["predictions"],
+                "llm_calls": self._counters["llm_calls"],
+                "fast_path": dict(self._counters["fast_path"]),
+                "declined": dict(self._counters["declined"]),
+                "llm_calls_avoided_ratio": round(served / turns, 3) if turns else None,
+            }
+
+
+# Raccourci unique du processus
+intent_fast_path = IntentFastPath()
@@ -0,0 +1,147 @@
+"""
+Index lexical (SQLite FTS5, classement BM25) des passages indexés dans Chroma.
+
+Les questions du helpdesk reposent souvent sur des mots exacts — nom de produit, code d'erreur,
+numéro de ticket — que les embeddings MiniLM rapprochent mal. Les mêmes passages que ceux de la
+collection `cms_docs` (voir utils/chunking.py) sont donc aussi indexés en plein texte, dans
+LEXICAL_INDEX_FILE à côté des données Chroma (ou LEXICAL_INDEX_PATH). utils/indexing.py les
+écrit et les supprime en même temps que dans Chroma.
+
+La table `passages` porte le texte et les métadonnées ; la table virtuelle `passages_fts` en est
+l'index FTS5 (contenu externe), tenu à jour par des triggers. Tokenizer unicode61 sans accents :
+« réinitialiser » et « reinitialiser » se retrouvent, « 0x80070005 » ou « 1234 » restent des mots.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+
+LEXICAL_INDEX_FILE = "lexical_index.db"
+# Poids BM25 des colonnes (titre, texte)
+LEXICAL_TITLE_WEIGHT = float(os.environ.get("LEXICAL_TITLE_WEIGHT", "2.0"))
+
+# Mots trop fréquents pour discriminer les passages
+STOP_WORDS = {
+    "le", "la", "les", "un", "une", "des", "de", "du", "au", "aux", "et", "ou", "en", "dans", "sur", "pour",
+    "par", "avec", "sans", "ce", "ces", "cette", "mon", "ma", "mes", "je", "j", "tu", "il", "elle", "on",
+    "nous", "vous", "ils", "elles", "est", "sont", "ne", "pas", "plus", "que", "qui", "quoi", "comment",
+    "a", "l", "d", "qu", "n", "s", "c", "m", "t", "y", "se", "sa", "son", "ses", "leur", "leurs",
+}
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS passages (
+    rowid INTEGER PRIMARY KEY,
+    chunk_id TEXT NOT NULL UNIQUE,
+    parent_id TEXT NOT NULL,
+    chunk_index INTEGER,
+    title TEXT,
+    category TEXT,
+    text TEXT,
+    doc_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS passages_parent ON passages(parent_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS passages_fts USING fts5(
+    title, text, content='passages', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS passages_ai AFTER INSERT ON passages BEGIN
+    INSERT INTO passages_fts(rowid, title, text) VALUES (new.rowid, new.title, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS passages_ad AFTER DELETE ON passages BEGIN
+    INSERT INTO passages_fts(passages_fts, rowid, title, text) VALUES ('delete', old.rowid, old.title, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS passages_au AFTER UPDATE ON passages BEGIN
+    INSERT INTO passages_fts(passages_fts, rowid, title, text) VALUES ('delete', old.rowid, old.title, old.text);
+    INSERT INTO passages_fts(rowid, title, text) VALUES (new.rowid, new.title, new.text);
+END;
+"""
+
+
+def lexical_index_path(persist_dir: str) -> str:
+    """Chemin de l'index lexical associé au répertoire Chroma `persist_dir`."""
+    return os.environ.get("LEXICAL_INDEX_PATH") or os.path.join(persist_dir, LEXICAL_INDEX_FILE)
+
+
+def match_query(question: str) -> str:
+    """Requête FTS5 : les mots de la question (hors mots vides), entre guillemets, reliés par OR."""
+    tokens = [t for t in TOKEN_RE.findall((question or "").lower()) if t not in STOP_WORDS]
+    return " OR ".join(f'"{token}"' for token in dict.fromkeys(tokens))
+
+
+class LexicalIndex:
+    """Connexion SQLite unique, partagée entre threads sous verrou (ouverte au premier usage)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def replace(self, parent_ids, chunks: list):
+        """
+        Supprime les passages des documents `parent_ids` puis écrit `chunks` (passages de
+        utils.chunking.chunk_document), dans une même transaction.
+        """
+        rows = [(chunk["id"], chunk["metadata"]["parent_id"], chunk["metadata"]["chunk_index"],
+                 chunk["metadata"]["title"], chunk["metadata"]["category"], chunk["text"],
+                 chunk["metadata"].get("doc_hash", "")) for chunk in chunks]
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany("DELETE FROM passages WHERE parent_id = ?", [(p,) for p in parent_ids])
+                conn.executemany(
+                    """INSERT INTO passages (chunk_id, parent_id, chunk_index, title, category, text, doc_hash)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)
+                       ON CONFLICT(chunk_id) DO UPDATE SET parent_id = excluded.parent_id,
+                           chunk_index = excluded.chunk_index, title = excluded.title,
+                           category = excluded.category, text = excluded.text, doc_hash = excluded.doc_hash""",
+                    rows,
+                )
+
+    def delete_documents(self, parent_ids):
+        self.replace(parent_ids, [])
+
+    def document_hashes(self) -> dict:
+        """{parent_id: doc_hash} ; None si les passages d'un document n'ont pas tous la même empreinte."""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT parent_id, MIN(doc_hash), MAX(doc_hash) FROM passages GROUP BY parent_id"
+            ).fetchall()
+        return {parent_id: low if low == high else None for parent_id, low, high in rows}
+
+    def search(self, question: str, n_results: int) -> dict:
+        """
+        Les `n_results` passages les mieux classés par BM25, au format d'un résultat Chroma
+        (`ids`, `metadatas`, `documents`) pour être traités comme ceux de la recherche vectorielle.
+        """
+        query = match_query(question)
+        rows = []
+        if query:
+            with self._lock:
+                rows = self._connection().execute(
+                    f"""SELECT p.chunk_id, p.parent_id, p.chunk_index, p.title, p.category, p.text
+                        FROM passages_fts JOIN passages p ON p.rowid = passages_fts.rowid
+                        WHERE passages_fts MATCH ?
+                        ORDER BY bm25(passages_fts, {LEXICAL_TITLE_WEIGHT}, 1.0) LIMIT ?""",
+                    (query, n_results),
+                ).fetchall()
+        return {
+            "ids": [[row[0] for row in rows]],
+            "metadatas": [[{"parent_id": row[1], "chunk_index": row[2], "title": row[3], "category": row[4]}
+                           for row in rows]],
+            "documents": [[row[5] for row in rows]],
+        }
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM passages").fetchone()[0]
+
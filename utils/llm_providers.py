@@ -0,0 +1,362 @@
+"""
+Registre des fournisseurs LLM (Ollama, Groq, Together AI) : un client par fournisseur et par
+processus, réutilisé d'un appel à l'autre.
+
+Auparavant, chaque tour de chatbot construisait un nouveau client Groq/Together, et Ollama
+était appelé par un `requests.post` nu : chaque appel payait la construction du client et une
+nouvelle connexion TCP/TLS. Ici, les clients sont créés au premier usage puis conservés, avec
+des connexions persistantes (keep-alive) limitées à LLM_POOL_SIZE et des délais explicites
+(LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT).
+
+Chaque fournisseur expose la même interface :
+  - complete(prompt, model=None, **options) -> str      (synchrone)
+  - acomplete(prompt, model=None, **options) -> str     (asyncio, client asynchrone dédié)
+  - stream(prompt, model=None, **options) -> itérateur de morceaux de texte
+ainsi que des métriques par fournisseur (appels, erreurs par type, latence, délai du premier
+morceau) exposées par /health/llm. Les erreurs sont levées telles quelles : c'est à l'appelant
+de décider quoi montrer à l'utilisateur.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.embedding_service import Histogram
+
+LLM_PROVIDER = os.environ.get("LLM_PROVIDER", "ollama").lower()
+GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
+TOGETHER_API_KEY = os.environ.get("TOGETHER_API_KEY")
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434/api/generate")
+OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "llama3:8b")
+GROQ_MODEL = os.environ.get("GROQ_MODEL", "llama3-8b-8192")
+TOGETHER_MODEL = os.environ.get("TOGETHER_MODEL", "meta-llama/Llama-3-8b-chat-hf")
+
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", "10"))
+# Délai de lecture : génération complète sans flux, intervalle entre deux morceaux avec flux
+LLM_READ_TIMEOUT = float(os.environ.get("LLM_READ_TIMEOUT", "180"))
+LLM_POOL_SIZE = int(os.environ.get("LLM_POOL_SIZE", "10"))
+# Nouvelles tentatives sur échec de connexion uniquement (une génération n'est jamais rejouée)
+LLM_CONNECT_RETRIES = int(os.environ.get("LLM_CONNECT_RETRIES", "1"))
+
+LATENCY_MS_BUCKETS = (100, 250, 500, 1000, 2000, 5000, 10000, 30000, 60000, 180000)
+
+
+class LLMProvider:
+    """Base commune : métriques et interface ; les sous-classes implémentent `_complete`, `_acomplete`, `_stream`."""
+
+    name = None
+    label = None
+    default_model = None
+
+    def __init__(self, api_key: str = None):
+        self.api_key = api_key
+        self._lock = threading.Lock()
+        self._client = None
+        self._async_client = None
+        self._stats_lock = threading.Lock()
+        self._latency_ms = Histogram(LATENCY_MS_BUCKETS)
+        self._first_chunk_ms = Histogram(LATENCY_MS_BUCKETS)
+        self._counters = {"calls": 0, "errors": 0}
+        self._errors_by_type = {}
+        self._last_error = None
+
+    # --- Clients, créés une seule fois ---
+
+    def _make_client(self):
+        raise NotImplementedError
+
+    def _make_async_client(self):
+        raise NotImplementedError
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._make_client()
+        return self._client
+
+    @property
+    def async_client(self):
+        # Créé à la première utilisation pour être rattaché à la boucle d'événements d'uvicorn
+        if self._async_client is None:
+            self._async_client = self._make_async_client()
+        return self._async_client
+
+    # --- Interface commune ---
+
+    def complete(self, prompt: str, model: str = None, **options) -> str:
+        with self._measure():
+            return self._complete(prompt, model or self.default_model, **options)
+
+    async def acomplete(self, prompt: str, model: str = None, **options) -> str:
+        with self._measure():
+            return await self._acomplete(prompt, model or self.default_model, **options)
+
+    def stream(self, prompt: str, model: str = None, **options):
+        with self._measure() as timing:
+            for chunk in self._stream(prompt, model or self.default_model, **options):
+                if timing["first_chunk"] is None:
+                    timing["first_chunk"] = time.perf_counter()
+                yield chunk
+
+    # --- Métriques ---
+
+    @contextmanager
+    def _measure(self):
+        timing = {"started": time.perf_counter(), "first_chunk": None}
+        try:
+            yield timing
+        except GeneratorExit:
+            # Flux abandonné par l'appelant (client déconnecté) : ni succès ni erreur du fournisseur
+            raise
+        except Exception as e:
+            self._record(timing, error=e)
+            raise
+        else:
+            self._record(timing)
+
+    def _record(self, timing: dict, error: Exception = None):
+        now = time.perf_counter()
+        with self._stats_lock:
+            self._counters["calls"] += 1
+            self._latency_ms.observe((now - timing["started"]) * 1000)
+            if timing["first_chunk"] is not None:
+                self._first_chunk_ms.observe((timing["first_chunk"] - timing["started"]) * 1000)
+            if error is not None:
+                self._counters["errors"] += 1
+                error_type = type(error).__name__
+                self._errors_by_type[error_type] = self._errors_by_type.get(error_type, 0) + 1
+                self._last_error = f"{error_type}: {error}"
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                **self._counters,
+                "provider": self.name,
+                "default_model": self.default_model,
+                "client_ready": self._client is not None,
+                "async_client_ready": self._async_client is not None,
+                "errors_by_type": dict(self._errors_by_type),
+                "last_error": self._last_error,
+                "latency_ms": self._latency_ms.snapshot(),
+                "first_chunk_ms": self._first_chunk_ms.snapshot(),
+            }
+
+    def close(self):
+        if self._client is not None and hasattr(self._client, "close"):
+            self._client.close()
+        self._client = None
+
+    async def aclose(self):
+        client, self._async_client = self._async_client, None
+        if client is None:
+            return
+        for name in ("aclose", "close"):
+            closer = getattr(client, name, None)
+            if closer is not None:
+                result = closer()
+                if hasattr(result, "__await__"):
+                    await result
+                return
+
+
+class OllamaProvider(LLMProvider):
+    name = "ollama"
+    label = "Ollama"
+    default_model = OLLAMA_MODEL
+
+    def __init__(self, api_key: str = None, url: str = OLLAMA_URL):
+        super().__init__(api_key)
+        self.url = url
+
+    def _make_client(self):
+        retry = Retry(total=LLM_CONNECT_RETRIES, connect=LLM_CONNECT_RETRIES, read=0, status=0,
+                      allowed_methods=None, backoff_factor=0.2)
+        session = requests.Session()
+        session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=LLM_POOL_SIZE, max_retries=retry))
+        session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=LLM_POOL_SIZE, max_retries=retry))
+        return session
+
+    def _make_async_client(self):
+        return httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(
+                retries=LLM_CONNECT_RETRIES,
+                limits=httpx.Limits(max_connections=LLM_POOL_SIZE, max_keepalive_connections=LLM_POOL_SIZE),
+            ),
+            timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        )
+
+    def _payload(self, prompt, model, stream, options):
+        payload = {"model": model, "prompt": prompt, "stream": stream}
+        if options:
+            payload["options"] = options
+        return payload
+
+    def _complete(self, prompt, model, **options):
+        response = self.client.post(self.url, json=self._payload(prompt, model, False, options),
+                                    timeout=(LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT))
+        response.raise_for_status()
+        return self._response_text(response.json())
+
+    async def _acomplete(self, prompt, model, **options):
+        response = await self.async_client.post(self.url, json=self._payload(prompt, model, False, options))
+        response.raise_for_status()
+        return self._response_text(response.json())
+
+    @staticmethod
+    def _response_text(body) -> str:
+        # Corps sans texte (erreur du modèle, etc.) : une erreur du fournisseur, pas une réponse à afficher
+        if not isinstance(body, dict) or "response" not in body:
+            raise ValueError("Réponse invalide d'Ollama")
+        return body["response"]
+
+    def _stream(self, prompt, model, **options):
+        with self.client.post(self.url, json=self._payload(prompt, model, True, options), stream=True,
+                              timeout=(LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT)) as response:
+            response.raise_for_status()
+            # Une ligne JSON par morceau : {"response": "...", "done": false} ; une erreur en cours de
+            # génération arrive sous la forme {"error": "..."}
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise ValueError(f"Réponse invalide d'Ollama : {chunk['error']}")
+                if chunk.get("response"):
+                    yield chunk["response"]
+                if chunk.get("done"):
+                    break
+
+
+class ChatCompletionsProvider(LLMProvider):
+    """Fournisseurs à API « chat completions » (Groq, Together AI)."""
+
+    def _messages(self, prompt):
+        return [{"role": "user", "content": prompt}]
+
+    def _complete(self, prompt, model, **options):
+        response = self.client.chat.completions.create(messages=self._messages(prompt), model=model, **options)
+        return response.choices[0].message.content
+
+    async def _acomplete(self, prompt, model, **options):
+        response = await self.async_client.chat.completions.create(messages=self._messages(prompt), model=model,
+                                                                   **options)
+        return response.choices[0].message.content
+
+    def _stream(self, prompt, model, **options):
+        stream = self.client.chat.completions.create(messages=self._messages(prompt), model=model, stream=True,
+                                                     **options)
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class GroqProvider(ChatCompletionsProvider):
+    name = "groq"
+    label = "Groq"
+    default_model = GROQ_MODEL
+
+    def _make_client(self):
+        from groq import Groq
+        # Client httpx fourni explicitement : pool et délais maîtrisés
+        http_client = httpx.Client(
+            limits=httpx.Limits(max_connections=LLM_POOL_SIZE, max_keepalive_connections=LLM_POOL_SIZE),
+            timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        )
+        return Groq(api_key=self.api_key, http_client=http_client, max_retries=LLM_CONNECT_RETRIES)
+
+    def _make_async_client(self):
+        from groq import AsyncGroq
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=LLM_POOL_SIZE, max_keepalive_connections=LLM_POOL_SIZE),
+            timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        )
+        return AsyncGroq(api_key=self.api_key, http_client=http_client, max_retries=LLM_CONNECT_RETRIES)
+
+
+class TogetherProvider(ChatCompletionsProvider):
+    name = "together"
+    label = "Together AI"
+    default_model = TOGETHER_MODEL
+
+    def _make_client(self):
+        import together
+        return together.Together(api_key=self.api_key, timeout=LLM_READ_TIMEOUT, max_retries=LLM_CONNECT_RETRIES)
+
+    def _make_async_client(self):
+        import together
+        return together.AsyncTogether(api_key=self.api_key, timeout=LLM_READ_TIMEOUT,
+                                      max_retries=LLM_CONNECT_RETRIES)
+
+
+LLM_PROVIDERS = {
+    "ollama": OllamaProvider,
+    "groq": GroqProvider,
+    "together": TogetherProvider,
+}
+DEFAULT_API_KEYS = {
+    "groq": GROQ_API_KEY,
+    "together": TOGETHER_API_KEY,
+}
+
+
+def default_provider_name() -> str:
+    """Fournisseur choisi par LLM_PROVIDER, si sa clé d'API est configurée ; Ollama sinon."""
+    if LLM_PROVIDER in DEFAULT_API_KEYS and DEFAULT_API_KEYS[LLM_PROVIDER]:
+        return LLM_PROVIDER
+    return "ollama"
+
+
+class LLMRegistry:
+    """Une instance de fournisseur par (nom, clé d'API), créée au premier usage."""
+
+    def __init__(self):
+        self._providers = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str = None, api_key: str = None) -> LLMProvider:
+        name = (name or default_provider_name()).lower()
+        if name not in LLM_PROVIDERS:
+            raise ValueError(f"Fournisseur LLM inconnu : {name} (valeurs possibles : {', '.join(LLM_PROVIDERS)})")
+        key = (name, api_key or DEFAULT_API_KEYS.get(name))
+        provider = self._providers.get(key)
+        if provider is None:
+            with self._lock:
+                provider = self._providers.get(key)
+                if provider is None:
+                    provider = self._providers[key] = LLM_PROVIDERS[name](api_key=key[1])
+        return provider
+
+    def complete(self, prompt: str, provider: str = None, **options) -> str:
+        return self.get(provider).complete(prompt, **options)
+
+    async def acomplete(self, prompt: str, provider: str = None, **options) -> str:
+        return await self.get(provider).acomplete(prompt, **options)
+
+    def stream(self, prompt: str, provider: str = None, **options):
+        return self.get(provider).stream(prompt, **options)
+
+    def stats(self) -> dict:
+        return {"default_provider": default_provider_name(),
+                "providers": [provider.stats() for provider in list(self._providers.values())]}
+
+    def close(self):
+        for provider in list(self._providers.values()):
+            provider.close()
+
+    async def aclose(self):
+        for provider in list(self._providers.values()):
+            await provider.aclose()
+            provider.close()
+
+
+# Registre unique du processus
+llm_providers = LLMRegistry()
@@ -0,0 +1,372 @@
+"""
+Routage des appels LLM entre fournisseurs (utils/llm_providers.py) : requêtes de couverture et repli.
+
+call_llm n'utilisait qu'un fournisseur, choisi par LLM_PROVIDER : un fournisseur lent bloquait le
+tour, et une erreur revenait comme texte de réponse (« [Erreur lors de l'appel à Groq ...] »), que
+parse_llm_response analysait ensuite comme une vraie réponse. Le routeur :
+- suit la latence de chaque fournisseur sur ses LLM_ROUTER_WINDOW derniers appels réussis (p50, p95) ;
+- envoie le prompt au fournisseur principal puis, sans réponse passé le budget de latence, une
+  requête de couverture (hedge) au fournisseur suivant : la première réponse l'emporte ;
+- passe au fournisseur suivant en cas d'erreur (repli), sauf si une requête de couverture est
+  encore en cours : elle tient alors lieu de repli ;
+- lève LLMError quand aucun fournisseur n'a répondu : jamais de message d'erreur en guise de réponse.
+
+Ordre : LLM_ROUTER_PROVIDERS (ex. « groq,together,ollama ») ou, à défaut, le fournisseur de
+LLM_PROVIDER, les autres fournisseurs dont la clé d'API est configurée, puis Ollama. Le premier est
+le principal ; les suivants sont classés par p50. Budget de couverture : p95 du principal dès
+LLM_ROUTER_MIN_SAMPLES mesures, LLM_HEDGE_AFTER_MS avant (0 : pas de couverture, repli seulement).
+En flux, le budget porte sur le délai du premier morceau, et le repli n'est possible qu'avant lui.
+
+Les appels synchrones (complete, stream) s'exécutent dans un pool de LLM_ROUTER_THREADS threads. Une
+requête perdante ne peut pas être interrompue : elle garde son thread jusqu'à la réponse du
+fournisseur ou son délai de lecture (LLM_READ_TIMEOUT). Chaque tour du chatbot occupe un thread
+du threadpool de Starlette (40 par défaut, anyio) et au plus deux threads du routeur en même temps
+(principal et couverture), d'où le défaut de 80. Quand tous les threads sont occupés, la couverture
+n'est pas envoyée (elle attendrait dans la file derrière d'autres appels) : `hedges_skipped` ; les
+appels principaux ou de repli mis en file sont comptés dans `queued`, les perdants laissés en
+arrière-plan dans `abandoned` (voir stats et /health/llm).
+"""
+
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from utils.llm_providers import DEFAULT_API_KEYS, LLM_PROVIDERS, default_provider_name, llm_providers
+
+LLM_ROUTER_PROVIDERS = [p.strip().lower() for p in os.environ.get("LLM_ROUTER_PROVIDERS", "").split(",") if p.strip()]
+LLM_HEDGE_AFTER_MS = float(os.environ.get("LLM_HEDGE_AFTER_MS", "8000"))
+LLM_ROUTER_WINDOW = int(os.environ.get("LLM_ROUTER_WINDOW", "200"))
+LLM_ROUTER_MIN_SAMPLES = int(os.environ.get("LLM_ROUTER_MIN_SAMPLES", "20"))
+# Threads des appels synchrones : deux par thread du threadpool de Starlette (voir plus haut)
+LLM_ROUTER_THREADS = int(os.environ.get("LLM_ROUTER_THREADS", "80"))
+
+
+class LLMError(Exception):
+    """Aucun fournisseur n'a produit de réponse. `attempts` : [{"provider", "error"}] dans l'ordre des échecs."""
+
+    def __init__(self, message: str, attempts: list = None):
+        super().__init__(message)
+        self.attempts = attempts or []
+
+    def to_dict(self) -> dict:
+        return {"error": str(self), "attempts": self.attempts}
+
+
+class RollingLatency:
+    """Latences (ms) des `size` derniers appels réussis."""
+
+    def __init__(self, size: int = LLM_ROUTER_WINDOW):
+        self._values = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def observe(self, value_ms: float):
+        with self._lock:
+            self._values.append(value_ms)
+
+    def __len__(self):
+        return len(self._values)
+
+    def percentile(self, q: float):
+        with self._lock:
+            values = sorted(self._values)
+        if not values:
+            return None
+        return values[min(int(len(values) * q), len(values) - 1)]
+
+    def snapshot(self) -> dict:
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {"samples": len(self), "p50_ms": round(p50, 1) if p50 is not None else None,
+                "p95_ms": round(p95, 1) if p95 is not None else None}
+
+
+def default_provider_order() -> list:
+    names = LLM_ROUTER_PROVIDERS or ([default_provider_name()]
+                                    + [name for name, key in DEFAULT_API_KEYS.items() if key] + ["ollama"])
+    unknown = [name for name in names if name not in LLM_PROVIDERS]
+    if unknown:
+        raise ValueError(f"Fournisseur(s) LLM inconnu(s) : {', '.join(unknown)} (valeurs possibles : {', '.join(LLM_PROVIDERS)})")
+    return list(dict.fromkeys(names))
+
+
+class LLMRouter:
+    """complete / acomplete / stream sur plusieurs fournisseurs, avec couverture et repli."""
+
+    def __init__(self, registry=llm_providers, providers: list = None, hedge_after_ms: float = LLM_HEDGE_AFTER_MS,
+                 min_samples: int = LLM_ROUTER_MIN_SAMPLES, threads: int = LLM_ROUTER_THREADS):
+        self.registry = registry
+        self.providers = providers  # None : ordre par défaut (default_provider_order)
+        self.hedge_after_ms = hedge_after_ms
+        self.min_samples = min_samples
+        self.threads = threads
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="llm-router")
+        self._lock = threading.Lock()
+        self._in_flight = 0  # tâches soumises au pool et non terminées
+        self._latency = {}  # (fournisseur, "complete" ou "first_chunk") -> RollingLatency
+        self._counters = {"calls": 0, "hedged": 0, "hedge_wins": 0, "hedges_skipped": 0, "fallbacks": 0,
+                          "failures": 0, "queued": 0, "abandoned": 0}
+        self._wins = Counter()
+
+    # --- Latences et choix des fournisseurs ---
+
+    def _window(self, name: str, kind: str) -> RollingLatency:
+        with self._lock:
+            return self._latency.setdefault((name, kind), RollingLatency())
+
+    def order(self, kind: str = "complete") -> list:
+        """Fournisseur principal, puis les fournisseurs de secours du plus rapide (p50) au plus lent."""
+        primary, *backups = list(self.providers or default_provider_order())
+        p50 = {name: self._window(name, kind).percentile(0.5) for name in backups}
+        return [primary] + sorted(backups, key=lambda name: float("inf") if p50[name] is None else p50[name])
+
+    def hedge_budget_ms(self, name: str, kind: str = "complete"):
+        """Délai avant la requête de couverture (None : pas de couverture)."""
+        if self.hedge_after_ms <= 0:
+            return None
+        window = self._window(name, kind)
+        return window.percentile(0.95) if len(window) >= self.min_samples else self.hedge_after_ms
+
+    def _count(self, counter: str, value: int = 1):
+        with self._lock:
+            self._counters[counter] += value
+
+    # --- Pool de threads ---
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            if self._in_flight >= self.threads:
+                self._counters["queued"] += 1
+            self._in_flight += 1
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _saturated(self) -> bool:
+        with self._lock:
+            return self._in_flight >= self.threads
+
+    def _hedge(self, launch) -> bool:
+        """Lance la requête de couverture, sauf si le pool est saturé. Retourne True si elle est partie."""
+        if self._saturated():
+            self._count("hedges_skipped")
+            return False
+        self._count("hedged")
+        launch()
+        return True
+
+    def _won(self, name: str, primary: str, hedged: bool):
+        with self._lock:
+            self._wins[name] += 1
+            if hedged and name != primary:
+                self._counters["hedge_wins"] += 1
+
+    def _failure(self, name: str, error: Exception) -> dict:
+        logging.warning(f"Appel LLM en échec ({name}): {type(error).__name__}: {error}")
+        return {"provider": name, "error": f"{type(error).__name__}: {error}"}
+
+    def _exhausted(self, attempts: list) -> LLMError:
+        self._count("failures")
+        tried = ", ".join(attempt["provider"] for attempt in attempts)
+        return LLMError(f"Aucun fournisseur LLM n'a répondu (essayés : {tried})", attempts)
+
+    def _first_success(self, done, pending: dict, attempts: list):
+        """(fournisseur, texte) du premier appel réussi parmi `done`, sinon None ; les échecs vont dans `attempts`."""
+        winner = None
+        for future in done:
+            name = pending.pop(future)
+            error = future.exception()
+            if error is not None:
+                attempts.append(self._failure(name, error))
+            elif winner is None:
+                winner = (name, future.result())
+        return winner
+
+    # --- Appels ---
+
+    def _timed_complete(self, name: str, prompt: str, options: dict) -> str:
+        started = time.perf_counter()
+        text = self.registry.get(name).complete(prompt, **options)
+        self._window(name, "complete").observe((time.perf_counter() - started) * 1000)
+        return text
+
+    async def _timed_acomplete(self, name: str, prompt: str, options: dict) -> str:
+        started = time.perf_counter()
+        text = await self.registry.get(name).acomplete(prompt, **options)
+        self._window(name, "complete").observe((time.perf_counter() - started) * 1000)
+        return text
+
+    def complete(self, prompt: str, **options) -> str:
+        self._count("calls")
+        names = self.order("complete")
+        primary = names[0]
+        budget = self.hedge_budget_ms(primary, "complete")
+        pending, attempts, hedged, hedge_tried = {}, [], False, False
+
+        def launch():
+            name = names.pop(0)
+            pending[self._submit(self._timed_complete, name, prompt, options)] = name
+
+        launch()
+        while pending:
+            timeout = budget / 1000 if budget is not None and not hedge_tried and names else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # Principal trop lent : requête de couverture, la première réponse l'emporte
+                hedge_tried = True
+                hedged = self._hedge(launch)
+                continue
+            winner = self._first_success(done, pending, attempts)
+            if winner is not None:
+                # Les requêtes encore en cours se terminent en arrière-plan, leur réponse est ignorée
+                self._won(winner[0], primary, hedged)
+                if pending:
+                    self._count("abandoned", len(pending))
+                return winner[1]
+            if names and not pending:
+                # Repli seulement si plus rien n'est en cours : une couverture en vol tient lieu de repli
+                self._count("fallbacks")
+                launch()
+        raise self._exhausted(attempts)
+
+    async def acomplete(self, prompt: str, **options) -> str:
+        self._count("calls")
+        names = self.order("complete")
+        primary = names[0]
+        budget = self.hedge_budget_ms(primary, "complete")
+        pending, attempts, hedged = {}, [], False
+
+        def launch():
+            name = names.pop(0)
+            pending[asyncio.ensure_future(self._timed_acomplete(name, prompt, options))] = name
+
+        launch()
+        try:
+            while pending:
+                timeout = budget / 1000 if budget is not None and not hedged and names else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    self._count("hedged")
+                    launch()
+                    continue
+                winner = self._first_success(done, pending, attempts)
+                if winner is not None:
+                    self._won(winner[0], primary, hedged)
+                    return winner[1]
+                if names and not pending:
+                    self._count("fallbacks")
+                    launch()
+            raise self._exhausted(attempts)
+        finally:
+            # En asynchrone, les requêtes perdantes sont réellement annulées
+            for task in pending:
+                task.cancel()
+
+    def _pump(self, name: str, prompt: str, options: dict, events: queue.Queue, cancelled: threading.Event):
+        """Lit le flux d'un fournisseur dans un thread et pousse (fournisseur, type, contenu) dans `events`."""
+        started = time.perf_counter()
+        stream = self.registry.get(name).stream(prompt, **options)
+        first = True
+        try:
+            for chunk in stream:
+                if cancelled.is_set():
+                    break
+                if first:
+                    self._window(name, "first_chunk").observe((time.perf_counter() - started) * 1000)
+                    first = False
+                events.put((name, "chunk", chunk))
+            else:
+                if first:
+                    # Flux terminé sans aucun texte : un échec du fournisseur, pas une réponse (vide) gagnante
+                    raise ValueError("Flux terminé sans réponse")
+                events.put((name, "end", None))
+        except Exception as e:
+            events.put((name, "error", e))
+        finally:
+            stream.close()
+
+    def stream(self, prompt: str, **options):
+        """Générateur des morceaux de texte du premier fournisseur à en produire un. Lève LLMError."""
+        self._count("calls")
+        names = self.order("first_chunk")
+        primary = names[0]
+        budget = self.hedge_budget_ms(primary, "first_chunk")
+        events = queue.Queue()
+        cancels, running, attempts = {}, set(), []
+        hedged, hedge_tried, winner = False, False, None
+
+        def launch():
+            name = names.pop(0)
+            cancels[name] = threading.Event()
+            running.add(name)
+            self._submit(self._pump, name, prompt, options, events, cancels[name])
+
+        launch()
+        try:
+            while True:
+                timeout = budget / 1000 if winner is None and budget is not None and not hedge_tried and names else None
+                try:
+                    name, kind, payload = events.get(timeout=timeout)
+                except queue.Empty:
+                    hedge_tried = True
+                    hedged = self._hedge(launch)
+                    continue
+                if winner is not None and name != winner:
+                    continue
+                if kind == "error":
+                    running.discard(name)
+                    attempts.append(self._failure(name, payload))
+                    if winner is not None:
+                        # Une partie de la réponse est déjà transmise : pas de repli possible
+                        raise LLMError(f"Flux LLM interrompu ({name})", attempts)
+                    if running:
+                        # Une couverture est encore en vol : elle tient lieu de repli
+                        continue
+                    if not names:
+                        raise self._exhausted(attempts)
+                    self._count("fallbacks")
+                    launch()
+                    continue
+                if winner is None:
+                    winner = name
+                    self._won(name, primary, hedged)
+                    for other, cancelled in cancels.items():
+                        if other != name:
+                            cancelled.set()
+                if kind == "end":
+                    return
+                yield payload
+        finally:
+            # Fin normale, erreur ou flux abandonné par l'appelant : les lectures en cours s'arrêtent
+            for cancelled in cancels.values():
+                cancelled.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            wins = dict(self._wins)
+            latency = {}
+            for (name, kind), window in self._latency.items():
+                latency.setdefault(name, {})[kind] = window.snapshot()
+            in_flight = self._in_flight
+        try:
+            order = self.order("complete")
+        except ValueError as e:
+            order = str(e)
+        return {**counters, "order": order, "hedge_after_ms": self.hedge_after_ms, "wins": wins, "latency": latency,
+                "threads": self.threads, "in_flight": in_flight}
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+# Routeur unique du processus
+llm_router = LLMRouter()
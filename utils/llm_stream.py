@@ -0,0 +1,114 @@
+"""
+Analyse incrémentale de la réponse structurée du LLM (voir build_prompt dans search_vector_llm.py).
+
+La réponse arrive morceau par morceau (streaming). Les champs d'en-tête (`INTENTION`, `TITRE`,
+`DESCRIPTION`, ...) sont émis dès que la ligne du champ suivant commence ; le texte de `REPONSE`
+est émis au fil de l'eau. Une ligne qui pourrait être le début d'un nouveau champ (`**TITRE**:`)
+est retenue jusqu'à ce qu'on sache si c'en est un, pour ne jamais afficher de clé à l'utilisateur.
+
+L'analyse de référence reste parse_llm_response (routers/ai.py) appliquée au texte complet, en fin
+de flux : cet analyseur sert uniquement à afficher la réponse plus tôt.
+"""
+
+import json
+import re
+
+RESPONSE_KEY = "REPONSE"
+KEY_LINE_RE = re.compile(r"^\s*\**([A-Z_]+)\**:\s*(.*)$", re.DOTALL)
+# Même délimitation de fin de champ que parse_llm_response : un retour à la ligne suivi d'une clé
+NEXT_KEY_RE = re.compile(r"\n\**[A-Z_]+\**:")
+# Fin de texte pouvant encore devenir une ligne de champ (ex. « **TIT »)
+KEY_PREFIX_RE = re.compile(r"^\**[A-Z_]*\**$")
+
+
+class IncrementalResponseParser:
+    """`feed(texte)` et `close()` retournent des événements : ("field", clé, valeur) ou ("token", texte)."""
+
+    def __init__(self):
+        self.fields = {}
+        self._buffer = ""
+        self._key = None  # champ d'en-tête en cours et lignes de sa valeur
+        self._value = []
+        self._in_response = False
+        self._response_started = False
+
+    def feed(self, text: str) -> list:
+        self._buffer += text
+        return self._consume(final=False)
+
+    def close(self) -> list:
+        return self._consume(final=True)
+
+    def _consume(self, final: bool) -> list:
+        events = []
+        while True:
+            if self._in_response:
+                events.extend(self._consume_response(final))
+                if self._in_response:
+                    return events
+            else:
+                events.extend(self._consume_header(final))
+                if not self._in_response:
+                    return events
+
+    def _end_field(self) -> list:
+        if self._key is None:
+            return []
+        value = "\n".join(self._value).strip() or "inconnue"
+        self.fields[self._key] = value
+        key, self._key, self._value = self._key, None, []
+        return [("field", key, value)]
+
+    def _consume_header(self, final: bool) -> list:
+        events = []
+        while True:
+            line, sep, rest = self._buffer.partition("\n")
+            match = KEY_LINE_RE.match(line)
+            if not sep:
+                if final and not line:
+                    return events + self._end_field()
+                # Ligne incomplète : seule la ligne REPONSE est traitée avant son retour à la ligne
+                if not final and not (match and match.group(1) == RESPONSE_KEY):
+                    return events
+            self._buffer = rest
+            if match:
+                events.extend(self._end_field())
+                if match.group(1) == RESPONSE_KEY:
+                    self._in_response, self._response_started = True, False
+                    self._buffer = match.group(2) + sep + rest
+                    return events
+                self._key, self._value = match.group(1), [match.group(2)]
+            elif self._key is not None:
+                self._value.append(line)  # suite d'une valeur sur plusieurs lignes
+
+    def _consume_response(self, final: bool) -> list:
+        if not self._response_started:
+            self._buffer = self._buffer.lstrip()
+            if not self._buffer and not final:
+                return []
+            self._response_started = True
+        next_key = NEXT_KEY_RE.search(self._buffer)
+        if next_key:
+            # Un champ suit la réponse : elle est terminée, la suite est analysée comme l'en-tête
+            emit, self._buffer = self._buffer[:next_key.start()].rstrip(), self._buffer[next_key.start() + 1:]
+            self._in_response = False
+        elif final:
+            emit, self._buffer = self._buffer.rstrip(), ""
+            self._in_response = False
+        else:
+            newline = self._buffer.rfind("\n")
+            if newline >= 0 and KEY_PREFIX_RE.match(self._buffer[newline + 1:]):
+                emit, self._buffer = self._buffer[:newline], self._buffer[newline:]  # début de ligne retenu
+            else:
+                emit, self._buffer = self._buffer, ""
+        if emit:
+            self.fields[RESPONSE_KEY] = self.fields.get(RESPONSE_KEY, "") + emit
+        return [("token", emit)] if emit else []
+
+
+def encode_event(event: dict, fmt: str) -> str:
+    """Sérialise un événement du flux : une ligne JSON (ndjson) ou un message Server-Sent Events (sse)."""
+    data = json.dumps(event, ensure_ascii=False, default=str)
+    if fmt == "sse":
+        return f"event: {event['event']}\ndata: {data}\n\n"
+    return data + "\n"
@@ -0,0 +1,72 @@
+"""
+Backend d'embedding ONNX Runtime (int8) pour all-MiniLM-L6-v2, sans torch.
+
+Reproduit le pipeline SentenceTransformer du modèle (Transformer -> moyenne des tokens
+pondérée par le masque d'attention -> normalisation L2). Les vecteurs sont donc compatibles
+avec ceux déjà stockés dans la collection Chroma `cms_docs`.
+
+Le répertoire EMBEDDING_ONNX_DIR (model_int8.onnx + tokenizer.json) est produit par
+`python bench_embeddings.py export`. Dépendances optionnelles : onnxruntime, tokenizers, numpy.
+"""
+
+import os
+
+script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EMBEDDING_ONNX_DIR = os.environ.get("EMBEDDING_ONNX_DIR", os.path.join(script_dir, "onnx_models", "all-MiniLM-L6-v2"))
+EMBEDDING_ONNX_FILE = os.environ.get("EMBEDDING_ONNX_FILE", "model_int8.onnx")
+EMBEDDING_ONNX_THREADS = int(os.environ.get("EMBEDDING_ONNX_THREADS", "0"))  # 0 : choix d'ONNX Runtime
+# Longueur maximale de séquence de all-MiniLM-L6-v2 dans sentence-transformers
+EMBEDDING_MAX_SEQ_LENGTH = 256
+
+
+class OnnxSentenceEmbedder:
+    """Même interface `encode` que SentenceTransformer (sous-ensemble utilisé par le projet)."""
+
+    def __init__(self, model_dir: str = EMBEDDING_ONNX_DIR, model_file: str = EMBEDDING_ONNX_FILE,
+                 threads: int = EMBEDDING_ONNX_THREADS, max_seq_length: int = EMBEDDING_MAX_SEQ_LENGTH):
+        try:
+            import numpy as np
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise RuntimeError(
+                "Le backend d'embedding 'onnx' nécessite onnxruntime, tokenizers et numpy "
+                f"(pip install onnxruntime tokenizers) : {e}"
+            ) from e
+        model_path = os.path.join(model_dir, model_file)
+        if not os.path.exists(model_path):
+            raise RuntimeError(f"Modèle ONNX introuvable ({model_path}) : lancez `python bench_embeddings.py export`.")
+
+        self._np = np
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_seq_length)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def _encode_batch(self, texts: list):
+        np = self._np
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        token_embeddings = self.session.run(None, feeds)[0]
+        # Moyenne des embeddings de tokens pondérée par le masque, puis normalisation L2
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs):
+        """Retourne un tableau numpy (un vecteur pour une chaîne, une matrice pour une liste)."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return self._np.zeros((0, 0), dtype=self._np.float32)
+        batches = [self._encode_batch(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+        vectors = self._np.vstack(batches)
+        return vectors[0] if single else vectors
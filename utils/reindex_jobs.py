@@ -0,0 +1,150 @@
+"""
+Tâches de ré-indexation exécutées dans le processus de l'application.
+
+`POST /kb/reindex` lançait index_docs_chroma.py par `subprocess.run` depuis un handler async :
+la boucle d'événements restait bloquée pendant toute l'indexation, et le script rechargeait le
+modèle dans un nouvel interpréteur. Le gestionnaire ci-dessous exécute `utils.indexing.reindex`
+dans un thread d'arrière-plan, avec le modèle, la collection Chroma et MongoDB déjà ouverts par
+la pile de recherche (utils/retrieval.py), et retourne immédiatement l'identifiant de la tâche.
+
+Une seule tâche s'exécute à la fois : une demande reçue pendant qu'une tâche est en cours
+retourne cette tâche (déduplication). L'avancement, l'estimation du temps restant et
+l'annulation sont exposés par tâche ; les REINDEX_JOB_HISTORY dernières tâches sont conservées.
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from utils.indexing import reindex
+from utils.retrieval import retrieval_stack
+
+REINDEX_JOB_HISTORY = int(os.environ.get("REINDEX_JOB_HISTORY", "20"))
+
+ACTIVE_STATES = ("queued", "running", "cancelling")
+
+
+class ReindexCancelled(Exception):
+    """Levée par le rappel d'avancement lorsque l'annulation d'une tâche est demandée."""
+
+
+class ReindexJob:
+    def __init__(self, full: bool):
+        self.id = uuid.uuid4().hex
+        self.full = full
+        self.state = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.progress = {}
+        self.summary = None
+        self.error = None
+        self.cancel_requested = threading.Event()
+
+    def on_progress(self, state: dict):
+        self.progress = state
+        if self.cancel_requested.is_set() and not state.get("done"):
+            raise ReindexCancelled()
+
+    def eta_seconds(self):
+        """Temps restant estimé au rythme observé depuis le début (None tant qu'il n'est pas estimable)."""
+        processed, total = self.progress.get("processed", 0), self.progress.get("total")
+        if self.state != "running" or not processed or not total or not self.started_at:
+            return None
+        rate = processed / max(time.time() - self.started_at, 1e-9)
+        return round(max(total - processed, 0) / rate, 1)
+
+    def to_dict(self) -> dict:
+        processed, total = self.progress.get("processed", 0), self.progress.get("total")
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "state": self.state,
+            "full": self.full,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round(end - self.started_at, 1) if self.started_at else None,
+            "progress": {
+                "processed": processed,
+                "total": total,
+                "percent": round(min(processed / total, 1.0) * 100, 1) if total else None,
+                **{k: v for k, v in self.progress.items() if k not in ("processed", "total", "done")},
+            },
+            "eta_seconds": self.eta_seconds(),
+            "summary": self.summary,
+            "error": self.error,
+        }
+
+
+class ReindexJobManager:
+    """Lance les ré-indexations dans un thread d'arrière-plan, une à la fois."""
+
+    def __init__(self, stack=retrieval_stack, history: int = REINDEX_JOB_HISTORY):
+        self.stack = stack
+        self.history = history
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _active_job(self):
+        return next((job for job in reversed(self._jobs.values()) if job.state in ACTIVE_STATES), None)
+
+    def start(self, full: bool = False):
+        """Retourne (tâche, créée) : la tâche en cours s'il y en a une, sinon une nouvelle tâche."""
+        with self._lock:
+            active = self._active_job()
+            if active is not None:
+                return active, False
+            job = ReindexJob(full)
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.history:
+                oldest = next(iter(self._jobs.values()))
+                if oldest.state in ACTIVE_STATES:
+                    break
+                self._jobs.popitem(last=False)
+        threading.Thread(target=self._run, args=(job,), name=f"reindex-{job.id[:8]}", daemon=True).start()
+        return job, True
+
+    def _run(self, job: ReindexJob):
+        job.state, job.started_at = "running", time.time()
+        logging.info(f"Ré-indexation {job.id} démarrée (complète: {job.full}).")
+        try:
+            job.summary = reindex(
+                self.stack.doc_collection, self.stack.chroma_collection, self.stack.persist_dir,
+                full=job.full, lexical=self.stack.lexical_index, progress=job.on_progress, log=logging.info,
+            )
+            job.state = "succeeded"
+        except ReindexCancelled:
+            job.state = "cancelled"
+            logging.info(f"Ré-indexation {job.id} annulée.")
+        except Exception as e:
+            job.state, job.error = "failed", str(e)
+            logging.error(f"Ré-indexation {job.id} échouée: {e}")
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id: str):
+        return self._jobs.get(job_id)
+
+    def list_jobs(self) -> list:
+        return [job.to_dict() for job in reversed(list(self._jobs.values()))]
+
+    def cancel(self, job_id: str):
+        """Demande l'annulation de la tâche ; retourne None si elle est inconnue, False si elle est terminée."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        with self._lock:
+            if job.state not in ACTIVE_STATES:
+                return False
+            job.cancel_requested.set()
+            if job.state == "running":
+                job.state = "cancelling"
+        return True
+
+
+# Gestionnaire unique du processus
+reindex_jobs = ReindexJobManager()
@@ -0,0 +1,291 @@
+"""
+Recherche vectorielle : résultats ChromaDB -> documents.
+
+L'index contient des passages (voir utils/chunking.py) : chaque entrée porte l'ID de son document
+parent, son titre et sa catégorie en métadonnées, et le texte du passage. Les meilleurs passages
+sont regroupés par document, sans passer par MongoDB, et ce sont eux qui vont dans le prompt.
+
+Les entrées d'un index construit avant le découpage (un vecteur par document) sont résolues en
+une seule requête MongoDB (`$in`), dans l'ordre du classement, en ne lisant que `title`,
+`category` et les CONTEXT_CONTENT_CHARS premiers caractères de `content` — ou, avec
+RETRIEVAL_FROM_METADATA=1, lues dans leurs métadonnées Chroma lorsqu'elles y figurent.
+
+`query_index` passe par les caches d'embeddings et de top-k de utils/embedding_cache.py.
+
+Trois modes de recherche (RETRIEVAL_MODE par défaut, modifiable à chaque requête) :
+  - vector  : recherche vectorielle seule (Chroma) ;
+  - lexical : recherche plein texte BM25 seule (utils/lexical_index.py) ;
+  - hybrid  : les deux en parallèle, classements fusionnés par Reciprocal Rank Fusion
+              (score d'un passage = somme sur les classements de 1 / (RRF_K + rang)).
+
+`RetrievalStack` regroupe le modèle d'embedding, la collection Chroma et la collection MongoDB
+derrière une initialisation paresseuse : importer ce module (ou routers/ai.py) ne charge rien.
+`warm_up` les initialise explicitement ; l'application l'appelle au démarrage (RETRIEVAL_WARMUP)
+et expose l'état obtenu comme sonde de disponibilité (readiness), distincte de la sonde de vie.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from utils.embedding_cache import normalize_query, query_embedding_cache, read_index_version, topk_cache
+from utils.embedding_service import embedding_service
+from utils.lexical_index import LexicalIndex, lexical_index_path
+
+# Nombre de caractères du contenu utilisés dans le prompt (voir build_prompt)
+CONTEXT_CONTENT_CHARS = int(os.environ.get("CONTEXT_CONTENT_CHARS", "600"))
+RETRIEVAL_FROM_METADATA = os.environ.get("RETRIEVAL_FROM_METADATA", "0") == "1"
+# Préchauffage au démarrage de l'application : background (défaut), blocking ou off
+RETRIEVAL_WARMUP = os.environ.get("RETRIEVAL_WARMUP", "background").lower()
+# Délai minimal (en secondes) entre deux nouvelles tentatives de préchauffage après un échec
+RETRIEVAL_WARMUP_RETRY_SECONDS = int(os.environ.get("RETRIEVAL_WARMUP_RETRY_SECONDS", "30"))
+CHROMA_PATH = os.environ.get(
+    "CHROMA_PATH", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "chroma_data")
+)
+CHROMA_COLLECTION = "cms_docs"
+# Nombre de passages interrogés par document attendu, et passages gardés par document
+CHUNK_OVERFETCH = int(os.environ.get("CHUNK_OVERFETCH", "4"))
+PASSAGES_PER_DOCUMENT = int(os.environ.get("PASSAGES_PER_DOCUMENT", "2"))
+PASSAGE_SEPARATOR = "\n[...]\n"
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid")
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "vector").lower()
+RRF_K = int(os.environ.get("RRF_K", "60"))
+
+
+def _mongo_id(doc_id):
+    try:
+        return ObjectId(doc_id)
+    except (InvalidId, TypeError):
+        return doc_id  # IDs non ObjectId
+
+
+def hydrate_documents(doc_collection, ids: list) -> list:
+    """
+    Documents MongoDB correspondant à `ids` en une seule requête, dans l'ordre de `ids`.
+    Seuls `title`, `category` et le début de `content` sont lus ; les IDs absents sont ignorés.
+    """
+    if not ids:
+        return []
+    pipeline = [
+        {"$match": {"_id": {"$in": [_mongo_id(doc_id) for doc_id in ids]}}},
+        {"$project": {
+            "title": 1,
+            "category": 1,
+            "content": {"$substrCP": [{"$ifNull": ["$content", ""]}, 0, CONTEXT_CONTENT_CHARS]},
+        }},
+    ]
+    by_id = {str(doc["_id"]): doc for doc in doc_collection.aggregate(pipeline)}
+    return [by_id[str(doc_id)] for doc_id in ids if str(doc_id) in by_id]
+
+
+def query_index(collection, encoder, question, n_results: int, persist_dir: str) -> dict:
+    """
+    Résultat Chroma (`ids`, `metadatas`, `documents`, c.-à-d. les passages, et `distances`) des
+    `n_results` entrées les plus proches de `question`.
+    `encoder` calcule l'embedding d'un texte (liste de floats), ex. `embedding_service.encode`.
+    L'embedding et le résultat sont mis en cache ; ce dernier jusqu'à la prochaine ré-indexation.
+    """
+    # Résultats propres à la collection : plusieurs piles (répertoires, collections) partagent le cache
+    scope = (os.path.abspath(persist_dir), collection.name)
+    version = read_index_version(persist_dir, collection.name)
+    key = (normalize_query(question), n_results)
+    results = topk_cache.get(scope, key, version)
+    if results is None:
+        raw = collection.query(
+            query_embeddings=[query_embedding_cache.encode(encoder, question)],
+            n_results=n_results,
+            include=["metadatas", "documents", "distances"]
+        )
+        results = {"ids": raw["ids"], "metadatas": raw.get("metadatas"), "documents": raw.get("documents"),
+                   "distances": raw.get("distances")}
+        topk_cache.put(scope, key, version, results)
+    return results
+
+
+def reciprocal_rank_fusion(results_list: list, n_results: int = None, k: int = RRF_K) -> dict:
+    """
+    Fusionne des résultats au format Chroma (première requête de chacun) par Reciprocal Rank Fusion.
+    Retourne un résultat au même format, trié par score décroissant (à égalité, ordre d'apparition).
+    """
+    scores, entries = {}, {}
+    for results in results_list:
+        ids = results["ids"][0]
+        metadatas = (results.get("metadatas") or [[]])[0] or [None] * len(ids)
+        passages = (results.get("documents") or [[]])[0] or [None] * len(ids)
+        for rank, (hit_id, metadata, passage) in enumerate(zip(ids, metadatas, passages), start=1):
+            scores[hit_id] = scores.get(hit_id, 0.0) + 1.0 / (k + rank)
+            entries.setdefault(hit_id, (metadata, passage))
+    ranked = sorted(scores, key=scores.get, reverse=True)[:n_results]
+    return {
+        "ids": [ranked],
+        "metadatas": [[entries[hit_id][0] for hit_id in ranked]],
+        "documents": [[entries[hit_id][1] for hit_id in ranked]],
+    }
+
+
+def documents_from_results(results: dict, doc_collection, top_k: int = None,
+                           from_metadata: bool = RETRIEVAL_FROM_METADATA) -> list:
+    """
+    Documents (au plus `top_k`) de la première requête d'un résultat `query_index`, dans l'ordre
+    du classement. Les passages d'un même document sont regroupés sous son `parent_id` : le
+    document porte ses PASSAGES_PER_DOCUMENT meilleurs passages (`passages`) et `content` les réunit.
+    Les entrées indexées avant le découpage (document entier) sont hydratées depuis MongoDB.
+    Si le résultat porte des distances (recherche vectorielle), `distance` est celle du meilleur passage.
+    """
+    ids = results["ids"][0]
+    metadatas = (results.get("metadatas") or [[]])[0] or [None] * len(ids)
+    passages = (results.get("documents") or [[]])[0] or [None] * len(ids)
+    distances = (results.get("distances") or [[]])[0] or [None] * len(ids)
+    docs, order, missing, best_distance = {}, [], [], {}
+    for hit_id, metadata, passage, distance in zip(ids, metadatas, passages, distances):
+        metadata = metadata or {}
+        doc_id = metadata.get("parent_id") or hit_id
+        if doc_id not in docs and doc_id not in missing:
+            if top_k is not None and len(order) >= top_k:
+                continue
+            order.append(doc_id)
+            best_distance[doc_id] = distance
+            if metadata.get("parent_id"):
+                docs[doc_id] = {"_id": doc_id, "title": metadata.get("title", ""),
+                                "category": metadata.get("category", ""), "passages": []}
+            elif from_metadata and "title" in metadata and "content" in metadata:
+                docs[doc_id] = {"_id": doc_id, "title": metadata["title"],
+                                "category": metadata.get("category", ""), "content": metadata["content"]}
+            else:
+                missing.append(doc_id)
+        doc = docs.get(doc_id)
+        if doc is not None and "passages" in doc and len(doc["passages"]) < PASSAGES_PER_DOCUMENT:
+            doc["passages"].append(passage or "")
+    for doc in hydrate_documents(doc_collection, missing):
+        docs[str(doc["_id"])] = doc
+    for doc_id, doc in docs.items():
+        if "passages" in doc:
+            doc["content"] = PASSAGE_SEPARATOR.join(doc["passages"])
+        if best_distance.get(doc_id) is not None:
+            doc["distance"] = best_distance[doc_id]
+    return [docs[doc_id] for doc_id in order if doc_id in docs]
+
+
+def context_excerpt(doc: dict) -> str:
+    """Texte d'un document à placer dans le prompt : ses passages pertinents, sinon le début du contenu."""
+    if doc.get("passages"):
+        return doc.get("content", "")
+    return (doc.get("content", "") or "")[:CONTEXT_CONTENT_CHARS]
+
+
+class RetrievalStack:
+    """Modèle d'embedding, collection Chroma et documents MongoDB, initialisés au premier usage."""
+
+    def __init__(self, persist_dir: str = CHROMA_PATH, collection_name: str = CHROMA_COLLECTION,
+                 embeddings=embedding_service):
+        self.persist_dir = persist_dir
+        self.collection_name = collection_name
+        self.embeddings = embeddings
+        self._lock = threading.Lock()
+        self._chroma_collection = None
+        self.lexical_index = LexicalIndex(lexical_index_path(persist_dir))
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="retrieval")
+        self._warmup_thread = None
+        self._warmup_started_at = 0.0
+        self._status = {"state": "cold", "warmup_seconds": None, "components": {}, "error": None}
+
+    @property
+    def chroma_collection(self):
+        if self._chroma_collection is None:
+            with self._lock:
+                if self._chroma_collection is None:
+                    import chromadb  # Import différé : chromadb est long à charger
+                    client = chromadb.PersistentClient(path=self.persist_dir)
+                    self._chroma_collection = client.get_or_create_collection(name=self.collection_name)
+        return self._chroma_collection
+
+    @property
+    def doc_collection(self):
+        from database import get_mongo_db
+        return get_mongo_db()["documents"]
+
+    def search(self, question, top_k: int, mode: str = None) -> list:
+        """
+        Les `top_k` documents les plus proches de `question`, avec leurs meilleurs passages.
+        `mode` : vector, lexical ou hybrid (RETRIEVAL_MODE par défaut).
+        """
+        mode = (mode or RETRIEVAL_MODE).lower()
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Mode de recherche inconnu : {mode} (valeurs possibles : {', '.join(RETRIEVAL_MODES)})")
+        n_results = top_k * CHUNK_OVERFETCH
+        if mode == "vector":
+            results = self._vector_results(question, n_results)
+        elif mode == "lexical":
+            results = self.lexical_index.search(question, n_results)
+        else:
+            # Les deux recherches en parallèle : SQLite et Chroma/le modèle libèrent le GIL
+            lexical = self._executor.submit(self.lexical_index.search, question, n_results)
+            results = reciprocal_rank_fusion([self._vector_results(question, n_results), lexical.result()], n_results)
+        docs = documents_from_results(results, self.doc_collection, top_k)
+        if self._status["state"] != "ready":
+            # Sans préchauffage (RETRIEVAL_WARMUP=off) ou après un préchauffage échoué (MongoDB ou Chroma
+            # indisponible au démarrage), une recherche réussie rend la pile disponible
+            self._status.update(state="ready", error=None)
+        return docs
+
+    def _vector_results(self, question, n_results: int) -> dict:
+        return query_index(self.chroma_collection, self.embeddings.encode, question, n_results, self.persist_dir)
+
+    def similarity(self, distance: float) -> float:
+        """Similarité cosinus correspondant à une distance Chroma (vecteurs normalisés), selon l'espace de la collection."""
+        space = (self.chroma_collection.metadata or {}).get("hnsw:space", "l2")
+        # l2 : distance euclidienne au carré = 2 - 2 cos ; cosine et ip : 1 - cos
+        return 1 - distance / 2 if space == "l2" else 1 - distance
+
+    def warm_up(self) -> dict:
+        """Charge le modèle, ouvre Chroma, vérifie MongoDB et exécute un premier encodage."""
+        self._status.update(state="warming", error=None)
+        components = {}
+        started = time.perf_counter()
+        try:
+            for name, step in (
+                ("embedding_model", self.embeddings.load),
+                ("chroma", lambda: self.chroma_collection),
+                ("lexical_index", self.lexical_index.count),
+                ("mongodb", lambda: self.doc_collection.database.client.admin.command("ping")),
+                ("first_encode", lambda: self.embeddings.encode("préchauffage")),
+            ):
+                step_started = time.perf_counter()
+                step()
+                components[name] = round(time.perf_counter() - step_started, 3)
+        except Exception as e:
+            logging.error(f"Préchauffage de la recherche vectorielle échoué: {e}")
+            self._status.update(state="failed", components=components, error=str(e))
+            return self.status()
+        self._status.update(state="ready", components=components,
+                            warmup_seconds=round(time.perf_counter() - started, 3))
+        return self.status()
+
+    def start_warm_up(self):
+        """Lance `warm_up` dans un thread d'arrière-plan (le démarrage de l'application n'attend pas)."""
+        if self._warmup_thread and self._warmup_thread.is_alive():
+            return
+        self._warmup_started_at = time.monotonic()
+        self._warmup_thread = threading.Thread(target=self.warm_up, name="retrieval-warmup", daemon=True)
+        self._warmup_thread.start()
+
+    def retry_warm_up(self):
+        """Relance le préchauffage en arrière-plan après un échec (au plus toutes les RETRIEVAL_WARMUP_RETRY_SECONDS)."""
+        if self._status["state"] == "failed" and time.monotonic() - self._warmup_started_at >= RETRIEVAL_WARMUP_RETRY_SECONDS:
+            self.start_warm_up()
+
+    def is_ready(self) -> bool:
+        return self._status["state"] == "ready"
+
+    def status(self) -> dict:
+        return {**self._status, "components": dict(self._status["components"]),
+                "embedding_backend": getattr(self.embeddings, "backend", None), "default_mode": RETRIEVAL_MODE}
+
+
+# Pile de recherche de l'application (chroma_data à la racine du projet)
+retrieval_stack = RetrievalStack()
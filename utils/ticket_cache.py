@@ -0,0 +1,122 @@
+"""
+Cache LRU en mémoire des tickets GLPI et de leurs suivis, indexé par ID de ticket.
+
+Une entrée est servie directement pendant TICKET_CACHE_FRESH_SECONDS secondes. Passé ce délai,
+elle est revalidée : l'appelant relit seulement le `date_mod` du ticket dans GLPI et l'entrée
+est conservée s'il n'a pas changé. Toute écriture faite par l'application sur un ticket
+(ajout de suivi) invalide l'entrée. Le contrôle d'accès reste à la charge de l'appelant,
+pour chaque utilisateur, sur l'enregistrement renvoyé.
+
+Quand GLPI est indisponible (disjoncteur ouvert), `get_stale` sert l'entrée quel que soit son âge.
+"""
+
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+
+TICKET_CACHE_SIZE = int(os.environ.get("TICKET_CACHE_SIZE", "500"))
+TICKET_CACHE_FRESH_SECONDS = float(os.environ.get("TICKET_CACHE_FRESH_SECONDS", "15"))
+
+
+class TicketCache:
+    """Tickets et suivis GLPI récemment lus, revalidés par `date_mod`."""
+
+    def __init__(self, max_size: int = TICKET_CACHE_SIZE, fresh_seconds: float = TICKET_CACHE_FRESH_SECONDS):
+        self.max_size = max_size
+        self.fresh_seconds = fresh_seconds
+        self._entries = OrderedDict()  # ticket_id -> {"ticket", "related", "date_mod", "checked_at"}
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "revalidated": 0, "stale": 0, "misses": 0,
+                          "related_hits": 0, "related_misses": 0, "invalidations": 0, "served_stale": 0}
+
+    def get_ticket(self, ticket_id: int):
+        """
+        Retourne (ticket, doit_revalider). `ticket` vaut None si absent du cache ;
+        si `doit_revalider` est vrai, l'appelant doit confirmer le date_mod via `revalidate`.
+        """
+        with self._lock:
+            entry = self._entries.get(ticket_id)
+            if entry is None or entry["ticket"] is None:
+                self._counters["misses"] += 1
+                return None, False
+            self._entries.move_to_end(ticket_id)
+            if time.monotonic() - entry["checked_at"] <= self.fresh_seconds:
+                self._counters["hits"] += 1
+                return copy.deepcopy(entry["ticket"]), False
+            return copy.deepcopy(entry["ticket"]), True
+
+    def get_stale(self, ticket_id: int):
+        """Dernière version connue du ticket, sans revalidation (GLPI indisponible), ou None."""
+        with self._lock:
+            entry = self._entries.get(ticket_id)
+            if entry is None or entry["ticket"] is None:
+                return None
+            self._counters["served_stale"] += 1
+            return copy.deepcopy(entry["ticket"])
+
+    def revalidate(self, ticket_id: int, current_date_mod) -> bool:
+        """Confirme l'entrée si `date_mod` n'a pas changé ; sinon la supprime. Retourne vrai si elle reste valide."""
+        with self._lock:
+            entry = self._entries.get(ticket_id)
+            if entry is not None and current_date_mod and entry["date_mod"] == current_date_mod:
+                entry["checked_at"] = time.monotonic()
+                self._counters["revalidated"] += 1
+                return True
+            self._entries.pop(ticket_id, None)
+            self._counters["stale"] += 1
+            return False
+
+    def put_ticket(self, ticket_id: int, ticket: dict):
+        with self._lock:
+            previous = self._entries.get(ticket_id)
+            date_mod = ticket.get('date_mod')
+            related = previous["related"] if previous and previous["date_mod"] == date_mod else {}
+            self._entries[ticket_id] = {
+                "ticket": copy.deepcopy(ticket),
+                "related": related,
+                "date_mod": date_mod,
+                "checked_at": time.monotonic(),
+            }
+            self._entries.move_to_end(ticket_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_related(self, ticket_id: int, date_mod, kind: str):
+        """Sous-éléments `kind` ("followups", "items") en cache pour la version `date_mod` du ticket, ou None."""
+        with self._lock:
+            entry = self._entries.get(ticket_id)
+            if entry is None or entry["date_mod"] != date_mod or kind not in entry["related"]:
+                self._counters["related_misses"] += 1
+                return None
+            self._counters["related_hits"] += 1
+            return copy.deepcopy(entry["related"][kind])
+
+    def put_related(self, ticket_id: int, date_mod, kind: str, value: list):
+        with self._lock:
+            entry = self._entries.get(ticket_id)
+            if entry is not None and entry["date_mod"] == date_mod:
+                entry["related"][kind] = copy.deepcopy(value)
+
+    def invalidate(self, ticket_id: int):
+        with self._lock:
+            if self._entries.pop(ticket_id, None) is not None:
+                self._counters["invalidations"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+        served = counters["hits"] + counters["revalidated"]
+        lookups = served + counters["stale"] + counters["misses"]
+        related_lookups = counters["related_hits"] + counters["related_misses"]
+        return {
+            **counters,
+            "size": size,
+            "hit_rate": round(served / lookups, 3) if lookups else None,
+            "related_hit_rate": round(counters["related_hits"] / related_lookups, 3) if related_lookups else None,
+        }
+
+
+ticket_cache = TicketCache()
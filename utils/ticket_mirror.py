@@ -0,0 +1,485 @@
+"""
+Miroir local (SQLite) des tickets et suivis GLPI.
+
+Un thread d'arrière-plan interroge GLPI de manière incrémentale : les tickets sont lus
+triés par `date_mod` décroissant et la pagination s'arrête dès que l'on atteint des tickets
+déjà importés. Un bail en base (GlpiSyncLease) réserve la synchronisation à un seul processus
+quand l'API tourne avec plusieurs workers ; les tickets purgés dans GLPI sont retirés par une
+réconciliation périodique des IDs, et les écritures de l'application (création de ticket, suivi)
+rafraîchissent aussitôt le ticket concerné (`refresh_ticket`). L'email du demandeur, le statut et les dates sont stockés dans des colonnes
+indexées, ce qui permet aux listes, à l'analytique et aux relances de lire le miroir au lieu
+de télécharger tous les tickets à chaque appel, tant que la dernière synchronisation réussie
+date de moins de GLPI_MIRROR_MAX_STALENESS secondes.
+"""
+
+import logging
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+
+import requests
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import GlpiTicket, GlpiTicketRequester, GlpiFollowup, GlpiSyncLease, GlpiSyncState
+from utils.glpi_session import glpi_session
+
+GLPI_MIRROR_ENABLED = os.environ.get("GLPI_MIRROR_ENABLED", "1") == "1"
+# Intervalle entre deux synchronisations incrémentales (secondes)
+GLPI_SYNC_INTERVAL = int(os.environ.get("GLPI_SYNC_INTERVAL", "60"))
+# Au-delà de cet âge (secondes), le miroir est ignoré et GLPI est interrogé en direct
+GLPI_MIRROR_MAX_STALENESS = int(os.environ.get("GLPI_MIRROR_MAX_STALENESS", "300"))
+GLPI_SYNC_PAGE_SIZE = int(os.environ.get("GLPI_SYNC_PAGE_SIZE", "200"))
+# Bail de synchronisation (secondes), renouvelé à chaque page : un seul worker synchronise
+GLPI_SYNC_LEASE_SECONDS = int(os.environ.get("GLPI_SYNC_LEASE_SECONDS", "300"))
+# Intervalle (secondes) de retrait des tickets purgés dans GLPI (0 : jamais)
+GLPI_MIRROR_RECONCILE_INTERVAL = int(os.environ.get("GLPI_MIRROR_RECONCILE_INTERVAL", "3600"))
+GLPI_RECONCILE_PAGE_SIZE = int(os.environ.get("GLPI_RECONCILE_PAGE_SIZE", "1000"))
+
+EMAIL_HEADER_PREFIX = "Email du demandeur: "
+TICKET_USER_REQUESTER = 1  # Ticket_User.type : 1 demandeur, 2 technicien, 3 observateur
+GLPI_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+SYNC_STATE_ID = "tickets"
+RECONCILE_STATE_ID = "tickets_reconcile"
+SEARCH_OPTION_ID = 2  # search/Ticket : ID du ticket
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def parse_requester_email(content):
+    """Extrait l'email du demandeur de la première ligne du contenu d'un ticket."""
+    content = content or ''
+    if not content.startswith(EMAIL_HEADER_PREFIX):
+        return None
+    try:
+        return content.splitlines()[0][len(EMAIL_HEADER_PREFIX):].strip()
+    except (IndexError, ValueError):
+        return None
+
+
+def parse_glpi_date(value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, GLPI_DATE_FORMAT)
+    except (TypeError, ValueError):
+        return None
+
+
+# --- Synchronisation ---
+
+def _fetch_changed_pages(since, is_deleted):
+    """Pages de tickets, du plus récemment modifié au plus ancien, jusqu'à `since`."""
+    start = 0
+    while True:
+        params = {
+            'is_deleted': is_deleted,
+            'expand_dropdowns': 'true',
+            'sort': 'date_mod',
+            'order': 'DESC',
+            'range': f'{start}-{start + GLPI_SYNC_PAGE_SIZE - 1}',
+        }
+        response = glpi_session.request("GET", 'Ticket', params=params)
+        if response.status_code == 400 and 'ERROR_RANGE_EXCEED_TOTAL' in response.text:
+            return
+        response.raise_for_status()
+        page = response.json()
+        if not isinstance(page, list) or not page:
+            return
+        changed = []
+        for ticket in page:
+            date_mod = parse_glpi_date(ticket.get('date_mod'))
+            if since and date_mod and date_mod < since:
+                break
+            changed.append(ticket)
+        if changed:
+            yield changed
+        if len(changed) < len(page) or len(page) < GLPI_SYNC_PAGE_SIZE:
+            return
+        start += GLPI_SYNC_PAGE_SIZE
+
+
+def _sync_followups(db: Session, ticket_id: int):
+    response = glpi_session.request("GET", f'Ticket/{ticket_id}/ITILFollowup', params={'expand_dropdowns': 'true'})
+    response.raise_for_status()
+    followups = response.json()
+    db.query(GlpiFollowup).filter(GlpiFollowup.ticket_id == ticket_id).delete()
+    for followup in followups if isinstance(followups, list) else []:
+        db.add(GlpiFollowup(
+            id=followup['id'],
+            ticket_id=ticket_id,
+            date_creation=parse_glpi_date(followup.get('date_creation') or followup.get('date')),
+            date_mod=parse_glpi_date(followup.get('date_mod')),
+            data=followup,
+        ))
+
+
+def _sync_requesters(db: Session, ticket_id: int):
+    response = glpi_session.request("GET", f'Ticket/{ticket_id}/Ticket_User')
+    response.raise_for_status()
+    links = response.json()
+    db.query(GlpiTicketRequester).filter(GlpiTicketRequester.ticket_id == ticket_id).delete()
+    for users_id in requester_ids_from_links(links):
+        db.add(GlpiTicketRequester(ticket_id=ticket_id, users_id=users_id))
+
+
+def requester_ids_from_links(links) -> list:
+    """IDs GLPI des demandeurs à partir des liens Ticket_User d'un ticket."""
+    if not isinstance(links, list):
+        return []
+    return sorted({link['users_id'] for link in links if link.get('type') == TICKET_USER_REQUESTER and link.get('users_id')})
+
+
+def _store_ticket(db: Session, ticket: dict, is_deleted: bool, now: datetime):
+    """Écrit le ticket dans le miroir, avec ses demandeurs et ses suivis (relus dans GLPI)."""
+    db.merge(GlpiTicket(
+        id=ticket['id'],
+        name=ticket.get('name'),
+        status=ticket.get('status'),
+        requester_email=parse_requester_email(ticket.get('content')),
+        date_creation=parse_glpi_date(ticket.get('date_creation') or ticket.get('date')),
+        date_mod=parse_glpi_date(ticket.get('date_mod')),
+        is_deleted=is_deleted,
+        data=ticket,
+        synced_at=now,
+    ))
+    _sync_requesters(db, ticket['id'])
+    _sync_followups(db, ticket['id'])
+
+
+def _forget_ticket(db: Session, ticket_id: int):
+    db.query(GlpiFollowup).filter(GlpiFollowup.ticket_id == ticket_id).delete()
+    db.query(GlpiTicketRequester).filter(GlpiTicketRequester.ticket_id == ticket_id).delete()
+    db.query(GlpiTicket).filter(GlpiTicket.id == ticket_id).delete()
+
+
+def refresh_ticket(ticket_id: int):
+    """
+    Relit dans GLPI un ticket que l'application vient de modifier (création, suivi) et le réécrit
+    dans le miroir, pour que l'utilisateur voie sa modification sans attendre la synchronisation.
+    En cas d'échec, le ticket est retiré du miroir : sa lecture passe alors par le cache / GLPI
+    (un ticket créé n'apparaît dans les listes servies par le miroir qu'à la synchronisation suivante).
+    """
+    if not GLPI_MIRROR_ENABLED or not ticket_id:
+        return
+    db = SessionLocal()
+    try:
+        response = glpi_session.request("GET", f'Ticket/{ticket_id}', params={'expand_dropdowns': 'true'})
+        response.raise_for_status()
+        ticket = response.json()
+        _store_ticket(db, ticket, bool(ticket.get('is_deleted')), datetime.utcnow())
+        db.commit()
+    except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+        db.rollback()
+        logging.warning(f"Miroir GLPI: ticket {ticket_id} non rafraîchi ({e}), retiré du miroir.")
+        _forget_ticket(db, ticket_id)
+        db.commit()
+    finally:
+        db.close()
+
+
+def acquire_sync_lease(db: Session, owner: str = WORKER_ID, ttl: int = GLPI_SYNC_LEASE_SECONDS) -> bool:
+    """
+    Prend ou renouvelle le bail de synchronisation : un seul processus (worker uvicorn) interroge
+    GLPI et écrit le miroir. Le bail d'un processus arrêté expire après `ttl` secondes.
+    """
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl)
+    # UPDATE conditionnel atomique : renouvellement par le titulaire, ou reprise d'un bail expiré
+    taken = db.query(GlpiSyncLease).filter(
+        GlpiSyncLease.id == SYNC_STATE_ID,
+        or_(GlpiSyncLease.owner == owner, GlpiSyncLease.expires_at < now),
+    ).update({"owner": owner, "expires_at": expires_at}, synchronize_session=False)
+    if taken:
+        db.commit()
+        return True
+    try:
+        db.add(GlpiSyncLease(id=SYNC_STATE_ID, owner=owner, expires_at=expires_at))
+        db.commit()
+        return True
+    except IntegrityError:
+        # Bail détenu par un autre processus
+        db.rollback()
+        return False
+
+
+def release_sync_lease(db: Session, owner: str = WORKER_ID):
+    db.query(GlpiSyncLease).filter(GlpiSyncLease.id == SYNC_STATE_ID, GlpiSyncLease.owner == owner).delete()
+    db.commit()
+
+
+def _record_error(db: Session, state_id: str, error: Exception):
+    db.rollback()
+    state = db.get(GlpiSyncState, state_id) or GlpiSyncState(id=state_id)
+    state.last_error = str(error)
+    db.merge(state)
+    db.commit()
+
+
+def sync_once(db: Session = None, owner: str = None) -> dict:
+    """
+    Importe dans le miroir les tickets (et leurs suivis) modifiés depuis la dernière synchronisation.
+    Chaque page est validée séparément ; la date de reprise (`last_date_mod`) n'avance qu'à la fin
+    d'un passage complet, un passage interrompu reprend donc au même point. Avec `owner`, le bail
+    de synchronisation est renouvelé à chaque page et le passage s'arrête s'il a été perdu.
+    """
+    own_session = db is None
+    db = db or SessionLocal()
+    summary = {"tickets": 0, "followups_refreshed": 0}
+    try:
+        state = db.get(GlpiSyncState, SYNC_STATE_ID)
+        since = state.last_date_mod if state else None
+        newest = since
+        now = datetime.utcnow()
+        try:
+            for is_deleted in ('false', 'true'):
+                for page in _fetch_changed_pages(since, is_deleted):
+                    for ticket in page:
+                        _store_ticket(db, ticket, is_deleted == 'true', now)
+                        summary["tickets"] += 1
+                        summary["followups_refreshed"] += 1
+                        date_mod = parse_glpi_date(ticket.get('date_mod'))
+                        if date_mod and (newest is None or date_mod > newest):
+                            newest = date_mod
+                    db.commit()
+                    if owner and not acquire_sync_lease(db, owner):
+                        logging.warning("Miroir GLPI: bail de synchronisation perdu, passage interrompu.")
+                        return summary
+        except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+            _record_error(db, SYNC_STATE_ID, e)
+            raise
+        state = db.get(GlpiSyncState, SYNC_STATE_ID) or GlpiSyncState(id=SYNC_STATE_ID)
+        state.last_date_mod = newest
+        state.last_success_at = now
+        state.last_error = None
+        db.merge(state)
+        db.commit()
+        return summary
+    finally:
+        if own_session:
+            db.close()
+
+
+def _glpi_ticket_ids() -> set:
+    """IDs de tous les tickets présents dans GLPI (corbeille comprise), lus par search/Ticket."""
+    ids = set()
+    for is_deleted in (0, 1):
+        start = 0
+        while True:
+            # Tri par ID : un ticket créé ou modifié entre deux pages ne décale pas la pagination
+            params = {'is_deleted': is_deleted, 'forcedisplay[0]': SEARCH_OPTION_ID,
+                      'sort': SEARCH_OPTION_ID, 'order': 'ASC',
+                      'range': f'{start}-{start + GLPI_RECONCILE_PAGE_SIZE - 1}'}
+            response = glpi_session.request("GET", 'search/Ticket', params=params)
+            if response.status_code == 400 and 'ERROR_RANGE_EXCEED_TOTAL' in response.text:
+                break
+            response.raise_for_status()
+            rows = response.json().get('data') or []
+            ids.update(int(row[str(SEARCH_OPTION_ID)]) for row in rows if row.get(str(SEARCH_OPTION_ID)))
+            if len(rows) < GLPI_RECONCILE_PAGE_SIZE:
+                break
+            start += GLPI_RECONCILE_PAGE_SIZE
+    return ids
+
+
+def _ticket_purged(ticket_id: int) -> bool:
+    """True si GLPI confirme que le ticket n'existe plus (404) ; un ticket à la corbeille existe encore."""
+    response = glpi_session.request("GET", f'Ticket/{ticket_id}')
+    if response.status_code == 404:
+        return True
+    response.raise_for_status()
+    return False
+
+
+def reconcile_once(db: Session = None) -> int:
+    """
+    Retire du miroir les tickets purgés dans GLPI (la synchronisation incrémentale ne voit que les
+    tickets modifiés, pas ceux qui ont disparu). Chaque ticket absent de la liste des IDs est vérifié
+    individuellement (GET Ticket/{id} -> 404) avant d'être retiré. Retourne le nombre de tickets retirés.
+    """
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        try:
+            glpi_ids = _glpi_ticket_ids()
+            mirrored_ids = {ticket_id for (ticket_id,) in db.query(GlpiTicket.id)}
+            missing = mirrored_ids - glpi_ids
+            if missing and not glpi_ids:
+                # Aucun ticket visible : droits insuffisants plutôt que base vidée, rien n'est supprimé
+                logging.warning("Miroir GLPI: aucun ticket renvoyé par GLPI, réconciliation ignorée.")
+                return 0
+            purged = [ticket_id for ticket_id in missing if _ticket_purged(ticket_id)]
+        except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+            _record_error(db, RECONCILE_STATE_ID, e)
+            raise
+        for ticket_id in purged:
+            _forget_ticket(db, ticket_id)
+        state = db.get(GlpiSyncState, RECONCILE_STATE_ID) or GlpiSyncState(id=RECONCILE_STATE_ID)
+        state.last_success_at = datetime.utcnow()
+        state.last_error = None
+        db.merge(state)
+        db.commit()
+        return len(purged)
+    finally:
+        if own_session:
+            db.close()
+
+
+def _reconcile_due(db: Session) -> bool:
+    if GLPI_MIRROR_RECONCILE_INTERVAL <= 0:
+        return False
+    state = db.get(GlpiSyncState, RECONCILE_STATE_ID)
+    if not state or not state.last_success_at:
+        return True
+    return datetime.utcnow() - state.last_success_at >= timedelta(seconds=GLPI_MIRROR_RECONCILE_INTERVAL)
+
+
+class TicketMirrorWorker:
+    """
+    Thread d'arrière-plan qui appelle `sync_once` toutes les GLPI_SYNC_INTERVAL secondes, et
+    `reconcile_once` toutes les GLPI_MIRROR_RECONCILE_INTERVAL secondes. Avec plusieurs workers
+    uvicorn, seul le détenteur du bail de synchronisation interroge GLPI ; les autres lisent le miroir.
+    """
+
+    def __init__(self, interval: int = GLPI_SYNC_INTERVAL, owner: str = WORKER_ID):
+        self.interval = interval
+        self.owner = owner
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="glpi-ticket-mirror", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            db = SessionLocal()
+            try:
+                if acquire_sync_lease(db, self.owner):
+                    summary = sync_once(db, owner=self.owner)
+                    if summary["tickets"]:
+                        logging.info(f"Miroir GLPI: {summary['tickets']} ticket(s) synchronisé(s).")
+                    if _reconcile_due(db):
+                        purged = reconcile_once(db)
+                        if purged:
+                            logging.info(f"Miroir GLPI: {purged} ticket(s) purgé(s) dans GLPI retiré(s).")
+            except Exception as e:
+                logging.error(f"Synchronisation du miroir GLPI échouée: {e}")
+            finally:
+                db.close()
+            self._stop.wait(self.interval)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5)
+        db = SessionLocal()
+        try:
+            release_sync_lease(db, self.owner)
+        except Exception as e:
+            logging.warning(f"Bail de synchronisation du miroir GLPI non libéré: {e}")
+        finally:
+            db.close()
+
+
+mirror_worker = TicketMirrorWorker()
+
+
+# --- Lecture ---
+
+def is_fresh(db: Session, max_staleness: int = GLPI_MIRROR_MAX_STALENESS) -> bool:
+    """
+    Vrai si la dernière synchronisation réussie est assez récente pour servir les lectures.
+    Avec `max_staleness=None` (GLPI indisponible), il suffit qu'une synchronisation ait abouti.
+    """
+    if not GLPI_MIRROR_ENABLED:
+        return False
+    state = db.get(GlpiSyncState, SYNC_STATE_ID)
+    if not state or not state.last_success_at:
+        return False
+    if max_staleness is None:
+        return True
+    return datetime.utcnow() - state.last_success_at <= timedelta(seconds=max_staleness)
+
+
+def _as_ticket(row: GlpiTicket, requester_ids: list) -> dict:
+    ticket = dict(row.data)
+    ticket['requester_email'] = row.requester_email
+    ticket['requester_ids'] = requester_ids
+    return ticket
+
+
+def _as_tickets(db: Session, rows: list) -> list:
+    requesters = {}
+    ticket_ids = [row.id for row in rows]
+    if ticket_ids:
+        links = db.query(GlpiTicketRequester).filter(GlpiTicketRequester.ticket_id.in_(ticket_ids))
+        for link in links:
+            requesters.setdefault(link.ticket_id, []).append(link.users_id)
+    return [_as_ticket(row, sorted(requesters.get(row.id, []))) for row in rows]
+
+
+def page_tickets(db: Session, start: int = 0, end: int = None, requester_id: int = None, requester_email: str = None):
+    """
+    Tickets de la plage [start, end] (bornes incluses, comme le paramètre range de GLPI) et total.
+    Le filtre demandeur porte sur l'ID GLPI (index) ; l'email n'est utilisé que pour les comptes sans ID GLPI.
+    """
+    query = db.query(GlpiTicket).filter(GlpiTicket.is_deleted == False)  # noqa: E712
+    if requester_id is not None:
+        query = query.join(GlpiTicketRequester, GlpiTicketRequester.ticket_id == GlpiTicket.id)
+        query = query.filter(GlpiTicketRequester.users_id == requester_id)
+    elif requester_email is not None:
+        query = query.filter(GlpiTicket.requester_email == requester_email)
+    total = query.count()
+    query = query.order_by(GlpiTicket.id).offset(start)
+    if end is not None:
+        query = query.limit(end - start + 1)
+    return _as_tickets(db, query.all()), total
+
+
+def get_ticket(db: Session, ticket_id: int):
+    row = db.get(GlpiTicket, ticket_id)
+    return _as_tickets(db, [row])[0] if row else None
+
+
+def get_followups(db: Session, ticket_id: int):
+    """Suivis d'un ticket du miroir, ou None si le ticket n'y est pas encore."""
+    if db.get(GlpiTicket, ticket_id) is None:
+        return None
+    rows = db.query(GlpiFollowup).filter(GlpiFollowup.ticket_id == ticket_id).order_by(GlpiFollowup.date_mod)
+    return [dict(row.data) for row in rows]
+
+
+def get_ticket_with_followups(db: Session, ticket_id: int):
+    """Ticket du miroir avec ses suivis (clé `followups`), ou None s'il n'y est pas encore."""
+    ticket = get_ticket(db, ticket_id)
+    if ticket is None:
+        return None
+    ticket['followups'] = get_followups(db, ticket_id)
+    return ticket
+
+
+def count_tickets(db: Session, statuses: list = None) -> int:
+    query = db.query(GlpiTicket).filter(GlpiTicket.is_deleted == False)  # noqa: E712
+    if statuses:
+        query = query.filter(GlpiTicket.status.in_(statuses))
+    return query.count()
+
+
+def tickets_created_since(db: Session, cutoff: datetime) -> list:
+    rows = db.query(GlpiTicket).filter(GlpiTicket.is_deleted == False, GlpiTicket.date_creation > cutoff)  # noqa: E712
+    return _as_tickets(db, rows.all())
+
+
+def open_tickets_not_updated_since(db: Session, cutoff: datetime, statuses=(1, 2, 3)) -> list:
+    rows = db.query(GlpiTicket).filter(
+        GlpiTicket.is_deleted == False,  # noqa: E712
+        GlpiTicket.status.in_(statuses),
+        GlpiTicket.date_mod < cutoff,
+    )
+    return _as_tickets(db, rows.all())